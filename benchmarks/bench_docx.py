@@ -0,0 +1,59 @@
+"""Times the Markdown -> DOCX export on a generated 10,000-line study guide.
+
+    python benchmarks/bench_docx.py [--lines 10000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from note_organizer import docx_render  # noqa: E402
+
+
+def make_guide(n_lines):
+    """A guide shaped like the model's output: categories, nested lists, big tables, a glossary."""
+    lines = ["Master study guide for the benchmark course.", ""]
+    n = 0
+    while len(lines) < n_lines:
+        n += 1
+        lines += [f"## Category {n}: Topic **{n}**", "", f"### Sub-topic {n}.1", ""]
+        lines += [f"- Point {i} with **bold**, *italic* and `code`" for i in range(5)]
+        lines += [f"  - Nested detail {i}" for i in range(3)]
+        lines += [f"{i}. Step {i} of the process" for i in range(1, 4)]
+        lines += ["", "| Term | Date | Notes |", "|---|:---:|---|"]
+        lines += [f"| Item {n}-{i} | 19{i:02d} | **Key** fact number {i} |" for i in range(40)]
+        lines += ["", f"Paragraph {n} explaining the table in plain prose.", ""]
+    lines += ["## Glossary", ""] + [f"- **Term {i}**: definition {i}" for i in range(50)]
+    return "\n".join(lines[:n_lines])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    if not docx_render.DOCX_AVAILABLE:
+        print("python-docx is not installed")
+        return 1
+
+    text = make_guide(args.lines)
+    path = os.path.join(tempfile.mkdtemp(), "bench.docx")
+    best_render = best_save = float("inf")
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        doc = docx_render.markdown_to_docx(text)
+        t1 = time.perf_counter()
+        doc.save(path)
+        t2 = time.perf_counter()
+        best_render = min(best_render, t1 - t0)
+        best_save = min(best_save, t2 - t1)
+    print(f"{args.lines} lines ({len(text) / 1e6:.1f} MB): render {best_render:.2f}s, save {best_save:.2f}s, "
+          f"{args.lines / (best_render + best_save):,.0f} lines/s, {os.path.getsize(path) / 1e3:.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
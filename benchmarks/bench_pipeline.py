@@ -0,0 +1,416 @@
+"""Benchmarks every stage of ingest -> compile -> export on a synthetic corpus.
+
+Each stage runs in its own process so peak RSS belongs to that stage alone.
+Compile requests go to the local mock in mock_gemini.py, so no API key or network
+is needed. Results are compared with benchmarks/baselines.json.
+
+    python benchmarks/bench_pipeline.py                  # run all stages, compare with the baseline
+    python benchmarks/bench_pipeline.py --scale 0.2 txt pdf
+    python benchmarks/bench_pipeline.py --save-baseline  # record the current numbers
+    python benchmarks/bench_pipeline.py --profile out/   # cProfile dump + top functions per stage
+    python benchmarks/bench_pipeline.py --tracemalloc    # biggest allocation sites per stage
+    python benchmarks/bench_pipeline.py --check 20       # exit 1 if a stage got >20% slower
+"""
+import argparse
+import cProfile
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import pstats
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from note_organizer import chunking, docx_render, engine, ingest  # noqa: E402
+from note_organizer.segments import SourceBundle  # noqa: E402
+import bench_docx  # noqa: E402
+import mock_gemini  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines.json")
+# its output limit is large enough that --requests alone decides how the input is split
+BENCH_MODEL = "gemini-2.5-flash"
+
+WORDS = ("cell membrane protein energy reaction enzyme gene theory market price demand supply war treaty "
+         "empire revolution vector matrix integral derivative function limit atom bond molecule force mass "
+         "velocity culture language society policy rights economy climate ocean river plate volcano").split()
+
+
+# --- SYNTHETIC CORPUS ---
+
+def lecture_text(rng, n_chars):
+    """Lecture-notes-like text: headings, paragraphs and bullet lists."""
+    out = []
+    size = 0
+    n = 0
+    while size < n_chars:
+        n += 1
+        block = [f"Lecture {n}: {' '.join(rng.choices(WORDS, k=3)).title()}", ""]
+        for _ in range(4):
+            block.append(" ".join(rng.choices(WORDS, k=60)).capitalize() + ".")
+            block.append("")
+        block += [f"- {' '.join(rng.choices(WORDS, k=8))}" for _ in range(5)]
+        block.append("")
+        text = "\n".join(block)
+        out.append(text)
+        size += len(text)
+    return "\n".join(out)[:n_chars]
+
+
+def _pdf_string(s):
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """Writes a minimal text PDF (one Helvetica text stream per page) without any PDF library."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 12 TL 50 790 Td " + " ".join(f"({_pdf_string(l)}) '" for l in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{n} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_corpus(root, opts):
+    """Generates the .txt, .pdf and image inputs under `root`; deterministic for a given scale."""
+    rng = random.Random(42)
+    for kind in ("txt", "pdf", "img"):
+        os.makedirs(os.path.join(root, kind), exist_ok=True)
+    for i in range(opts.txt_files):
+        with open(os.path.join(root, "txt", f"notes_{i:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write(lecture_text(rng, opts.txt_kb * 1024))
+    for i in range(opts.pdf_files):
+        pages = [lecture_text(rng, 2500).split("\n")[:60] for _ in range(opts.pdf_pages)]
+        write_pdf(os.path.join(root, "pdf", f"slides_{i:03d}.pdf"), pages)
+    if ingest.PIL_AVAILABLE:
+        from PIL import Image, ImageChops
+        gradient = Image.radial_gradient("L").resize((opts.image_px, opts.image_px * 3 // 4))
+        noise = Image.effect_noise(gradient.size, 40)
+        for i in range(opts.images):
+            # shifted copies, so every image is different
+            shifted = ImageChops.offset(noise, i * 37, i * 53)
+            img = Image.merge("RGB", (ImageChops.offset(gradient, i * 11, 0), shifted, Image.blend(gradient, shifted, 0.5)))
+            if i % 2:
+                img.save(os.path.join(root, "img", f"photo_{i:03d}.png"), compress_level=1)
+            else:
+                img.save(os.path.join(root, "img", f"photo_{i:03d}.jpg"), quality=90)
+
+
+# --- MEASUREMENT ---
+
+def peak_rss_mb():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    return None
+
+
+def measure(name, work, opts):
+    """Times `work()` -> (items, bytes) with optional cProfile/tracemalloc; returns the stage metrics."""
+    rss_before = peak_rss_mb()
+    profiler = cProfile.Profile() if opts.profile else None
+    if opts.tracemalloc:
+        tracemalloc.start(10)
+    if profiler:
+        profiler.enable()
+    start = time.perf_counter()
+    items, nbytes = work()
+    wall = time.perf_counter() - start
+    if profiler:
+        profiler.disable()
+        os.makedirs(opts.profile, exist_ok=True)
+        dump = os.path.join(opts.profile, f"{name}.prof")
+        profiler.dump_stats(dump)
+        with open(os.path.join(opts.profile, f"{name}.txt"), "w") as f:
+            pstats.Stats(dump, stream=f).sort_stats("cumulative").print_stats(25)
+    top_allocations = []
+    if opts.tracemalloc:
+        snapshot = tracemalloc.take_snapshot()
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        # what the stage still holds when it ends; the peak itself is only known as a total
+        top_allocations = [f"{s.size / 1e6:8.2f} MB retained  {s.traceback[0]}"
+                           for s in snapshot.statistics("lineno")[:8] if s.size >= 10_000]
+        top_allocations.insert(0, f"traced peak {traced_peak / 1e6:.1f} MB")
+    rss = peak_rss_mb()
+    return {
+        "wall_s": round(wall, 4),
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "rss_growth_mb": round(rss - rss_before, 1) if rss is not None else None,
+        "items": items,
+        "items_per_s": round(items / wall, 1) if wall else None,
+        "mb_per_s": round(nbytes / 1e6 / wall, 2) if wall else None,
+        "top_allocations": top_allocations,
+    }
+
+
+# --- STAGES ---
+# each stage does its setup untimed and hands the timed part to measure()
+
+def _files(root, kind):
+    return sorted(glob.glob(os.path.join(root, kind, "*")))
+
+
+def stage_txt(root, opts):
+    paths = _files(root, "txt")
+
+    def work():
+        return len(paths), sum(len(ingest.extract_file(p)["text"]) for p in paths)
+    return measure("txt", work, opts)
+
+
+def stage_pdf(root, opts):
+    paths = _files(root, "pdf")
+
+    def work():
+        results = [ingest.extract_file(p) for p in paths]
+        return sum(ingest.pdf_page_count(p) for p in paths), sum(len(r["text"] or "") for r in results)
+    return measure("pdf", work, opts)
+
+
+def stage_image(root, opts):
+    paths = _files(root, "img")
+
+    def work():
+        return len(paths), sum(len(ingest.encode_image(p)["inline_data"]["data"]) for p in paths)
+    return measure("image", work, opts)
+
+
+def _bundle(root):
+    bundle = SourceBundle()
+    for path in _files(root, "txt"):
+        bundle.add_file(path)
+    return bundle
+
+
+def stage_prompt(root, opts):
+    bundle = _bundle(root)
+    chunk_chars = max(10_000, bundle.text_length // opts.requests)
+
+    def work():
+        # the request bodies as they go on the wire
+        payloads = engine.build_payloads(bundle, "Focus on definitions", chunk_chars, BENCH_MODEL)
+        return len(payloads), sum(len(json.dumps(p)) for p in payloads)
+    return measure("prompt", work, opts)
+
+
+def stage_parse(root, opts):
+    guide = mock_gemini.make_response_guide(opts.response_lines)
+    bodies = [json.dumps({"candidates": [{"content": {"parts": [{"text": guide.replace("Category", f"Part {i}")}]}}]})
+              for i in range(opts.requests)]
+
+    def work():
+        texts = [engine.extract_output_text(json.loads(b)) for b in bodies]
+        merged = chunking.merge_guides(texts)
+        return len(bodies), sum(len(b) for b in bodies) + len(merged)
+    return measure("parse", work, opts)
+
+
+def stage_compile(root, opts):
+    server, api_base = mock_gemini.start_server(latency=opts.latency, guide_lines=opts.response_lines)
+    bundle = _bundle(root)
+    chunk_chars = max(10_000, bundle.text_length // opts.requests)
+    api_url = f"{api_base}/models/{BENCH_MODEL}:generateContent"
+
+    def work():
+        text, _ = engine.compile_bundle(bundle, api_url, "bench", "", chunk_chars=chunk_chars)
+        return engine.request_count(bundle, chunk_chars, BENCH_MODEL), bundle.text_length + len(text)
+    try:
+        return measure("compile", work, opts)
+    finally:
+        server.shutdown()
+
+
+def stage_docx(root, opts):
+    text = bench_docx.make_guide(opts.guide_lines)
+    path = os.path.join(root, "bench.docx")
+
+    def work():
+        docx_render.export_docx(text, path)
+        return opts.guide_lines, len(text)
+    return measure("docx", work, opts)
+
+
+STAGES = {
+    "txt": stage_txt,
+    "pdf": stage_pdf,
+    "image": stage_image,
+    "prompt": stage_prompt,
+    "parse": stage_parse,
+    "compile": stage_compile,
+    "docx": stage_docx,
+}
+UNITS = {"txt": "files", "pdf": "pages", "image": "images", "prompt": "requests", "parse": "responses",
+         "compile": "requests", "docx": "lines"}
+
+
+def _run_stage(name, root, opts, queue):
+    try:
+        queue.put(STAGES[name](root, opts))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_isolated(name, root, opts):
+    """Runs one stage in a fresh process so its peak RSS is not inflated by earlier stages."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_stage, args=(name, root, opts, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+# --- BASELINES ---
+
+def corpus_signature(opts):
+    keys = ("txt_files", "txt_kb", "pdf_files", "pdf_pages", "images", "image_px", "requests",
+            "response_lines", "latency", "guide_lines")
+    return {k: getattr(opts, k) for k in keys}
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(results, opts):
+    """Records the stages that ran; other stages keep their numbers if the corpus is the same."""
+    old = load_baseline()
+    stages = old.get("stages", {}) if old.get("corpus") == corpus_signature(opts) else {}
+    stages.update({name: {k: v for k, v in r.items() if k != "top_allocations"}
+                   for name, r in results.items() if "error" not in r})
+    baseline = {
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "corpus": corpus_signature(opts),
+        "stages": {name: stages[name] for name in STAGES if name in stages},
+    }
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def _delta(now, before):
+    if not before or now is None:
+        return ""
+    return f"{(now - before) / before * 100:+.0f}%"
+
+
+def report(results, baseline, opts):
+    """Prints one row per stage; returns the names of stages slower than --check allows."""
+    same_corpus = baseline.get("corpus") == corpus_signature(opts)
+    if baseline and not same_corpus:
+        print("(baseline was recorded with a different corpus size; deltas are not comparable)")
+    print(f"{'stage':<8} {'wall':>8} {'vs base':>8} {'peak RSS':>9} {'growth':>8} {'throughput':>20} {'MB/s':>8}")
+    regressions = []
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<8} failed: {r['error']}")
+            continue
+        base = baseline.get("stages", {}).get(name, {}) if same_corpus else {}
+        delta = _delta(r["wall_s"], base.get("wall_s"))
+        rss = f"{r['peak_rss_mb']:.0f} MB" if r["peak_rss_mb"] is not None else "n/a"
+        growth = f"+{r['rss_growth_mb']:.0f} MB" if r["rss_growth_mb"] is not None else ""
+        throughput = f"{r['items_per_s']:,.1f} {UNITS[name]}/s"
+        print(f"{name:<8} {r['wall_s']:>7.3f}s {delta:>8} {rss:>9} {growth:>8} {throughput:>20} {r['mb_per_s']:>8}")
+        for line in r["top_allocations"]:
+            print(f"           {line}")
+        if opts.check is not None and base.get("wall_s") and r["wall_s"] > base["wall_s"] * (1 + opts.check / 100):
+            regressions.append(name)
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("stages", nargs="*", metavar="STAGE", help=f"stages to run: {', '.join(STAGES)} (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every corpus size")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock API delay per request, seconds")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {os.path.basename(BASELINE_PATH)}")
+    parser.add_argument("--check", type=float, metavar="PCT", help="exit 1 if a stage is PCT%% slower than the baseline")
+    parser.add_argument("--profile", metavar="DIR", help="write <stage>.prof and a top-25 <stage>.txt per stage")
+    parser.add_argument("--tracemalloc", action="store_true", help="print the biggest allocation sites per stage")
+    parser.add_argument("--keep", metavar="DIR", help="generate the corpus in DIR and keep it")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    opts = parser.parse_args(argv)
+    unknown = [s for s in opts.stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage: {', '.join(unknown)}")
+    scale = opts.scale
+    opts.txt_files, opts.txt_kb = max(1, int(100 * scale)), 20
+    opts.pdf_files, opts.pdf_pages = max(1, int(10 * scale)), 20
+    opts.images, opts.image_px = max(1, int(20 * scale)), 2000
+    opts.requests, opts.response_lines = 8, 400
+    opts.guide_lines = max(100, int(10_000 * scale))
+    stages = opts.stages or list(STAGES)
+    if opts.profile:
+        opts.profile = os.path.abspath(opts.profile)
+
+    root = opts.keep or tempfile.mkdtemp(prefix="note_organizer_bench_")
+    try:
+        t0 = time.perf_counter()
+        make_corpus(root, opts)
+        print(f"Corpus in {root} ({time.perf_counter() - t0:.1f}s): {opts.txt_files} x {opts.txt_kb} KB txt, "
+              f"{opts.pdf_files} x {opts.pdf_pages}-page PDFs, {opts.images} images at {opts.image_px}px")
+        results = {name: run_isolated(name, root, opts) for name in stages}
+    finally:
+        if not opts.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    regressions = report(results, load_baseline(), opts)
+    if opts.save_baseline:
+        save_baseline(results, opts)
+        print(f"Baseline saved to {BASELINE_PATH}")
+    if opts.profile:
+        print(f"Profiles written to {opts.profile}")
+    if regressions:
+        print(f"Slower than baseline by more than {opts.check:g}%: {', '.join(regressions)}")
+        return 1
+    return 1 if any("error" in r for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""A local stand-in for the Gemini API, for benchmarks and offline testing.
+
+Answers generateContent, streamGenerateContent (SSE), countTokens and the File
+API upload endpoints with a canned study guide after a configurable delay. Point
+the app at it with GEMINI_API_BASE=http://127.0.0.1:<port>/v1beta.
+
+    python benchmarks/mock_gemini.py [--port 8765] [--latency 0.5] [--guide-lines 200]
+"""
+import argparse
+import gzip
+import json
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_response_guide(n_lines=200):
+    """A partial guide shaped like a real answer, so the merge step has work to do."""
+    lines = []
+    n = 0
+    while len(lines) < n_lines:
+        n += 1
+        lines += [f"## Category {n}", "", f"### Topic {n}", "", f"- Point about **topic {n}** (café, naïve, 日本語)", "",
+                  "| Term | Meaning |", "|---|---|", f"| T{n} | meaning {n} |", ""]
+    lines += ["## Glossary", ""] + [f"- **Term {i}**: definition {i}" for i in range(10)]
+    return "\n".join(lines) + "\n"
+
+
+class MockGemini(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    guide = make_response_guide()
+    stats = {"requests": 0, "uploads": 0, "bytes_in": 0, "connections": 0}
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        # headers and body go out in separate writes; without this, kept-alive
+        # connections stall ~40 ms per response on Nagle + delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.lock:
+            self.stats["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, obj, status=200, headers=()):
+        out = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        for key, value in headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(out)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/stats":
+            return self.reply(self.stats)
+        # File API status poll: GET /v1beta/files/<id>
+        name = path.split("/", 2)[-1]
+        self.reply({"name": name, "uri": f"http://{self.headers['Host']}/v1beta/{name}", "state": "ACTIVE"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.lock:
+            self.stats["bytes_in"] += len(body)
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        if not (self.headers.get("x-goog-api-key") or "key=" in self.path or self.path.startswith("/session/")):
+            return self.reply({"error": {"code": 403, "message": "API key missing"}}, status=403)
+        if "/upload/" in self.path:
+            # resumable upload, step 1: hand out a session URL
+            session = f"http://{self.headers['Host']}/session/{uuid.uuid4().hex}"
+            return self.reply({}, headers=[("X-Goog-Upload-URL", session)])
+        if self.path.startswith("/session/"):
+            with self.lock:
+                self.stats["uploads"] += 1
+            name = f"files/{uuid.uuid4().hex[:12]}"
+            return self.reply({"file": {"name": name, "uri": f"http://{self.headers['Host']}/v1beta/{name}",
+                                        "state": "ACTIVE"}})
+
+        if ":countTokens" in self.path:
+            return self.reply({"totalTokens": len(body) // 4})
+        with self.lock:
+            self.stats["requests"] += 1
+        if "streamGenerateContent" in self.path:
+            return self.stream()
+        time.sleep(self.latency)
+        self.reply({
+            "candidates": [{"content": {"parts": [{"text": self.guide}]}}],
+            "usageMetadata": {"promptTokenCount": len(body) // 4, "candidatesTokenCount": len(self.guide) // 4},
+        })
+
+    def stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [self.guide[i:i + 200] for i in range(0, len(self.guide), 200)]
+        for piece in pieces:
+            time.sleep(self.latency / len(pieces))
+            # raw UTF-8 and no charset in the Content-Type, as the real API sends it
+            data = json.dumps({"candidates": [{"content": {"parts": [{"text": piece}]}}]}, ensure_ascii=False)
+            event = ("data: " + data + "\r\n\r\n").encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_server(port=0, latency=0.0, guide_lines=200):
+    """Starts the mock on a background thread. Returns (server, api_base)."""
+    handler = type("Handler", (MockGemini,), {
+        "latency": latency, "guide": make_response_guide(guide_lines),
+        "stats": {"requests": 0, "uploads": 0, "bytes_in": 0, "connections": 0}, "lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1beta"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before each answer")
+    parser.add_argument("--guide-lines", type=int, default=200, help="length of the canned answer")
+    args = parser.parse_args(argv)
+    server, base = start_server(args.port, args.latency, args.guide_lines)
+    print(f"Mock Gemini on {base} (latency {args.latency}s). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""Smart Note Organizer.
+
+The GUI lives in `note_organizer.gui`; everything importable from here is
+tkinter-free so it can run on servers and in workers.
+"""
+from .engine import SourceBundle, build_payload, call_gemini, compile_notes, export_docx, markdown_to_docx
+from .export import FORMATS, export_guides
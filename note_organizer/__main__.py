@@ -0,0 +1,7 @@
+import sys
+
+from .cli import main
+
+# guarded so worker processes started with "spawn" don't re-run the CLI
+if __name__ == "__main__":
+    sys.exit(main())
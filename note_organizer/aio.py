@@ -0,0 +1,133 @@
+"""The one background asyncio event loop that runs compiles, and the bridge back to Tk.
+
+Compiles, batch jobs and their requests are tasks on a single loop thread, so any
+number of requests can be in flight without an OS thread each, and cancelling a
+task aborts its HTTP request at once instead of waiting out the read timeout.
+Blocking work (PDF extraction, SQLite, DOCX) is handed off with asyncio.to_thread.
+
+Other threads start work with submit(), which returns a concurrent.futures.Future
+whose cancel() cancels the task, or block on it with run(). The GUI gets results
+through a TkBridge: a thread-safe queue of callbacks that the Tk thread drains.
+
+No tkinter import here; the batch mode runs on display-less hosts.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import queue
+import threading
+
+from . import gemini
+from .gemini import Cancelled
+
+CANCEL_POLL_SECONDS = 0.1  # how often run() looks at its `cancelled` event
+SHUTDOWN_SECONDS = 2
+BRIDGE_POLL_MS = 50
+
+
+class BackgroundLoop:
+    """An event loop running forever on a daemon thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="asyncio", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedules `coro` on the loop. Thread-safe; cancel() on the returned Future cancels the task."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, cancelled=None):
+        """Runs `coro` on the loop and waits for its result. Setting `cancelled` (a threading.Event) cancels it."""
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("run() would block the event loop; await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            while True:
+                try:
+                    return future.result(timeout=None if cancelled is None else CANCEL_POLL_SECONDS)
+                except concurrent.futures.TimeoutError:
+                    if cancelled.is_set():
+                        future.cancel()
+                        raise Cancelled()
+        except concurrent.futures.CancelledError:
+            raise Cancelled()
+        except BaseException:
+            future.cancel()  # e.g. Ctrl+C in the waiting thread
+            raise
+
+    def stop(self):
+        """Closes the HTTP sessions and stops the loop (at interpreter exit)."""
+        try:
+            self.submit(gemini.close_async_clients()).result(timeout=SHUTDOWN_SECONDS)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_loop():
+    """The shared background loop, started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = BackgroundLoop()
+            atexit.register(_loop.stop)
+        return _loop
+
+
+def submit(coro):
+    return get_loop().submit(coro)
+
+
+def run(coro, cancelled=None):
+    return get_loop().run(coro, cancelled)
+
+
+def in_thread(func):
+    """Wraps a blocking function as a coroutine function that runs it in a worker thread."""
+    return lambda *args: asyncio.to_thread(func, *args)
+
+
+async def gather(aws):
+    """Like asyncio.gather, but the first failure cancels the others instead of leaving them running."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+class TkBridge:
+    """Callbacks posted from any thread, run on the Tk thread every `interval_ms`.
+
+    `master` is any Tk widget; only its after() is used, always from the Tk thread.
+    """
+
+    def __init__(self, master, interval_ms=BRIDGE_POLL_MS):
+        self.master = master
+        self.interval_ms = interval_ms
+        self.calls = queue.SimpleQueue()
+        self.master.after(self.interval_ms, self._drain)
+
+    def post(self, func, *args):
+        self.calls.put((func, args))
+
+    def _drain(self):
+        # rescheduled first, so a failing callback does not stop the bridge
+        self.master.after(self.interval_ms, self._drain)
+        while True:
+            try:
+                func, args = self.calls.get_nowait()
+            except queue.Empty:
+                return
+            func(*args)
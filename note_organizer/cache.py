@@ -0,0 +1,292 @@
+"""On-disk caches, kept in SQLite under the cache folder.
+
+ResponseCache holds Gemini responses keyed by a hash of everything that was sent, so
+an identical recompile (same model, instructions, text and images) is answered
+without touching the API. Entries expire after a TTL and the least recently used
+ones are evicted once the cache grows past its size limit. Exact token counts of
+requests (from countTokens) are kept alongside under the same keys.
+
+ExtractionCache holds the text and encoded images read from source files, keyed by
+(path, size, mtime) with a content hash behind it, so re-adding the same lecture
+packs skips PDF parsing and image encoding.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import config, ingest, ocr
+
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_MB = 500
+
+
+def model_from_url(api_url):
+    # .../models/<model>:generateContent -> <model>
+    return api_url.rsplit("/models/", 1)[-1].split(":", 1)[0]
+
+
+def request_key(model, payload):
+    """SHA-256 over the model name and every part of the request, in order."""
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    sections = [("system", payload.get("systemInstruction", {}))] + [("content", c) for c in payload.get("contents", [])]
+    for label, content in sections:
+        h.update(b"\0" + label.encode("ascii"))
+        for part in content.get("parts", []):
+            if "text" in part:
+                h.update(b"\0text\0")
+                h.update(part["text"].encode("utf-8"))
+            else:
+                h.update(b"\0part\0")
+                h.update(json.dumps(part, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache, safe to share between worker threads."""
+
+    def __init__(self, path, ttl_days=DEFAULT_TTL_DAYS, max_mb=DEFAULT_MAX_MB):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, created REAL, last_used REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS token_counts (key TEXT PRIMARY KEY, tokens INTEGER, created REAL)")
+        self.db.commit()
+
+    def key_for(self, api_url, payload):
+        return request_key(model_from_url(api_url), payload)
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.db.commit()
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, api_url, response):
+        model = model_from_url(api_url)
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self._evict(now)
+            self.db.commit()
+
+    def get_count(self, key):
+        """A stored countTokens result for this request key, or None. Not counted as a hit or miss."""
+        with self.lock:
+            row = self.db.execute("SELECT tokens, created FROM token_counts WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return row[0]
+
+    def put_count(self, key, tokens):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO token_counts (key, tokens, created) VALUES (?, ?, ?)",
+                            (key, tokens, time.time()))
+            self.db.commit()
+
+    def _evict(self, now):
+        self.db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self.db.execute("DELETE FROM token_counts WHERE created < ?", (now - self.ttl,))
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used ASC").fetchall():
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.execute("DELETE FROM token_counts")
+            self.db.commit()
+            self.db.execute("VACUUM")
+
+    def stats_text(self):
+        return f"Cache: {self.hits} hits / {self.misses} misses"
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """Extracted file contents, looked up by stat() first and by content hash second."""
+
+    def __init__(self, path, version, max_mb=DEFAULT_MAX_MB):
+        self.path = path
+        self.version = version
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.digests = {}  # (path, size, mtime) -> sha256, so a miss is only hashed once
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, digest TEXT)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS extracted ("
+            "digest TEXT PRIMARY KEY, kind TEXT, text TEXT, image TEXT, size INTEGER, last_used REAL, pages TEXT)"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(extracted)")]
+        if "pages" not in columns:  # caches written before page offsets were kept
+            self.db.execute("ALTER TABLE extracted ADD COLUMN pages TEXT")
+        if "phash" not in columns:  # caches written before images were hashed
+            self.db.execute("ALTER TABLE extracted ADD COLUMN phash TEXT")
+        if "shingles" not in columns:  # caches written before text was deduplicated
+            self.db.execute("ALTER TABLE extracted ADD COLUMN shingles TEXT")
+        if "unread" not in columns:  # caches written before unread scan pages were kept
+            self.db.execute("ALTER TABLE extracted ADD COLUMN unread TEXT")
+        if "layouts" not in columns:  # caches written before images of text were compared by layout
+            self.db.execute("ALTER TABLE extracted ADD COLUMN layouts TEXT")
+        self.db.commit()
+
+    def _stat_key(self, path):
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+    def _digest(self, stat_key):
+        digest = self.digests.get(stat_key)
+        if digest is None:
+            # the extractor version is part of the key so old encodings are not reused
+            digest = self.digests[stat_key] = file_digest(stat_key[0]) + ":" + self.version
+        return digest
+
+    def get(self, path):
+        """Returns a cached extract_file() result, or None."""
+        try:
+            stat_key = self._stat_key(path)
+        except OSError:
+            return None
+        with self.lock:
+            row = self.db.execute("SELECT digest FROM files WHERE path = ? AND size = ? AND mtime = ?", stat_key).fetchone()
+        if row is not None and row[0].endswith(":" + self.version):
+            digest = row[0]
+        else:
+            try:
+                digest = self._digest(stat_key)
+            except OSError:
+                return None
+        with self.lock:
+            hit = self.db.execute("SELECT kind, text, image, pages, phash, shingles, unread, layouts FROM extracted WHERE digest = ?",
+                                  (digest,)).fetchone()
+            if hit is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("INSERT OR REPLACE INTO files (path, size, mtime, digest) VALUES (?, ?, ?, ?)", stat_key + (digest,))
+            self.db.execute("UPDATE extracted SET last_used = ? WHERE digest = ?", (time.time(), digest))
+            self.db.commit()
+        return {"name": os.path.basename(path), "kind": hit[0], "text": hit[1],
+                "images": json.loads(hit[2]) if hit[2] else None, "pages": json.loads(hit[3]) if hit[3] else None,
+                "phash": hit[4], "shingles": json.loads(hit[5]) if hit[5] else None,
+                "unread_pages": json.loads(hit[6]) if hit[6] else None,
+                "layouts": json.loads(hit[7]) if hit[7] else None, "seconds": 0.0}
+
+    def put(self, path, result):
+        try:
+            stat_key = self._stat_key(path)
+            digest = self._digest(stat_key)
+        except OSError:
+            return
+        image = json.dumps(result["images"]) if result.get("images") else None
+        shingles = json.dumps(result["shingles"]) if result.get("shingles") else None
+        layouts = json.dumps(result["layouts"]) if result.get("layouts") else None
+        size = len(result.get("text") or "") + len(image or "") + len(shingles or "") + len(layouts or "")
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO files (path, size, mtime, digest) VALUES (?, ?, ?, ?)", stat_key + (digest,))
+            self.db.execute(
+                "INSERT OR REPLACE INTO extracted (digest, kind, text, image, size, last_used, pages, phash, shingles, unread, "
+                "layouts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, result["kind"], result.get("text"), image, size, time.time(),
+                 json.dumps(result["pages"]) if result.get("pages") else None, result.get("phash"), shingles,
+                 json.dumps(result["unread_pages"]) if result.get("unread_pages") else None, layouts),
+            )
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM extracted").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for digest, size in self.db.execute("SELECT digest, size FROM extracted ORDER BY last_used ASC").fetchall():
+            self.db.execute("DELETE FROM extracted WHERE digest = ?", (digest,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self.db.execute("DELETE FROM files WHERE digest NOT IN (SELECT digest FROM extracted)")
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM files")
+            self.db.execute("DELETE FROM extracted")
+            self.db.commit()
+            self.db.execute("VACUUM")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def open_extraction_cache(cfg):
+    """Builds the extraction cache from config.json settings. Returns None if disabled or unusable."""
+    if not cfg.get("CACHE_ENABLED", True):
+        return None
+    try:
+        return ExtractionCache(
+            os.path.join(config.get_cache_dir(cfg), "extracted.sqlite3"),
+            ingest.extractor_version(config.get_tile_images(cfg), ocr.language_from_config(cfg)),
+            max_mb=config.get_int(cfg, "CACHE_MAX_MB", DEFAULT_MAX_MB),
+        )
+    except Exception as e:
+        print(f"Extraction cache disabled: {e}")
+        return None
+
+
+def open_cache(cfg):
+    """Builds the cache from config.json settings. Returns None if disabled or unusable."""
+    if not cfg.get("CACHE_ENABLED", True):
+        return None
+    try:
+        return ResponseCache(
+            os.path.join(config.get_cache_dir(cfg), "responses.sqlite3"),
+            ttl_days=config.get_int(cfg, "CACHE_TTL_DAYS", DEFAULT_TTL_DAYS),
+            max_mb=config.get_int(cfg, "CACHE_MAX_MB", DEFAULT_MAX_MB),
+        )
+    except Exception as e:
+        print(f"Response cache disabled: {e}")
+        return None
@@ -0,0 +1,258 @@
+"""Map-reduce support for inputs too large for one request.
+
+`make_chunks` packs the per-file sections of the raw data (the `--- FILE:` /
+`--- PDF:` blocks) into chunks that fit a character budget, splitting oversized
+files on heading and paragraph boundaries. Each chunk is organized on its own and
+`merge_guides` folds the partial guides back into one: categories (H2) and
+sub-topics (H3) with the same title are combined, and the glossaries are merged
+into a single alphabetical glossary at the end. Text a later part puts before its
+first category (or a whole part without one) goes to an "Other Notes" category.
+"""
+import re
+from collections import OrderedDict
+
+CHARS_PER_TOKEN = 4
+DEFAULT_CHUNK_TOKENS = 50_000  # 200k chars, the size the app used to truncate at
+IMAGES_PER_CHUNK = 16  # most images per request once an input is split (see tokens.plan_requests)
+
+HEADING_LINE_RE = re.compile(r'^(#{1,6}\s|[A-Z][A-Z0-9 ,:&/()-]{3,}$|(Chapter|Section|Lecture|Week|Unit)\s+\d+)')
+OTHER_NOTES_TITLE = "Other Notes"  # category for text later parts put before their first H2
+GLOSSARY_TITLE_RE = re.compile(r'glossary|key terms|definitions', re.IGNORECASE)
+GLOSSARY_ENTRY_RE = re.compile(r'^\s*(?:[-*+]\s+|\d+\.\s+)?\*\*(.+?)\*\*\s*[:\-–—]*\s*(.*)$')
+GLOSSARY_ROW_RE = re.compile(r'^\|\s*\**([^|*]+?)\**\s*\|\s*(.+?)\s*\|?\s*$')
+TABLE_SEPARATOR_RE = re.compile(r'^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)+\|?$')
+
+
+def _blocks(text):
+    """Paragraphs of `text`, with a break forced before every heading-like line."""
+    blocks = []
+    current = []
+    for line in text.split("\n"):
+        if not line.strip() or (HEADING_LINE_RE.match(line) and current):
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            if not line.strip():
+                continue
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def _units(text, budget):
+    """(separator, block) pairs of `text`, cutting blocks larger than `budget` by line and then by length."""
+    for block in _blocks(text):
+        if len(block) <= budget:
+            yield "\n\n", block
+            continue
+        sep = "\n\n"
+        for line in block.split("\n"):
+            for i in range(0, max(len(line), 1), budget):
+                yield sep, line[i:i + budget]
+                sep = "\n"
+
+
+def split_text(text, budget):
+    """Splits one file body into pieces of at most `budget` chars, on block boundaries where possible."""
+    pieces = []
+    current = ""
+    for sep, unit in _units(text, budget):
+        if current and len(current) + len(sep) + len(unit) > budget:
+            pieces.append(current)
+            current = ""
+        current = current + sep + unit if current else unit
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def section_size(header, body):
+    return len(header) + len(body) + 3  # "\n\n" + header + "\n" + body
+
+
+def make_chunks(sections, budget_chars, sizes=None):
+    """Packs (header, body) file sections into chunks of at most ~budget_chars.
+
+    `sizes` gives each section's size in the unit of the budget (e.g. tokens) instead of
+    characters. Returns a list of chunks, each a list of (header, body) sections; the text
+    is not copied except where an oversized file has to be cut into parts.
+    """
+    sizes = sizes or [section_size(h, b) for h, b in sections]
+    if sum(sizes) <= budget_chars:
+        return [list(sections)]
+    chunks = []
+    current = []
+    size = 0
+    for (header, body), block in zip(sections, sizes):
+        if block <= budget_chars:
+            if current and size + block > budget_chars:
+                chunks.append(current)
+                current, size = [], 0
+            current.append((header, body))
+            size += block
+            continue
+        # oversized file: flush what we have and give its pieces their own chunks
+        if current:
+            chunks.append(current)
+            current, size = [], 0
+        chars_per_unit = section_size(header, body) / block
+        pieces = split_text(body, max(1000, int((budget_chars - 32) * chars_per_unit) - len(header)))
+        for n, piece in enumerate(pieces, 1):
+            chunks.append([(header[:-4] + f" (part {n}/{len(pieces)}) ---", piece)])
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def render_sections(sections):
+    """The raw-data pieces for a list of sections, ready for a single join."""
+    pieces = []
+    for header, body in sections:
+        pieces.extend(("\n\n", header, "\n", body))
+    return pieces
+
+
+# --- REDUCE ---
+
+def _normalize(title):
+    title = re.sub(r'^[\d.\s]+', '', title.strip().lower())
+    title = re.sub(r'^(category|part|section)\s+\w+\s*[:.\-]\s*', '', title)
+    return re.sub(r'[^a-z0-9]+', ' ', title).strip()
+
+
+class _Category:
+    def __init__(self, title):
+        self.title = title
+        self.lines = []
+        self.subtopics = OrderedDict()  # normalized -> [title, lines]
+
+
+def _parse_guide(text):
+    """Returns (preamble_lines, [categories]) for one partial guide."""
+    preamble = []
+    categories = []
+    current = None
+    sub = None
+    in_code = False
+    for line in text.split("\n"):
+        if line.strip().startswith("```"):
+            in_code = not in_code
+        if not in_code and line.startswith("## "):
+            current = _Category(line[3:].strip())
+            categories.append(current)
+            sub = None
+            continue
+        if not in_code and line.startswith("### ") and current is not None:
+            key = _normalize(line[4:]) or line[4:].strip()
+            sub = current.subtopics.setdefault(key, [line[4:].strip(), []])
+            continue
+        if current is None:
+            preamble.append(line)
+        elif sub is not None:
+            sub[1].append(line)
+        else:
+            current.lines.append(line)
+    return preamble, categories
+
+
+def _append_block(target, lines):
+    lines = _trim(lines)
+    if not lines:
+        return
+    if target:
+        target.append("")
+    target.extend(lines)
+
+
+def _trim(lines):
+    start, end = 0, len(lines)
+    while start < end and not lines[start].strip():
+        start += 1
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    return lines[start:end]
+
+
+def _glossary_entries(lines, entries, extra):
+    for line in lines:
+        if not line.strip() or TABLE_SEPARATOR_RE.match(line.strip()):
+            continue
+        m = GLOSSARY_ENTRY_RE.match(line) or GLOSSARY_ROW_RE.match(line)
+        if m and m.group(1).strip().lower() in ("term", "terms", "key term"):
+            continue  # table header row
+        if m:
+            term = m.group(1).strip().rstrip(":")
+            entries.setdefault(_normalize(term) or term.lower(), (term, m.group(2).strip()))
+        elif line not in extra:
+            extra.append(line)
+
+
+def _stray_lines(lines, title_lines):
+    """A later part's text before its first category, as lines for the Other Notes category.
+
+    Its repeat of the guide title is dropped; other H1 headings become sub-topic headings.
+    """
+    out = []
+    for line in _trim(lines):
+        if line.startswith("# "):
+            if line.strip() in title_lines:
+                continue
+            line = "##" + line
+        out.append(line)
+    return _trim(out)
+
+
+def merge_guides(texts):
+    """Merges partial study guides into one Markdown guide."""
+    if len(texts) == 1:
+        return texts[0]
+    preamble = []
+    merged = OrderedDict()
+    glossary = {}
+    glossary_extra = []
+    glossary_title = "Glossary"
+    for i, text in enumerate(texts):
+        lines_before, categories = _parse_guide(text)
+        if i == 0:
+            preamble = _trim(lines_before)
+        else:
+            stray = _stray_lines(lines_before, {line.strip() for line in preamble})
+            if stray:
+                other = _Category(OTHER_NOTES_TITLE)
+                other.lines = stray
+                categories.insert(0, other)
+        for cat in categories:
+            if GLOSSARY_TITLE_RE.search(cat.title):
+                glossary_title = cat.title if not glossary else glossary_title
+                _glossary_entries(cat.lines, glossary, glossary_extra)
+                for _, sub_lines in cat.subtopics.values():
+                    _glossary_entries(sub_lines, glossary, glossary_extra)
+                continue
+            key = _normalize(cat.title) or cat.title
+            target = merged.get(key)
+            if target is None:
+                target = merged[key] = _Category(cat.title)
+            _append_block(target.lines, cat.lines)
+            for sub_key, (sub_title, sub_lines) in cat.subtopics.items():
+                entry = target.subtopics.setdefault(sub_key, [sub_title, []])
+                _append_block(entry[1], sub_lines)
+
+    out = list(preamble)
+    for cat in merged.values():
+        if out:
+            out.append("")
+        out.append(f"## {cat.title}")
+        if cat.lines:
+            out.extend([""] + cat.lines)
+        for sub_title, sub_lines in cat.subtopics.values():
+            out.extend(["", f"### {sub_title}"])
+            if sub_lines:
+                out.extend([""] + sub_lines)
+    if glossary or glossary_extra:
+        out.extend(["", f"## {glossary_title}", ""])
+        for term, definition in sorted(glossary.values(), key=lambda e: e[0].lower()):
+            out.append(f"- **{term}**: {definition}" if definition else f"- **{term}**")
+        if glossary_extra:
+            out.extend([""] + glossary_extra)
+    return "\n".join(out).strip() + "\n"
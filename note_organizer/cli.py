@@ -0,0 +1,290 @@
+"""Command line entry point: `python -m note_organizer batch <dir> --out <dir>` (also export, index, search)."""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from . import cache, config, engine, export, files_api, formats, gemini, jobs, ocr, project, search, segments, tokens, trace
+
+
+def print_job(job, done, total, lock, details=False):
+    with lock:
+        line = f"[{done}/{total}] {job.name}: {job.status}"
+        print(line + (f" ({job.detail})" if job.detail else ""))
+        if job.status in (jobs.DONE, jobs.FAILED):
+            for label, seconds in job.file_timings:
+                print(f"    read  {seconds:7.2f}s  {label}")
+            if details and job.trace is not None:
+                print("    " + job.trace.report().replace("\n", "\n    "))
+
+
+def run_batch(args):
+    cfg = config.load_config()
+    trace.configure(cfg)
+    if args.metrics:
+        trace.set_metrics_file(args.metrics, args.openmetrics)
+    api_key = config.get_api_key(cfg)
+    api_url = config.get_api_url(cfg)
+    if not api_key:
+        print("Error: API Key missing. Please check config.json or set GEMINI_API_KEY environment variable.", file=sys.stderr)
+        return 2
+    try:
+        fmts = export.parse_formats(args.formats) if args.formats else export.formats_from_config(cfg)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if not check_formats(fmts):
+        return 2
+    missing = engine.missing_dependencies()
+    if missing:
+        print("Warning: missing " + ", ".join(missing) + "; those files are listed but not read.", file=sys.stderr)
+
+    guides = jobs.find_guides(args.source, per_file=args.per_file)
+    if not guides:
+        print(f"No supported files found under {args.source}")
+        return 1
+
+    workers = args.workers or config.get_int(cfg, "MAX_WORKERS", jobs.DEFAULT_WORKERS)
+    if args.estimate:
+        return estimate_batch(args, cfg, guides, workers)
+    limiter = jobs.RateLimiter(
+        args.rpm if args.rpm is not None else config.get_int(cfg, "REQUESTS_PER_MINUTE", jobs.DEFAULT_REQUESTS_PER_MINUTE),
+        args.tpm if args.tpm is not None else config.get_int(cfg, "TOKENS_PER_MINUTE", jobs.DEFAULT_TOKENS_PER_MINUTE),
+    )
+    response_cache = None if args.no_cache else cache.open_cache(cfg)
+    client = gemini.open_client(cfg)  # shared by every job, so connections stay warm
+    lock = threading.Lock()
+    finished = []
+
+    def on_update(job):
+        if job.status in (jobs.DONE, jobs.FAILED):
+            finished.append(job)
+        print_job(job, len(finished), len(guides), lock, args.details)
+
+    queue = jobs.JobQueue(api_url, api_key, workers=workers, limiter=limiter,
+                          max_retries=args.retries, on_update=on_update, cache=response_cache,
+                          chunk_chars=config.get_chunk_chars(cfg),
+                          extraction_cache=None if args.no_cache else cache.open_extraction_cache(cfg),
+                          tile_images=config.get_tile_images(cfg), ocr_language=ocr.language_from_config(cfg),
+                          dedup=config.get_dedup(cfg),
+                          uploader=None if args.no_upload else files_api.open_uploader(cfg, client),
+                          index=search.open_index(cfg))
+    batch_start = time.perf_counter()
+    for name, paths in guides:
+        out_path = os.path.join(args.out, name + ".docx")
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        project_path = out_path[:-len(".docx")] + project.PROJECT_EXTENSION if args.incremental else None
+        queue.submit(jobs.CompileJob(name, paths, out_path, args.instructions, save_markdown=args.markdown,
+                                     project_path=project_path, formats=fmts))
+    try:
+        results = queue.wait()
+    except KeyboardInterrupt:
+        queue.cancel()
+        print("Cancelled.", file=sys.stderr)
+        return 130
+
+    failures = [j for j in results if j.status != jobs.DONE]
+    print(f"Done: {len(results) - len(failures)}/{len(results)} guides in {time.perf_counter() - batch_start:.2f}s "
+          f"with {workers} workers" + (f"; {response_cache.stats_text()}" if response_cache else ""))
+    for job in failures:
+        print(f"  Failed: {job.name}: {job.detail}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def check_formats(fmts):
+    """False (after printing why) if a chosen export format needs a package that is not installed."""
+    for fmt in fmts:
+        missing = export.missing_dependency(fmt)
+        if missing:
+            print(f"Error: {missing} not installed (needed for {fmt})", file=sys.stderr)
+            return False
+    if "anki" in fmts and not formats.GENANKI_AVAILABLE:
+        print("Note: genanki not installed; flashcards are written as a tab-separated file for Anki's File > Import.",
+              file=sys.stderr)
+    return True
+
+
+def estimate_batch(args, cfg, guides, workers):
+    """Prints what each guide would send, cost and take, without calling generateContent."""
+    api_url = config.get_api_url(cfg)
+    chunk_chars = config.get_chunk_chars(cfg)
+    limits = tokens.limits_from_config(cfg, api_url)
+    response_cache = None if args.no_cache else cache.open_cache(cfg)
+    count = tokens.open_counter(cfg, gemini.open_client(cfg), response_cache)
+    extraction_cache = None if args.no_cache else cache.open_extraction_cache(cfg)
+    estimates = []
+    failures = 0
+    for name, paths in guides:
+        bundle = segments.SourceBundle(config.get_dedup(cfg))
+        bundle.add_files(paths, cache=extraction_cache, tile=config.get_tile_images(cfg),
+                         ocr_language=ocr.language_from_config(cfg))
+        try:
+            if args.incremental:
+                proj = project.Project(os.path.join(args.out, name + project.PROJECT_EXTENSION))
+                est = proj.estimate(bundle, api_url, args.instructions, chunk_chars, engine.MAP_WORKERS, limits, count)
+            else:
+                est = engine.estimate_bundle(bundle, api_url, args.instructions, chunk_chars, engine.MAP_WORKERS, limits, count)
+        except Exception as e:
+            failures += 1
+            print(f"  {name}: cannot be sent: {e}", file=sys.stderr)
+            continue
+        estimates.append(est)
+        duplicates = bundle.duplicate_summary()
+        print(f"  {name}: {est.summary()}" + (f" ({duplicates})" if duplicates else ""))
+    # guides run `workers` at a time; their own parts are already in each estimate's time
+    seconds = sorted((e.seconds for e in estimates), reverse=True)
+    total = tokens.Estimate(sum(e.requests for e in estimates), sum(e.input_tokens for e in estimates),
+                            sum(e.output_tokens for e in estimates), sum(e.cost for e in estimates),
+                            sum(seconds[i] for i in range(0, len(seconds), max(1, workers))),
+                            exact=all(e.exact for e in estimates) and bool(estimates))
+    print(f"Total for {len(estimates)} guides: {total.summary()} (model {config.get_model_name(cfg)})")
+    return 1 if failures else 0
+
+
+def run_export(args):
+    """Writes guides saved as Markdown (batch --markdown or --formats md) in other formats, all in one pass."""
+    cfg = config.load_config()
+    trace.configure(cfg)
+    try:
+        fmts = export.parse_formats(args.formats) if args.formats else export.formats_from_config(cfg)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if not check_formats(fmts):
+        return 2
+    if os.path.isdir(args.source):
+        sources = sorted(os.path.join(root, n) for root, _, names in os.walk(args.source)
+                         for n in names if n.lower().endswith(".md"))
+        base_dir = args.source
+    else:
+        sources = [args.source]
+        base_dir = os.path.dirname(args.source)
+    if not sources:
+        print(f"No .md guides found under {args.source}")
+        return 1
+
+    guides = []
+    for path in sources:
+        rel = os.path.splitext(os.path.relpath(path, base_dir))[0]
+        base = os.path.join(args.out, rel)
+        os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+        with open(path, encoding="utf-8") as f:
+            guides.append((f.read(), base))
+    source_paths = {os.path.abspath(p) for p in sources}
+    if "md" in fmts and any(os.path.abspath(base + ".md") in source_paths for _, base in guides):
+        fmts = [f for f in fmts if f != "md"]  # it would overwrite the guides being read
+        print("Note: md skipped; it would overwrite the source guides.", file=sys.stderr)
+        if not fmts:
+            return 1
+
+    def on_progress(done, total, result):
+        status = f"failed: {result['error']}" if result["error"] else f"{result['bytes'] / 1e3:,.0f} KB"
+        print(f"[{done}/{total}] {os.path.relpath(result['path'], args.out)}: {status} ({result['seconds']:.2f}s)")
+
+    start = time.perf_counter()
+    with trace.run("export", guides=len(guides)) as run_trace:
+        results = export.export_guides(guides, fmts, workers=args.workers, on_progress=on_progress)
+    failures = [r for r in results if r["error"]]
+    print(f"Done: {len(results) - len(failures)}/{len(results)} files from {len(guides)} guides "
+          f"in {time.perf_counter() - start:.2f}s")
+    if args.details:
+        print(run_trace.report())
+    return 1 if failures else 0
+
+
+def run_index(args):
+    cfg = config.load_config()
+    index = search.open_index(cfg)
+    if index is None:
+        print("Error: search index disabled (SEARCH_INDEX in config.json)", file=sys.stderr)
+        return 2
+    paths = [p for _, group in jobs.find_guides(args.source, per_file=True) for p in group]
+    if not paths:
+        print(f"No supported files found under {args.source}")
+        return 1
+    start = time.perf_counter()
+    bundle = segments.SourceBundle()
+    bundle.add_files(paths, cache=cache.open_extraction_cache(cfg), tile=config.get_tile_images(cfg),
+                     ocr_language=ocr.language_from_config(cfg))
+    added = index.add_sources(bundle.segments)
+    stats = index.stats()
+    print(f"Indexed {added} new or changed of {len(paths)} files in {time.perf_counter() - start:.2f}s "
+          f"({stats.get('source', 0)} sources, {stats.get('guide', 0)} guides in the index)")
+    return 0
+
+
+def run_search(args):
+    cfg = config.load_config()
+    index = search.open_index(cfg)
+    if index is None:
+        print("Error: search index disabled (SEARCH_INDEX in config.json)", file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    hits = index.search(" ".join(args.query), limit=args.limit, kind=args.kind)
+    elapsed = (time.perf_counter() - start) * 1000
+    for n, hit in enumerate(hits, 1):
+        print(f"{n:3}. {search.location(hit)}")
+        if hit["path"]:
+            print(f"     {hit['path']}")
+        print(f"     {' '.join(hit['snippet'].split())}")
+    print(f"{len(hits)} results in {elapsed:.1f} ms")
+    return 0 if hits else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="note_organizer", description="Organize notes into study guides.")
+    sub = parser.add_subparsers(dest="command")
+
+    batch = sub.add_parser("batch", help="Compile every folder of course material under a directory, without the GUI.")
+    batch.add_argument("source", help="folder tree with .txt, .pdf and image files")
+    batch.add_argument("--out", required=True, help="folder the guides are written to")
+    batch.add_argument("--instructions", default="", help="extra instructions for the model")
+    batch.add_argument("--per-file", action="store_true", help="compile one guide per file instead of per folder")
+    batch.add_argument("--formats", help=f"export formats, comma-separated: {', '.join(export.FORMATS)} "
+                                         "(config EXPORT_FORMATS, default docx)")
+    batch.add_argument("--markdown", action="store_true", help="also save the Markdown of each guide (same as adding md to --formats)")
+    batch.add_argument("--workers", type=int, help=f"guides compiled at once (config MAX_WORKERS, default {jobs.DEFAULT_WORKERS})")
+    batch.add_argument("--rpm", type=int, help="requests per minute allowed by your API quota, 0 for no limit (config REQUESTS_PER_MINUTE)")
+    batch.add_argument("--tpm", type=int, help="tokens per minute allowed by your API quota, 0 for no limit (config TOKENS_PER_MINUTE)")
+    batch.add_argument("--retries", type=int, default=jobs.DEFAULT_MAX_RETRIES, help="retries for rate-limit and server errors")
+    batch.add_argument("--incremental", action="store_true",
+                       help="keep a .noteproj file per guide and only re-organize files that changed since the last run")
+    batch.add_argument("--no-upload", action="store_true", help="send images and scanned PDFs inline instead of through the File API")
+    batch.add_argument("--no-cache", action="store_true", help="re-read every file and call the API, even for unchanged inputs")
+    batch.add_argument("--estimate", action="store_true",
+                       help="only print the tokens, cost and time each guide would take; nothing is compiled")
+    batch.add_argument("--details", action="store_true", help="print where each guide's time went, stage by stage")
+    batch.add_argument("--metrics", metavar="PATH",
+                       help="write Prometheus text-format metrics to PATH after each guide (config METRICS_FILE)")
+    batch.add_argument("--openmetrics", action="store_true", help="write --metrics in the OpenMetrics format instead")
+    batch.set_defaults(func=run_batch)
+
+    exp = sub.add_parser("export", help="Write saved Markdown guides as DOCX, HTML, Markdown, PDF or Anki flashcards.")
+    exp.add_argument("source", help="a .md guide, or a folder tree of them")
+    exp.add_argument("--out", required=True, help="folder the files are written to (subfolders are kept)")
+    exp.add_argument("--formats", help=f"comma-separated: {', '.join(export.FORMATS)} (config EXPORT_FORMATS, default docx)")
+    exp.add_argument("--workers", type=int, help="files rendered at once (default: one per processor core)")
+    exp.add_argument("--details", action="store_true", help="print how long each format took")
+    exp.set_defaults(func=run_export)
+
+    index = sub.add_parser("index", help="Add every file under a folder to the search index, without compiling.")
+    index.add_argument("source", help="folder tree with .txt, .pdf and image files")
+    index.set_defaults(func=run_index)
+
+    find = sub.add_parser("search", help="Search indexed source files and generated guides.")
+    find.add_argument("query", nargs="+", help="words to look for; the last one also matches as a prefix")
+    find.add_argument("--limit", type=int, default=20, help="number of results (default 20)")
+    find.add_argument("--kind", choices=["source", "guide"], help="only search source files or only guides")
+    find.set_defaults(func=run_search)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.command:
+        # No subcommand: start the desktop app
+        from .gui import main as gui_main
+        gui_main()
+        return 0
+    return args.func(args)
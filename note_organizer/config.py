@@ -0,0 +1,80 @@
+import json
+import os
+
+from . import chunking
+
+# config.json lives next to the package (the folder users download and edit)
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+
+def load_config(path=None):
+    """Reads config.json. Returns an empty dict if the file is missing or broken."""
+    path = path or CONFIG_PATH
+    if not os.path.exists(path):
+        print(f"Warning: config.json not found at {path}")
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Config Loading Error: {e}")
+        return {}
+
+
+def save_config_value(key, value, path=None):
+    """Updates a single key in config.json, if the file exists."""
+    path = path or CONFIG_PATH
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    cfg[key] = value
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cfg, f, indent=2, ensure_ascii=False)
+
+
+def get_api_key(cfg):
+    # API key priority: config file, then environment variables
+    return cfg.get("GEMINI_API_KEY") or cfg.get("API_KEY") or os.environ.get("GEMINI_API_KEY") or os.environ.get("API_KEY") or ""
+
+
+def get_int(cfg, key, default):
+    try:
+        return int(cfg.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_chunk_chars(cfg):
+    # CHUNK_TOKENS is the most input sent in one request; bigger inputs are split
+    return get_int(cfg, "CHUNK_TOKENS", chunking.DEFAULT_CHUNK_TOKENS) * chunking.CHARS_PER_TOKEN
+
+
+def get_dedup(cfg):
+    # leave out files that repeat other loaded files (see dedup.py)
+    return bool(cfg.get("DEDUP", True))
+
+
+def get_tile_images(cfg):
+    # cut very large scanned pages into tiles instead of shrinking them (see imaging.py)
+    return bool(cfg.get("TILE_LARGE_IMAGES", False))
+
+
+def get_cache_dir(cfg):
+    return os.path.expanduser(cfg.get("CACHE_DIR") or os.path.join("~", ".note_organizer"))
+
+
+def get_model_name(cfg):
+    return cfg.get("GEMINI_MODEL", DEFAULT_MODEL)
+
+
+def get_api_base(cfg):
+    # Overridable so a local mock server can stand in for Google
+    return (cfg.get("GEMINI_API_BASE") or os.environ.get("GEMINI_API_BASE") or API_BASE_URL).rstrip("/")
+
+
+def get_api_url(cfg):
+    return f"{get_api_base(cfg)}/models/{get_model_name(cfg)}:generateContent"
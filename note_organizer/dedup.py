@@ -0,0 +1,122 @@
+"""Near-duplicate detection for loaded files, so overlapping material is sent once.
+
+Text: each file is cut into overlapping runs of SHINGLE_WORDS words (shingles),
+with case, punctuation and line breaks ignored so a PDF and a .txt copy of the
+same notes match. Only shingles that start at an anchor word (one whose hash
+falls in a fixed 1-in-SAMPLE_RATE slice) are kept; because the anchors are the
+same for every file, the kept shingles are a sample of each file that can be
+compared directly, and only they are hashed. A file whose sample is
+mostly (DUPLICATE_CONTAINMENT) found in one other file repeats it, whatever the
+two files' sizes: the same lecture notes twice, or one exported slide against
+the whole deck. When each of two files is mostly found in the other (a lecture
+and its revision with a section added), the longer one is kept.
+
+Images: perceptual hashes (see imaging.phash) a few bits apart are the same picture.
+Images of text (slides, pages) have no hash, since slides made from the same template
+hash alike whatever they say; read with OCR, they are compared by their text. Without
+OCR they are compared by layout (see imaging.layout), a grayscale copy fine enough to
+tell two slides' text apart, against each other and against the unread (scanned) pages
+of PDFs: the same slides loaded as PNGs and as a PDF of page images are sent once, as
+the PDF. Only near-identical copies match this way; a PDF with a text layer and images
+of its pages need OCR to be compared.
+
+Signatures are made in the ingest workers and kept in the extraction cache.
+"""
+import string
+import zlib
+
+try:
+    from . import imaging
+except ImportError:  # without Pillow no image has a layout
+    imaging = None
+
+SHINGLE_WORDS = 5
+SAMPLE_RATE = 8  # keep shingles starting at words whose hash is a multiple of this
+MIN_SAMPLES = 16  # files with fewer sampled shingles (about 130 words) are too short to judge
+DUPLICATE_CONTAINMENT = 0.8  # share of a file's sample found in another file for it to count as a repeat
+DUPLICATE_DISTANCE = 6  # images whose pHashes differ in this many bits or fewer are the same picture
+LAYOUT_CELLS = 1  # images of text whose layouts differ in this many cells or fewer are the same page
+
+PUNCTUATION = string.punctuation.encode("ascii")
+
+
+def text_signature(text):
+    """The sampled shingle hashes of `text`, sorted; None if the text is too short to compare."""
+    # crc32 rather than hash(): signatures are made in worker processes and cached on disk
+    words = text.lower().encode("utf-8", "surrogatepass").translate(None, PUNCTUATION).split()
+    anchors = map(zlib.crc32, words[:len(words) - SHINGLE_WORDS + 1])
+    sample = {zlib.crc32(b" ".join(words[i:i + SHINGLE_WORDS])) for i, h in enumerate(anchors) if h % SAMPLE_RATE == 0}
+    return sorted(sample) if len(sample) >= MIN_SAMPLES else None
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def same_layout(a, b):
+    return imaging.layout_distance(a, b) <= LAYOUT_CELLS
+
+
+class DuplicateIndex:
+    """The files already seen, for finding which earlier file a new one repeats.
+
+    Works on segments.Segment: reads `phash`, `shingles` and `layouts`, sets `duplicate_of`.
+    """
+
+    def __init__(self):
+        self.images = []  # segments with a pHash that are sent
+        self.layouts = []  # (layout, segment) of images of text and unread PDF pages that are sent
+        self.postings = {}  # sampled shingle -> segments that contain it
+
+    def add(self, seg):
+        """Marks `seg` if it repeats an earlier file, or earlier files if they are contained in `seg`.
+
+        Returns the earlier segments that became duplicates (their sections must be relaid out).
+        """
+        seg.duplicate_of = None
+        if seg.phash is not None:
+            seg.duplicate_of = next((o for o in self.images
+                                     if o.duplicate_of is None and hamming(seg.phash, o.phash) <= DUPLICATE_DISTANCE), None)
+            if seg.duplicate_of is not None:
+                return []
+            self.images.append(seg)
+        if seg.kind == "image" and seg.layouts:
+            seg.duplicate_of = next((o for layout, o in self.layouts
+                                     if o.duplicate_of is None and same_layout(seg.layouts[0], layout)), None)
+            if seg.duplicate_of is not None:
+                return []
+        contained = self._add_text(seg)
+        if seg.duplicate_of is not None:
+            return []
+        if seg.kind == "pdf" and seg.layouts:
+            # images of this PDF's pages loaded before it, e.g. a slide exported on its own
+            images = dict.fromkeys(o for _, o in self.layouts if o.kind == "image" and o.duplicate_of is None)
+            pages = [o for o in images if any(same_layout(o.layouts[0], layout) for layout in seg.layouts)]
+            for other in pages:
+                other.duplicate_of = seg
+            contained += pages
+        self.layouts += [(layout, seg) for layout in seg.layouts or ()]
+        return contained
+
+    def _add_text(self, seg):
+        if not seg.shingles:
+            return []
+        shared = {}
+        for h in seg.shingles:
+            for other in self.postings.get(h, ()):
+                if other.duplicate_of is None:
+                    shared[other] = shared.get(other, 0) + 1
+        # the most similar earlier file first, so a repeat points at its closest original
+        for other, count in sorted(shared.items(), key=lambda item: -item[1]):
+            if count < DUPLICATE_CONTAINMENT * len(seg.shingles):
+                break
+            if count >= DUPLICATE_CONTAINMENT * len(other.shingles) and len(seg.shingles) > len(other.shingles):
+                continue  # a longer version of `other`: this one is kept and `other` marked below
+            seg.duplicate_of = other
+            return []
+        contained = [other for other, count in shared.items() if count >= DUPLICATE_CONTAINMENT * len(other.shingles)]
+        for other in contained:
+            other.duplicate_of = seg  # e.g. one slide's text loaded before the whole deck
+        for h in seg.shingles:
+            self.postings.setdefault(h, []).append(seg)
+        return contained
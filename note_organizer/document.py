@@ -0,0 +1,232 @@
+"""The intermediate document model shared by every export format.
+
+A guide (the model's Markdown output) is parsed once, line by line, into a flat
+list of Blocks: headings, paragraphs, quotes, list items, code blocks, tables and
+rules. Their text is a list of Runs, each plain or bold/italic/code. The DOCX,
+HTML, Markdown, PDF and Anki renderers (docx_render.py, formats.py) all walk the
+same Document, so a guide exported to several formats is parsed only once and the
+formats agree on what a heading, list or table is.
+
+Plain classes and tuples only: Documents are sent to export worker processes.
+"""
+import collections
+import re
+
+from .chunking import GLOSSARY_TITLE_RE
+
+TITLE = "Study Guide"
+
+# Block kinds
+HEADING = "heading"  # level is the number of #s (1-6)
+PARAGRAPH = "paragraph"
+QUOTE = "quote"
+LIST_ITEM = "list_item"  # level is the nesting depth (1 = top); ordered for 1. 2. 3. lists
+CODE = "code"  # text holds the lines of a fenced block
+TABLE = "table"  # rows hold one list of Runs per cell; header marks a header row
+RULE = "rule"
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+LIST_RE = re.compile(r'^(\s*)([-*+]|\d+[.)])\s+(.*)$')
+TABLE_ROW_RE = re.compile(r'^\s*\|.*\|')
+TABLE_SEPARATOR_RE = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+QUOTE_RE = re.compile(r'^\s*>\s?(.*)$')
+RULE_RE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+INLINE_RE = re.compile(
+    r'(`+)(.+?)\1'                              # code
+    r'|\*\*\*(.+?)\*\*\*'                       # bold italic
+    r'|\*\*(.+?)\*\*|__(.+?)__'                 # bold
+    r'|\*(?!\s)(.+?)(?<!\s)\*'                  # italic
+    r'|(?<![\w])_(?!\s)(.+?)(?<!\s)_(?![\w])'   # italic
+)
+# characters XML 1.0 does not allow; models occasionally emit them
+INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+TERM_SEPARATORS = ":-–— "  # after a bold term: "**Term**: ...", "**Term** - ...", "**Term** — ..."
+PLAIN_TERM_RE = re.compile(r'^(.{1,80}?)\s*(?::|\s[-–—]\s)\s*(.+)$')
+
+Run = collections.namedtuple("Run", "text bold italic code", defaults=(False, False, False))
+
+
+class Block:
+    """One heading, paragraph, quote, list item, code block, table or rule (see the kinds above)."""
+
+    __slots__ = ("kind", "runs", "level", "ordered", "rows", "header", "text")
+
+    def __init__(self, kind, runs=(), level=0, ordered=False, rows=None, header=False, text=None):
+        self.kind = kind
+        self.runs = runs
+        self.level = level
+        self.ordered = ordered
+        self.rows = rows
+        self.header = header
+        self.text = text
+
+
+class Document:
+    """A parsed guide: a title and its blocks in order."""
+
+    def __init__(self, blocks, title=TITLE):
+        self.title = title
+        self.blocks = blocks
+
+    def glossary(self):
+        """(term, definition Runs) pairs from the guide's glossary section, in order.
+
+        The section starts at a heading like "Glossary" or "Key Terms" and ends at the next heading of
+        the same or a higher level. Entries are list items or paragraphs like "**Term**: meaning"
+        or "Term - meaning", or the rows of a two-column table.
+        """
+        entries = []
+        section = None  # level of the glossary heading while inside it
+        for block in self.blocks:
+            if block.kind == HEADING:
+                if section is not None and block.level > section:
+                    continue  # a sub-heading inside the glossary (e.g. one per letter)
+                section = block.level if GLOSSARY_TITLE_RE.search(plain(block.runs)) else None
+            elif section is None:
+                continue
+            elif block.kind in (LIST_ITEM, PARAGRAPH):
+                entry = split_term(block.runs)
+                if entry:
+                    entries.append(entry)
+            elif block.kind == TABLE:
+                for row in block.rows[1 if block.header else 0:]:
+                    if len(row) >= 2 and plain(row[0]).strip() and plain(row[1]).strip():
+                        entries.append((plain(row[0]).strip(), row[1]))
+        return entries
+
+
+# --- INLINE ---
+
+def parse_inline(text, bold=False, italic=False):
+    """The Runs of one line of Markdown, with **bold**, *italic* and `code` applied."""
+    runs = []
+    pos = 0
+    for m in INLINE_RE.finditer(text):
+        if m.start() > pos:
+            runs.append(Run(text[pos:m.start()], bold, italic))
+        code, bold_italic, strong, strong2, em, em2 = m.group(2, 3, 4, 5, 6, 7)
+        if code is not None:
+            runs.append(Run(code.strip(), bold, italic, True))
+        elif bold_italic is not None:
+            runs.extend(parse_inline(bold_italic, True, True))
+        elif strong is not None or strong2 is not None:
+            runs.extend(parse_inline(strong if strong is not None else strong2, True, italic))
+        else:
+            runs.extend(parse_inline(em if em is not None else em2, bold, True))
+        pos = m.end()
+    if pos < len(text):
+        runs.append(Run(text[pos:], bold, italic))
+    return runs
+
+
+def plain(runs):
+    return "".join(run.text for run in runs)
+
+
+def split_term(runs):
+    """(term, definition Runs) of a glossary line, or None if it does not look like one."""
+    if not runs:
+        return None
+    first = runs[0]
+    if first.bold and not first.code:
+        term = first.text.strip().rstrip(":").strip()
+        rest = list(runs[1:])
+        if rest:
+            rest[0] = rest[0]._replace(text=rest[0].text.lstrip(TERM_SEPARATORS))
+        rest = [run for run in rest if run.text]
+        if term and rest:
+            return term, rest
+        return None
+    m = PLAIN_TERM_RE.match(plain(runs))
+    if m is None:
+        return None
+    return m.group(1).strip(), [Run(m.group(2))]
+
+
+# --- PARSING ---
+
+class _Parser:
+    """Turns Markdown into Blocks one line at a time (see parse)."""
+
+    def __init__(self):
+        self.blocks = []
+        self.table = []
+        self.code = None  # lines of the open fenced block
+        self.list_indents = []
+
+    def list_item(self, indent, marker, text):
+        # indentation deeper than the previous item opens a nested level
+        while self.list_indents and indent < self.list_indents[-1]:
+            self.list_indents.pop()
+        if not self.list_indents or indent > self.list_indents[-1]:
+            self.list_indents.append(indent)
+        self.blocks.append(Block(LIST_ITEM, parse_inline(text), len(self.list_indents), marker[0].isdigit()))
+
+    def flush_table(self):
+        rows = self.table
+        self.table = []
+        if not rows:
+            return
+        header = len(rows) > 1 and TABLE_SEPARATOR_RE.match(rows[1]) is not None
+        cells = [[parse_inline(c.strip()) for c in row.strip().strip('|').split('|')]
+                 for row in rows if not TABLE_SEPARATOR_RE.match(row)]
+        if not cells:
+            return  # only separator rows
+        cols = max(len(r) for r in cells)
+        for row in cells:
+            row.extend([] for _ in range(cols - len(row)))
+        self.blocks.append(Block(TABLE, rows=cells, header=header))
+
+    def feed(self, line):
+        line = line.rstrip()
+        if FENCE_RE.match(line):
+            self.flush_table()
+            if self.code is None:
+                self.code = []
+            else:
+                self.blocks.append(Block(CODE, text="\n".join(self.code)))
+                self.code = None
+            return
+        if self.code is not None:
+            self.code.append(line)
+            return
+        if TABLE_ROW_RE.match(line):
+            self.table.append(line)
+            return
+        if self.table:
+            self.flush_table()
+        if not line.strip():
+            return
+        if RULE_RE.match(line):
+            self.blocks.append(Block(RULE))
+            return
+        m = LIST_RE.match(line)
+        if m:
+            self.list_item(len(m.group(1).expandtabs(4)), m.group(2), m.group(3))
+            return
+        self.list_indents = []
+        m = HEADING_RE.match(line)
+        if m:
+            self.blocks.append(Block(HEADING, parse_inline(m.group(2)), len(m.group(1))))
+            return
+        m = QUOTE_RE.match(line)
+        if m:
+            self.blocks.append(Block(QUOTE, parse_inline(m.group(1))))
+        else:
+            self.blocks.append(Block(PARAGRAPH, parse_inline(line.strip())))
+
+    def close(self):
+        self.flush_table()
+        if self.code is not None:
+            self.blocks.append(Block(CODE, text="\n".join(self.code)))  # a fence the model never closed
+        return self.blocks
+
+
+def parse(text, title=TITLE):
+    """Parses the model's Markdown output into a Document."""
+    parser = _Parser()
+    for line in INVALID_XML_RE.sub("", text).split('\n'):
+        parser.feed(line)
+    return Document(parser.close(), title)
@@ -0,0 +1,148 @@
+"""Single-pass DOCX renderer for a parsed guide (see document.py).
+
+Every block (heading, paragraph, list item, table, code line) is emitted as
+WordprocessingML text, and the whole body is parsed into the document in one go.
+This avoids python-docx's per-cell table API, whose cost grows with the size of
+the table. Supports headings, bold/italic/inline code, nested bullet and numbered
+lists, block quotes, fenced code and tables with a header row.
+"""
+import os
+from xml.sax.saxutils import escape
+
+from . import document, trace
+from .document import CODE, HEADING, LIST_ITEM, QUOTE, TABLE
+
+# Check for optional libraries
+try:
+    from docx import Document
+    from docx.oxml import parse_xml
+    DOCX_AVAILABLE = True
+except ImportError:
+    DOCX_AVAILABLE = False
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+CODE_FONT = "Consolas"
+MAX_LIST_LEVEL = 3  # the default template has List Bullet / List Bullet 2 / List Bullet 3
+
+
+def _run(text, bold=False, italic=False, code=False):
+    props = []
+    if code:
+        props.append(f'<w:rFonts w:ascii="{CODE_FONT}" w:hAnsi="{CODE_FONT}"/>')
+    if bold:
+        props.append('<w:b/>')
+    if italic:
+        props.append('<w:i/>')
+    rpr = f'<w:rPr>{"".join(props)}</w:rPr>' if props else ''
+    return f'<w:r>{rpr}<w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+
+def inline_runs(runs, bold=False):
+    """WordprocessingML runs for document.Runs; `bold` makes them all bold (table headers)."""
+    return [_run(text, b or bold, i, c) for text, b, i, c in runs]
+
+
+class _Styles:
+    """Style ids of the document template, looked up once per export."""
+
+    def __init__(self, doc):
+        self.ids = {}
+        for style in doc.styles:
+            self.ids[style.name] = style.style_id
+
+    def ppr(self, name):
+        style_id = self.ids.get(name)
+        return f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ''
+
+    def tbl_style(self, name):
+        style_id = self.ids.get(name)
+        return f'<w:tblStyle w:val="{style_id}"/>' if style_id else ''
+
+
+class DocxRenderer:
+    """Renders a document.Document into a python-docx Document (see module docstring)."""
+
+    def __init__(self, doc=None):
+        self.doc = doc or Document()
+        self.styles = _Styles(self.doc)
+        section = self.doc.sections[0]
+        # usable page width in twips, split evenly between table columns like add_table does
+        self.text_width = (section.page_width - section.left_margin - section.right_margin) // 635
+        self.out = []
+
+    def paragraph(self, runs, style=None):
+        self.out.append(f'<w:p>{self.styles.ppr(style) if style else ""}{"".join(runs)}</w:p>')
+
+    def table(self, rows, header):
+        cols = len(rows[0])
+        width = self.text_width // cols
+        tc_pr = f'<w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>'
+        xml = [
+            f'<w:tbl><w:tblPr>{self.styles.tbl_style("Table Grid")}'
+            '<w:tblW w:type="auto" w:w="0"/><w:tblLook w:firstRow="1" w:lastRow="0" w:firstColumn="1" '
+            'w:lastColumn="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr><w:tblGrid>',
+            f'<w:gridCol w:w="{width}"/>' * cols,
+            '</w:tblGrid>',
+        ]
+        for i, row in enumerate(rows):
+            bold = header and i == 0
+            xml.append('<w:tr>')
+            for cell in row:
+                xml.append(f'<w:tc>{tc_pr}<w:p>{"".join(inline_runs(cell, bold))}</w:p></w:tc>')
+            xml.append('</w:tr>')
+        xml.append('</w:tbl>')
+        self.out.append("".join(xml))
+
+    def block(self, block):
+        kind = block.kind
+        if kind == LIST_ITEM:
+            level = min(block.level, MAX_LIST_LEVEL)
+            style = "List Number" if block.ordered else "List Bullet"
+            self.paragraph(inline_runs(block.runs), style if level == 1 else f"{style} {level}")
+        elif kind == HEADING:
+            # ## is a category (Heading 1) and ### a sub-topic (Heading 2); the title is the only level 0
+            self.paragraph(inline_runs(block.runs), f"Heading {min(max(block.level - 1, 1), 9)}")
+        elif kind == TABLE:
+            self.table(block.rows, block.header)
+        elif kind == CODE:
+            for line in block.text.split("\n"):
+                self.paragraph([_run(line, code=True)])
+        elif kind == QUOTE:
+            self.paragraph(inline_runs(block.runs), "Quote")
+        elif kind != document.RULE:
+            self.paragraph(inline_runs(block.runs))
+
+    def render(self, parsed):
+        self.paragraph([_run(parsed.title)], "Title")
+        for block in parsed.blocks:
+            self.block(block)
+        self.commit()
+        return self.doc
+
+    def commit(self):
+        """Parses the collected blocks in one go and inserts them before the section properties."""
+        if not self.out:
+            return
+        body_xml = f'<w:body xmlns:w="{W_NS}">{"".join(self.out)}</w:body>'
+        self.out = []
+        body = self.doc.element.body
+        index = body.index(body.sectPr) if body.sectPr is not None else len(body)
+        body[index:index] = list(parse_xml(body_xml))
+
+
+def markdown_to_docx(text):
+    """Builds a python-docx Document from the model's Markdown output."""
+    return DocxRenderer().render(document.parse(text))
+
+
+def write_docx(parsed, path):
+    """Renders a document.Document and saves it to `path`."""
+    with trace.span("docx.render", blocks=len(parsed.blocks)):
+        doc = DocxRenderer().render(parsed)
+    with trace.span("docx.write") as s:
+        doc.save(path)
+        s.set(bytes=os.path.getsize(path))
+
+
+def export_docx(text, path):
+    write_docx(document.parse(text), path)
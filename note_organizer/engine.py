@@ -0,0 +1,232 @@
+"""Pipeline used by both the GUI and the batch CLI: ingest -> prompt -> Gemini -> DOCX.
+
+Requests run as coroutines on the shared asyncio loop (aio.py); compile_bundle is
+the blocking entry point for plain threads and scripts.
+Nothing in here may import tkinter; the batch mode runs on display-less hosts.
+"""
+import asyncio
+
+from . import aio, chunking, gemini, tokens, trace
+from .docx_render import DOCX_AVAILABLE, export_docx, markdown_to_docx
+from .gemini import ApiError, Cancelled, extract_output_text
+from .segments import SourceBundle
+from .ingest import PDF_AVAILABLE, PIL_AVAILABLE, SUPPORTED_EXTENSIONS
+
+# Limits
+MAX_RAW_CHARS = 200_000  # larger inputs are split into several requests and merged
+MAP_WORKERS = 4  # parallel requests per guide when it is split
+
+SYSTEM_INSTRUCTION = (
+    "Act as a professional Academic Editor. "
+    "Your goal is to restructure the raw input into a Master Study Guide. "
+    "1. SEGMENTATION: Organize content into distinct thematic categories. "
+    "2. TABLES: You MUST use Markdown tables for any comparative data, dates, pros/cons, or formulas. "
+    "3. FORMATTING: Use H2 (##) for Categories and H3 (###) for sub-topics. "
+    "4. GLOSSARY: End with a glossary of key terms."
+)
+
+
+def missing_dependencies():
+    missing = []
+    if not DOCX_AVAILABLE: missing.append("python-docx")
+    if not PDF_AVAILABLE: missing.append("pypdf")
+    if not PIL_AVAILABLE: missing.append("pillow")
+    return missing
+
+
+# --- PROMPT BUILD ---
+
+def build_prompt(raw_text, user_instr, part=None):
+    """Builds the prompt in one join. `raw_text` is a string or a list of pieces.
+
+    `part` is (index, total) when the input was split for map-reduce.
+    """
+    split_note = ""
+    if part:
+        split_note = (
+            f"This is part {part[0]} of {part[1]} of a larger input. The other parts are organized separately "
+            "and merged afterwards, so organize only this part and still end with a glossary of its terms.\n"
+        )
+    head = (
+        "Restructure the following input into a categorized study guide with tables.\n"
+        f"{split_note}"
+        f"User Instructions: {user_instr}\n\n"
+        "--- RAW DATA ---\n"
+    )
+    pieces = [raw_text] if isinstance(raw_text, str) else raw_text
+    return "".join([head, *pieces, "\n--- END RAW DATA ---\n"])
+
+
+def make_payload(raw_text, image_payloads, user_instr="", part=None):
+    parts = [{"text": build_prompt(raw_text, user_instr, part)}]
+    parts.extend(image_payloads)
+    return {
+        "contents": [{"parts": parts}],
+        "systemInstruction": {"parts": [{"text": SYSTEM_INSTRUCTION}]},
+    }
+
+
+def build_payload(bundle, user_instr=""):
+    return make_payload(bundle.raw_pieces(), bundle.media_payloads(), user_instr)
+
+
+def build_payloads(bundle, user_instr="", chunk_chars=MAX_RAW_CHARS, model=None):
+    """One payload per request of tokens.plan_requests(); inputs that fit give a single, unsplit request.
+
+    Prompts are assembled here, at send time, straight from the segment store. `model`
+    (a name or the API URL) sets the token limits each request is kept under.
+    """
+    plan = tokens.plan_requests(bundle, chunk_chars, model)
+    total = len(plan.requests)
+    if total == 1 and not plan.downscale:
+        return [build_payload(bundle, user_instr)]
+    return [make_payload(chunking.render_sections(sections), [part for seg in media for part in seg.media_parts(plan.downscale)],
+                         user_instr, (i + 1, total) if total > 1 else None)
+            for i, (sections, media, _) in enumerate(plan.requests)]
+
+
+def request_count(bundle, chunk_chars=MAX_RAW_CHARS, model=None):
+    """How many requests a compile of `bundle` will send, without building them."""
+    return len(tokens.plan_requests(bundle, chunk_chars, model).requests)
+
+
+def request_tokens(bundle, api_url, user_instr="", chunk_chars=MAX_RAW_CHARS, count=None):
+    """Input tokens of each request a compile of `bundle` sends, and the tokens.RequestPlan.
+
+    `count(payload)` returns exact input tokens (see tokens.count_tokens); without it the
+    requests are estimated locally and nothing is built. Raises ValueError, like
+    build_payloads, when a file is too large for any request.
+    """
+    plan = tokens.plan_requests(bundle, chunk_chars, api_url)
+    if count is not None:
+        return [count(p) for p in build_payloads(bundle, user_instr, chunk_chars, api_url)], plan
+    part = (1, len(plan.requests)) if len(plan.requests) > 1 else None
+    overhead = tokens.text_tokens(SYSTEM_INSTRUCTION) + tokens.text_tokens(build_prompt("", user_instr, part))
+    return [t + overhead for _, _, t in plan.requests], plan
+
+
+def estimate_bundle(bundle, api_url, user_instr="", chunk_chars=MAX_RAW_CHARS, workers=MAP_WORKERS,
+                    limits=None, count=None):
+    """Pre-flight tokens, cost and time of compiling `bundle`, as a tokens.Estimate (see request_tokens)."""
+    counts, plan = request_tokens(bundle, api_url, user_instr, chunk_chars, count)
+    return tokens.estimate(counts, limits or plan.limits, workers, exact=count is not None, downscale=plan.downscale)
+
+
+# --- MODEL CALL ---
+
+def call_gemini(api_url, api_key, payload, timeout=None):
+    """Sends one generateContent request over the shared pooled client and returns the generated text."""
+    return gemini.get_client(api_url, api_key).generate(payload, timeout)
+
+
+def stream_gemini(api_url, api_key, payload, on_text, cancelled=None, timeout=None):
+    """Streams one request, calling `on_text(delta)` as text arrives (see GeminiClient.stream)."""
+    return gemini.get_client(api_url, api_key).stream(payload, on_text, cancelled, timeout)
+
+
+async def cached_call_async(cache, api_url, payload, send):
+    """cached_call for the loop: `send(payload)` is a coroutine function; SQLite is used off the loop."""
+    if cache is None:
+        return await send(payload), False
+    with trace.span("cache.lookup") as s:
+        key = await asyncio.to_thread(cache.key_for, api_url, payload)
+        text = await asyncio.to_thread(cache.get, key)
+        s.set(hit=text is not None)
+    if text is not None:
+        return text, True
+    text = await send(payload)
+    if text:
+        await asyncio.to_thread(cache.put, key, api_url, text)
+    return text, False
+
+
+def cached_call(cache, api_url, api_key, payload, send=None):
+    """Answers from `cache` when the identical request was sent before, else sends it.
+
+    `send(payload)` defaults to a plain call_gemini. Returns (text, from_cache).
+    """
+    send = send or (lambda p: call_gemini(api_url, api_key, p))
+    if cache is None:
+        return send(payload), False
+    key = cache.key_for(api_url, payload)
+    text = cache.get(key)
+    if text is not None:
+        return text, True
+    text = send(payload)
+    if text:
+        cache.put(key, api_url, text)
+    return text, False
+
+
+async def compile_bundle_async(bundle, api_url, api_key, user_instr="", cache=None, send=None,
+                               workers=MAP_WORKERS, chunk_chars=MAX_RAW_CHARS, on_part=None,
+                               on_text=None, uploader=None, deadline=None):
+    """Organizes a bundle, splitting it into concurrent requests when it is too large for one.
+
+    Returns (guide_text, from_cache) where from_cache means no request reached the API.
+    `send(payload)` is a coroutine function returning the text; by default the payload goes
+    to the shared asyncio client, each request limited to `deadline` seconds (REQUEST_DEADLINE
+    when None). At most `workers` requests are in flight; `on_part(done, total)` is called
+    as each finishes. With `on_text`, a single-request compile is streamed and `on_text(delta)`
+    receives the text as it arrives; split inputs are merged at the end so they are not streamed.
+    With an `uploader` (files_api.UploadManager), large media is sent as File API references;
+    the cache key is still taken from the inline payload. Cancelling the task aborts the
+    requests in flight. A request answered without text raises ApiError rather than
+    leaving its part out of the guide.
+    """
+    # prompts are joined and scans read from disk off the loop
+    with trace.span("prompt.build") as s:
+        payloads = await asyncio.to_thread(build_payloads, bundle, user_instr, chunk_chars, api_url)
+        s.set(requests=len(payloads))
+    if send is None:
+        client = gemini.get_async_client(api_url, api_key)
+        if on_text and len(payloads) == 1:
+            send = lambda p: client.stream(p, on_text, deadline)
+        else:
+            send = lambda p: client.generate(p, deadline)
+    if uploader is not None:
+        send_inline = send
+
+        async def send(p):
+            return await send_inline(await asyncio.to_thread(uploader.swap_inline, p))
+    slots = asyncio.Semaphore(max(1, workers))
+    done = [0]
+
+    async def run(payload):
+        async with slots:
+            result = await cached_call_async(cache, api_url, payload, send)
+        done[0] += 1
+        if on_part:
+            on_part(done[0], len(payloads))
+        return result
+
+    results = await aio.gather(run(p) for p in payloads)
+    empty = [n for n, (text, _) in enumerate(results, 1) if not (text or "").strip()]
+    if empty:
+        # merging the other parts would quietly leave this part's files out of the guide
+        which = f" for part {empty[0]} of {len(results)}" if len(results) > 1 else ""
+        raise ApiError(200, f"The model returned no text{which}")
+    texts = [text for text, _ in results]
+    with trace.span("merge", parts=len(texts)):
+        guide = await asyncio.to_thread(chunking.merge_guides, texts)
+    return guide, all(hit for _, hit in results)
+
+
+def compile_bundle(bundle, api_url, api_key, user_instr="", cache=None, send=None,
+                   workers=MAP_WORKERS, chunk_chars=MAX_RAW_CHARS, on_part=None,
+                   on_text=None, cancelled=None, uploader=None, deadline=None):
+    """Blocking compile_bundle_async, for threads other than the loop's.
+
+    Here `send(payload)` is a plain blocking function (run in worker threads), and setting
+    `cancelled` (a threading.Event) stops the compile and raises Cancelled. Callbacks run
+    on the loop thread.
+    """
+    return aio.run(compile_bundle_async(
+        bundle, api_url, api_key, user_instr, cache=cache, send=aio.in_thread(send) if send else None,
+        workers=workers, chunk_chars=chunk_chars, on_part=on_part, on_text=on_text, uploader=uploader,
+        deadline=deadline,
+    ), cancelled)
+
+
+def compile_notes(bundle, api_url, api_key, user_instr="", cache=None, chunk_chars=MAX_RAW_CHARS):
+    return compile_bundle(bundle, api_url, api_key, user_instr, cache=cache, chunk_chars=chunk_chars)[0]
@@ -0,0 +1,161 @@
+"""Exports guides to several formats in one pass: DOCX, HTML, Markdown, PDF and Anki.
+
+Each guide is parsed once into a document.Document (see document.py) and every
+(guide, format) pair is rendered as its own task. Several tasks run in a process
+pool, like file reading in ingest.py, so a whole course exports on every core at
+once; a single small guide is rendered inline, where starting worker processes
+would cost more than they save. Callers that already have a pool (the batch
+JobQueue) pass it in.
+
+No tkinter here; the batch mode uses it too.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import document, docx_render, formats, ingest, trace
+
+# format -> description, in the order they are offered
+FORMATS = {
+    "docx": "Word document",
+    "html": "Web page",
+    "md": "Markdown",
+    "pdf": "PDF",
+    "anki": "Anki flashcards (glossary)",
+}
+DEFAULT_FORMATS = ["docx"]
+POOL_MIN_CHARS = 500_000  # guide characters x formats below which rendering inline is quicker than starting a pool
+
+
+def extension(fmt):
+    if fmt == "anki":
+        return ".apkg" if formats.GENANKI_AVAILABLE else ".txt"
+    return "." + fmt
+
+
+def missing_dependency(fmt):
+    """The package a format needs that is not installed, or None."""
+    if fmt == "docx" and not docx_render.DOCX_AVAILABLE:
+        return "python-docx"
+    if fmt == "pdf" and not formats.REPORTLAB_AVAILABLE:
+        return "reportlab"
+    return None
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if missing_dependency(fmt) is None]
+
+
+def parse_formats(value):
+    """A list of formats from "docx,html" or ["docx", "html"]. Raises ValueError for unknown ones."""
+    names = value.split(",") if isinstance(value, str) else list(value)
+    chosen = []
+    for name in names:
+        name = name.strip().lower().lstrip(".")
+        name = {"markdown": "md", "htm": "html", "apkg": "anki"}.get(name, name)
+        if name not in FORMATS:
+            raise ValueError(f"unknown export format '{name}' (choose from {', '.join(FORMATS)})")
+        if name not in chosen:
+            chosen.append(name)
+    return chosen
+
+
+def formats_from_config(cfg):
+    """EXPORT_FORMATS from config.json, or DEFAULT_FORMATS if it is missing or invalid."""
+    try:
+        return parse_formats(cfg.get("EXPORT_FORMATS") or DEFAULT_FORMATS) or list(DEFAULT_FORMATS)
+    except ValueError as e:
+        print(f"Config Error: {e}")
+        return list(DEFAULT_FORMATS)
+
+
+def render(parsed, fmt, path):
+    """Writes one format of a parsed guide. Never raises.
+
+    Returns {"format", "path", "bytes", "seconds", "error"}; error is None on success.
+    """
+    t0 = time.perf_counter()
+    error = None
+    try:
+        missing = missing_dependency(fmt)
+        if missing:
+            raise RuntimeError(f"{missing} not installed")
+        if fmt == "docx":
+            docx_render.write_docx(parsed, path)
+        elif fmt == "html":
+            formats.write_html(parsed, path)
+        elif fmt == "md":
+            formats.write_markdown(parsed, path)
+        elif fmt == "pdf":
+            formats.write_pdf(parsed, path)
+        else:
+            formats.write_anki(parsed, path, os.path.splitext(os.path.basename(path))[0])
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    size = os.path.getsize(path) if error is None else 0
+    return {"format": fmt, "path": path, "bytes": size, "seconds": time.perf_counter() - t0, "error": error}
+
+
+def export_guides(guides, fmts, pool=None, workers=None, on_progress=None):
+    """Writes every guide in every format. Returns the render() results, guide by guide.
+
+    `guides` holds (markdown_text, base_path) pairs; each file is base_path plus the
+    format's extension. `pool` may be a shared ProcessPoolExecutor. `on_progress(done,
+    total, result)` is called from the calling thread as each file is written.
+    """
+    tasks = []
+    with trace.span("export.parse", guides=len(guides)):
+        for text, base in guides:
+            parsed = document.parse(text)
+            tasks.extend((parsed, fmt, base + extension(fmt)) for fmt in fmts)
+    total = len(tasks)
+    results = [None] * total
+    done = [0]
+
+    def finish(i, result):
+        results[i] = result
+        done[0] += 1
+        attrs = {"file": os.path.basename(result["path"]), "bytes": result["bytes"]}
+        if result["error"]:
+            attrs["error"] = result["error"]
+        trace.record(f"export.{result['format']}", result["seconds"], **attrs)
+        if on_progress:
+            on_progress(done[0], total, result)
+
+    own_pool = None
+    workers = workers or ingest.default_workers()
+    if total < 2:
+        pool = None
+    elif pool is None and workers > 1 and sum(len(text) for text, _ in guides) * len(fmts) >= POOL_MIN_CHARS:
+        try:
+            own_pool = pool = ProcessPoolExecutor(max_workers=min(workers, total))
+        except (OSError, NotImplementedError):
+            pool = None  # no multiprocessing here (sandbox, frozen app): render inline
+    try:
+        if pool is None:
+            for i, task in enumerate(tasks):
+                finish(i, render(*task))
+            return results
+        futures = {}
+        for i, task in enumerate(tasks):
+            try:
+                futures[pool.submit(render, *task)] = i
+            except RuntimeError:  # a shared pool shut down meanwhile (a cancelled batch): render here
+                finish(i, render(*task))
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:  # the worker died, or the guide could not be sent to it
+                _, fmt, path = tasks[i]
+                result = {"format": fmt, "path": path, "bytes": 0, "seconds": 0.0, "error": str(e)}
+            finish(i, result)
+        return results
+    finally:
+        if own_pool is not None:
+            own_pool.shutdown()
+
+
+def failures_text(results):
+    """"name.pdf: reason; ..." for the files that could not be written, or ""."""
+    return "; ".join(f"{os.path.basename(r['path'])}: {r['error']}" for r in results if r["error"])
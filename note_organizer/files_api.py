@@ -0,0 +1,188 @@
+"""Uploads large media once through the Gemini File API and reuses the file URIs.
+
+Requests are always built with inline_data parts (so the response cache key does
+not depend on upload state). Right before sending, UploadManager.swap_inline()
+replaces big inline parts with file_data parts pointing at uploaded files. Uploads
+are remembered in SQLite by content hash until shortly before they expire (Google
+keeps them for 48 hours), so the same image or PDF is pushed only once. Uploads
+share the GeminiClient's pooled session and key header.
+"""
+import base64
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from . import config, gemini, tokens, trace
+
+MIN_UPLOAD_BYTES = 64 * 1024  # smaller inline parts are cheaper to just send
+DEFAULT_LIFETIME = 47 * 3600  # used when the API does not say when a file expires
+EXPIRY_MARGIN = 3600  # re-upload files that expire within the hour
+PROCESSING_TIMEOUT = 120
+UPLOAD_TIMEOUT = 300
+
+
+def upload_url(api_base):
+    # https://host/v1beta -> https://host/upload/v1beta/files
+    root, version = api_base.rstrip("/").rsplit("/", 1)
+    return f"{root}/upload/{version}/files"
+
+
+def _expiry(file_info):
+    stamp = file_info.get("expirationTime")
+    if stamp:
+        try:
+            return datetime.fromisoformat(stamp.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time() + DEFAULT_LIFETIME
+
+
+class UploadManager:
+    """Uploads inline media parts and hands back reusable file_data parts."""
+
+    def __init__(self, client, registry_path, min_bytes=MIN_UPLOAD_BYTES):
+        self.client = client
+        self.api_base = client.api_base
+        self.min_bytes = min_bytes
+        self.uploads = 0
+        self.reused = 0
+        self.lock = threading.Lock()
+        self.pending = {}  # digest -> Event, so two workers never upload the same file
+        self.part_tokens = {}  # file URI -> tokens of its content, for estimates of swapped requests
+        os.makedirs(os.path.dirname(registry_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(registry_path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "digest TEXT, api_base TEXT, name TEXT, uri TEXT, mime TEXT, expires REAL, PRIMARY KEY (digest, api_base))"
+        )
+        self.db.commit()
+
+    def should_upload(self, inline):
+        # PDFs always go through the File API; images only when they are big
+        return inline.get("mime_type") == "application/pdf" or len(inline.get("data", "")) * 3 // 4 >= self.min_bytes
+
+    def swap_inline(self, payload, retryable=None):
+        """Returns a copy of `payload` with large inline_data parts replaced by file_data parts.
+
+        A part whose upload fails is sent inline instead, unless `retryable(error)` is true:
+        then the error is raised, so the caller can retry the request after a backoff.
+        """
+        contents = []
+        for content in payload.get("contents", []):
+            parts = []
+            for part in content.get("parts", []):
+                inline = part.get("inline_data")
+                if inline and self.should_upload(inline):
+                    try:
+                        tokens_before = tokens.part_tokens(part)
+                        part = self.file_part(inline)
+                        self.part_tokens[part["file_data"]["file_uri"]] = tokens_before
+                    except Exception as e:
+                        if retryable is not None and retryable(e):
+                            raise
+                        # uploading is an optimization: fall back to sending the bytes inline
+                        print(f"File upload failed, sending inline: {e}")
+                parts.append(part)
+            contents.append(dict(content, parts=parts))
+        return dict(payload, contents=contents)
+
+    def file_part(self, inline):
+        digest = hashlib.sha256(inline["data"].encode("ascii")).hexdigest()
+        while True:
+            with self.lock:
+                row = self.db.execute(
+                    "SELECT uri, mime, expires FROM uploads WHERE digest = ? AND api_base = ?", (digest, self.api_base)
+                ).fetchone()
+                if row and row[2] - EXPIRY_MARGIN > time.time():
+                    self.reused += 1
+                    return {"file_data": {"mime_type": row[1], "file_uri": row[0]}}
+                waiter = self.pending.get(digest)
+                if waiter is None:
+                    self.pending[digest] = threading.Event()
+                    break
+            waiter.wait()  # another worker is uploading the same bytes
+        try:
+            info = self.upload(base64.b64decode(inline["data"]), inline["mime_type"], digest[:16])
+            with self.lock:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO uploads (digest, api_base, name, uri, mime, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                    (digest, self.api_base, info["name"], info["uri"], inline["mime_type"], _expiry(info)),
+                )
+                self.db.commit()
+                self.uploads += 1
+            return {"file_data": {"mime_type": inline["mime_type"], "file_uri": info["uri"]}}
+        finally:
+            with self.lock:
+                self.pending.pop(digest).set()
+
+    def upload(self, data, mime_type, display_name):
+        """Resumable upload (start + upload/finalize). Returns the File resource once it is ACTIVE."""
+        with trace.span("upload", bytes_sent=len(data), mime_type=mime_type):
+            session = self.client.session
+            start = session.post(
+                upload_url(self.api_base),
+                headers={
+                    "X-Goog-Upload-Protocol": "resumable",
+                    "X-Goog-Upload-Command": "start",
+                    "X-Goog-Upload-Header-Content-Length": str(len(data)),
+                    "X-Goog-Upload-Header-Content-Type": mime_type,
+                    "Content-Type": "application/json",
+                },
+                json={"file": {"display_name": display_name}},
+                timeout=(self.client.timeout[0], UPLOAD_TIMEOUT),
+            )
+            session_url = start.headers.get("X-Goog-Upload-URL")
+            if start.status_code != 200 or not session_url:
+                raise gemini.api_error(start.status_code, f"Upload start failed: {start.text}", start.headers)
+
+            resp = session.post(
+                session_url,
+                headers={
+                    "Content-Type": mime_type,
+                    "Content-Length": str(len(data)),
+                    "X-Goog-Upload-Offset": "0",
+                    "X-Goog-Upload-Command": "upload, finalize",
+                },
+                data=data,
+                timeout=(self.client.timeout[0], UPLOAD_TIMEOUT),
+            )
+            if resp.status_code != 200:
+                raise gemini.api_error(resp.status_code, f"Upload failed: {resp.text}", resp.headers)
+            info = resp.json().get("file", {})
+            return self.wait_until_active(info)
+
+    def wait_until_active(self, info):
+        # PDFs are processed server-side before they can be referenced
+        deadline = time.time() + PROCESSING_TIMEOUT
+        while info.get("state") == "PROCESSING":
+            if time.time() > deadline:
+                raise Exception(f"{info.get('name')} still processing after {PROCESSING_TIMEOUT}s")
+            time.sleep(1)
+            resp = self.client.session.get(f"{self.api_base}/{info['name']}", timeout=self.client.timeout)
+            if resp.status_code != 200:
+                raise gemini.api_error(resp.status_code, f"File status failed: {resp.text}", resp.headers)
+            info = resp.json()
+        if info.get("state") == "FAILED":
+            raise Exception(f"{info.get('name')} failed processing")
+        return info
+
+    def stats_text(self):
+        return f"Uploads: {self.uploads} new / {self.reused} reused"
+
+
+def open_uploader(cfg, client):
+    """Builds the upload manager from config.json settings. Returns None if disabled or unusable."""
+    if not cfg.get("USE_FILE_API", True):
+        return None
+    try:
+        return UploadManager(
+            client,
+            os.path.join(config.get_cache_dir(cfg), "uploads.sqlite3"),
+            min_bytes=config.get_int(cfg, "FILE_API_MIN_KB", MIN_UPLOAD_BYTES // 1024) * 1024,
+        )
+    except Exception as e:
+        print(f"File API uploads disabled: {e}")
+        return None
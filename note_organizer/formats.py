@@ -0,0 +1,290 @@
+"""HTML, Markdown, PDF and Anki renderers for a parsed guide (see document.py).
+
+Each write_* function takes a document.Document and a path. DOCX lives in
+docx_render.py; export.py runs them side by side.
+
+- HTML: one self-contained page with a small stylesheet, for browsers and LMS uploads.
+- Markdown: the guide written back out from the model, so its lists, tables and fences
+  are regular whatever the model emitted; export reads it back in.
+- PDF: laid out with reportlab (optional).
+- Anki: one card per glossary entry (term on the front, definition on the back). With
+  genanki (optional) this is an .apkg deck; without it, a tab-separated file that
+  Anki's File > Import reads directly.
+"""
+import html
+import zlib
+
+from .document import CODE, HEADING, LIST_ITEM, QUOTE, RULE, TABLE
+
+# Check for optional libraries
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import HRFlowable, Paragraph, Preformatted, SimpleDocTemplate, Spacer, Table, TableStyle
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+try:
+    import genanki
+    GENANKI_AVAILABLE = True
+except ImportError:
+    GENANKI_AVAILABLE = False
+
+HTML_STYLE = """
+body { font-family: Segoe UI, Helvetica, Arial, sans-serif; max-width: 60em; margin: 2em auto; padding: 0 1em;
+       line-height: 1.5; color: #1f2937; }
+h1, h2, h3 { color: #312e81; }
+table { border-collapse: collapse; margin: 1em 0; }
+th, td { border: 1px solid #d1d5db; padding: .3em .6em; vertical-align: top; }
+th { background: #eef2ff; }
+code, pre { font-family: Consolas, monospace; background: #f3f4f6; }
+pre { padding: .6em; overflow-x: auto; }
+blockquote { border-left: 4px solid #c7d2fe; margin-left: 0; padding-left: 1em; color: #4b5563; }
+"""
+
+PDF_LIST_INDENT = 0.6  # cm per list level
+PDF_CODE_FONT = "Courier"
+
+ANKI_MODEL_ID = 1607392319  # fixed, so re-imported decks update their notes instead of duplicating them
+ANKI_CARD_STYLE = ".card { font-family: Arial; font-size: 20px; text-align: center; }"
+
+
+def list_number(numbers, block):
+    """The number of a list item (counted for bullets too); `numbers` holds [ordered, count] per open list level."""
+    del numbers[block.level:]
+    numbers.extend([block.ordered, 0] for _ in range(block.level - len(numbers)))
+    if numbers[-1][0] != block.ordered:
+        numbers[-1] = [block.ordered, 0]  # a numbered list right after a bulleted one starts at 1
+    numbers[-1][1] += 1
+    return numbers[-1][1]
+
+
+# --- HTML ---
+
+def html_runs(runs, bold=False):
+    out = []
+    for text, b, i, code in runs:
+        piece = html.escape(text, quote=False)
+        if code:
+            piece = f"<code>{piece}</code>"
+        if i:
+            piece = f"<em>{piece}</em>"
+        if b or bold:
+            piece = f"<strong>{piece}</strong>"
+        out.append(piece)
+    return "".join(out)
+
+
+def html_body(parsed):
+    """The guide as HTML elements (no <html> wrapper)."""
+    out = [f"<h1>{html.escape(parsed.title)}</h1>"]
+    lists = []  # open list tags, one per nesting level
+
+    def close_lists(level):
+        while len(lists) > level:
+            out.append(f"</li></{lists.pop()}>")
+
+    for block in parsed.blocks:
+        kind = block.kind
+        if kind != LIST_ITEM:
+            close_lists(0)
+        if kind == LIST_ITEM:
+            tag = "ol" if block.ordered else "ul"
+            close_lists(block.level)
+            if len(lists) == block.level and lists[-1] != tag:
+                close_lists(block.level - 1)  # a numbered list right after a bulleted one, or the reverse
+            if len(lists) == block.level:
+                out.append("</li>")
+            while len(lists) < block.level:
+                lists.append(tag)
+                out.append(f"<{tag}>")
+            out.append(f"<li>{html_runs(block.runs)}")
+        elif kind == HEADING:
+            level = min(block.level, 6)
+            out.append(f"<h{level}>{html_runs(block.runs)}</h{level}>")
+        elif kind == TABLE:
+            out.append("<table>")
+            for n, row in enumerate(block.rows):
+                cell = "th" if block.header and n == 0 else "td"
+                out.append("<tr>" + "".join(f"<{cell}>{html_runs(c)}</{cell}>" for c in row) + "</tr>")
+            out.append("</table>")
+        elif kind == CODE:
+            out.append(f"<pre><code>{html.escape(block.text, quote=False)}</code></pre>")
+        elif kind == QUOTE:
+            out.append(f"<blockquote><p>{html_runs(block.runs)}</p></blockquote>")
+        elif kind == RULE:
+            out.append("<hr>")
+        else:
+            out.append(f"<p>{html_runs(block.runs)}</p>")
+    close_lists(0)
+    return "\n".join(out)
+
+
+def write_html(parsed, path):
+    page = (f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{html.escape(parsed.title)}</title>\n'
+            f'<style>{HTML_STYLE}</style>\n</head>\n<body>\n{html_body(parsed)}\n</body>\n</html>\n')
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(page)
+
+
+# --- MARKDOWN ---
+
+def markdown_runs(runs):
+    out = []
+    for text, bold, italic, code in runs:
+        if code:
+            text = f"`{text}`" if "`" not in text else f"`` {text} ``"
+        if italic:
+            text = f"*{text}*"
+        if bold:
+            text = f"**{text}**"
+        out.append(text)
+    return "".join(out)
+
+
+def markdown_text(parsed):
+    """The guide as Markdown. Without the title, like the model's own output, so it can be parsed again."""
+    out = []
+    numbers = []  # see list_number
+    previous = None
+    for block in parsed.blocks:
+        kind = block.kind
+        if previous is not None and not (kind == LIST_ITEM and previous == LIST_ITEM):
+            out.append("")  # blank line between blocks, but not between items of one list
+        if kind != LIST_ITEM:
+            numbers = []
+        if kind == LIST_ITEM:
+            number = list_number(numbers, block)
+            marker = f"{number}." if block.ordered else "-"
+            out.append(f"{'    ' * (block.level - 1)}{marker} {markdown_runs(block.runs)}")
+        elif kind == HEADING:
+            out.append(f"{'#' * block.level} {markdown_runs(block.runs)}")
+        elif kind == TABLE:
+            cells = [[markdown_runs(c).replace("|", "\\|") for c in row] for row in block.rows]
+            if not block.header:
+                cells.insert(0, [""] * len(cells[0]))  # Markdown tables need a header row
+            out.append("| " + " | ".join(cells[0]) + " |")
+            out.append("|" + "---|" * len(cells[0]))
+            out.extend("| " + " | ".join(row) + " |" for row in cells[1:])
+        elif kind == CODE:
+            out += ["```", block.text, "```"]
+        elif kind == QUOTE:
+            out.append(f"> {markdown_runs(block.runs)}")
+        elif kind == RULE:
+            out.append("---")
+        else:
+            out.append(markdown_runs(block.runs))
+        previous = kind
+    return "\n".join(out) + "\n"
+
+
+def write_markdown(parsed, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(markdown_text(parsed))
+
+
+# --- PDF ---
+
+def pdf_runs(runs, bold=False):
+    """reportlab paragraph markup for Runs."""
+    out = []
+    for text, b, i, code in runs:
+        piece = html.escape(text, quote=False)
+        if code:
+            piece = f'<font face="{PDF_CODE_FONT}">{piece}</font>'
+        if i:
+            piece = f"<i>{piece}</i>"
+        if b or bold:
+            piece = f"<b>{piece}</b>"
+        out.append(piece)
+    return "".join(out)
+
+
+def pdf_story(parsed, width):
+    """reportlab flowables for the guide, `width` being the usable page width."""
+    sheet = getSampleStyleSheet()
+    body = sheet["BodyText"]
+    cell = ParagraphStyle("Cell", parent=body, spaceBefore=0, spaceAfter=0)
+    quote = ParagraphStyle("Quote", parent=body, leftIndent=0.8 * cm, textColor=colors.HexColor("#4b5563"))
+    code = ParagraphStyle("Code", parent=sheet["Code"], backColor=colors.HexColor("#f3f4f6"))
+    bullets = {}
+
+    def list_style(level):
+        if level not in bullets:
+            indent = PDF_LIST_INDENT * cm * level
+            bullets[level] = ParagraphStyle(f"List{level}", parent=body, leftIndent=indent,
+                                            bulletIndent=indent - PDF_LIST_INDENT * cm * 0.8, spaceBefore=0, spaceAfter=2)
+        return bullets[level]
+
+    story = [Paragraph(html.escape(parsed.title), sheet["Title"])]
+    numbers = []
+    for block in parsed.blocks:
+        kind = block.kind
+        if kind != LIST_ITEM:
+            numbers = []
+        if kind == LIST_ITEM:
+            number = list_number(numbers, block)
+            bullet = f"{number}." if block.ordered else "•"
+            story.append(Paragraph(pdf_runs(block.runs), list_style(block.level), bulletText=bullet))
+        elif kind == HEADING:
+            # ## is a category and ### a sub-topic, as in the DOCX
+            story.append(Paragraph(pdf_runs(block.runs), sheet[f"Heading{min(max(block.level - 1, 1), 6)}"]))
+        elif kind == TABLE:
+            rows = [[Paragraph(pdf_runs(c, block.header and n == 0), cell) for c in row]
+                    for n, row in enumerate(block.rows)]
+            table = Table(rows, colWidths=[width / len(rows[0])] * len(rows[0]), repeatRows=1 if block.header else 0)
+            style = [("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#9ca3af")), ("VALIGN", (0, 0), (-1, -1), "TOP")]
+            if block.header:
+                style.append(("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#eef2ff")))
+            table.setStyle(TableStyle(style))
+            story += [table, Spacer(1, 0.3 * cm)]
+        elif kind == CODE:
+            story.append(Preformatted(block.text, code))
+        elif kind == QUOTE:
+            story.append(Paragraph(pdf_runs(block.runs), quote))
+        elif kind == RULE:
+            story.append(HRFlowable(width="100%", color=colors.HexColor("#d1d5db")))
+        else:
+            story.append(Paragraph(pdf_runs(block.runs), body))
+    return story
+
+
+def write_pdf(parsed, path):
+    pdf = SimpleDocTemplate(path, pagesize=A4, title=parsed.title, leftMargin=2 * cm, rightMargin=2 * cm,
+                            topMargin=2 * cm, bottomMargin=2 * cm)
+    pdf.build(pdf_story(parsed, pdf.width))
+
+
+# --- ANKI ---
+
+def anki_cards(parsed):
+    """(front, back) HTML of one card per glossary entry. Raises ValueError when the guide has no glossary."""
+    cards = [(html.escape(term, quote=False), html_runs(definition)) for term, definition in parsed.glossary()]
+    if not cards:
+        raise ValueError("the guide has no glossary to make flashcards from")
+    return cards
+
+
+def write_anki(parsed, path, deck_name):
+    """An .apkg deck (with genanki) or a tab-separated import file named `deck_name`."""
+    cards = anki_cards(parsed)
+    if not GENANKI_AVAILABLE:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"#separator:tab\n#html:true\n#deck:{deck_name}\n#columns:Front\tBack\n")
+            for front, back in cards:
+                f.write(front.replace("\t", " ") + "\t" + back.replace("\t", " ") + "\n")
+        return
+    model = genanki.Model(
+        ANKI_MODEL_ID, "Note Organizer Glossary",
+        fields=[{"name": "Term"}, {"name": "Definition"}],
+        templates=[{"name": "Term", "qfmt": "{{Term}}", "afmt": "{{FrontSide}}<hr id=answer>{{Definition}}"}],
+        css=ANKI_CARD_STYLE,
+    )
+    deck = genanki.Deck(zlib.crc32(deck_name.encode("utf-8")) & 0x7FFFFFFF, deck_name)
+    for front, back in cards:
+        # the guid follows the term, so a recompiled guide updates its cards on re-import
+        deck.add_note(genanki.Note(model=model, fields=[front, back], guid=genanki.guid_for(deck_name, front)))
+    genanki.Package(deck).write_to_file(path)
@@ -0,0 +1,431 @@
+"""HTTP clients for the Gemini API.
+
+One GeminiClient per endpoint and key owns a pooled requests.Session, so
+parallel chunks, batch jobs and File API uploads reuse warm keep-alive
+connections instead of paying a TCP+TLS handshake per request. The key travels
+in the x-goog-api-key header (not the URL, where it ends up in proxy logs), and
+large request bodies are gzip-compressed.
+
+Compiles run on the asyncio loop (see aio.py) through an AsyncGeminiClient with
+the same settings, built on aiohttp. Without aiohttp it runs the blocking client
+in worker threads instead; cancelling then returns at once, but the abandoned
+request finishes in the background. Every request has an overall deadline.
+
+Each request is traced (see trace.py): "request.send" until the response headers
+arrive, "request.first_byte" until the answer starts (its headers, or the first event
+of a stream), "response.parse", and a "request" span around it all with the bytes
+received and usageMetadata tokens.
+"""
+import asyncio
+import gzip
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import config, trace
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 120  # longest silence allowed while the model works
+REQUEST_DEADLINE = 600  # longest a whole request (a full stream included) may take
+GZIP_MIN_BYTES = 64 * 1024
+UNSUPPORTED_MEDIA_TYPE = 415  # the answer of an endpoint that cannot read gzip bodies
+POOL_SIZE = 32  # connections kept per host; above MAX_WORKERS x MAP_WORKERS
+
+
+class ApiError(Exception):
+    """Non-200 answer from the Gemini API, or a 200 without any text in it."""
+
+    def __init__(self, status_code, text, retry_after=None):
+        super().__init__(f"API Error {status_code}: {text}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Cancelled(Exception):
+    """The user stopped a compile before it finished."""
+
+
+def deadline_error(deadline):
+    # 408 Request Timeout, so it is retried like other transient failures
+    return ApiError(408, f"No complete answer within the {deadline:g}s request deadline")
+
+
+# network failures worth retrying, next to ApiErrors with a retryable status
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout)
+if AIOHTTP_AVAILABLE:
+    TRANSIENT_ERRORS += (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+
+
+# --- RESPONSE PARSING ---
+
+def chunk_text(result):
+    """The text of the first candidate (thought parts excluded); "" if there is none."""
+    candidates = result.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(p.get("text", "") for p in parts if not p.get("thought"))
+
+
+def no_text_reason(result):
+    candidates = result.get("candidates") or []
+    if candidates:
+        return candidates[0].get("finishReason") or "no text"
+    return (result.get("promptFeedback") or {}).get("blockReason") or "no candidates"
+
+
+def extract_output_text(result):
+    """The generated text of a generateContent response. Raises ApiError when it holds none (e.g. blocked)."""
+    text = chunk_text(result)
+    if not text:
+        raise ApiError(200, f"The model returned no text ({no_text_reason(result)})")
+    return text
+
+
+def usage(result):
+    """Token counts from a response's usageMetadata (the last event of a stream), as span attributes."""
+    meta = result.get("usageMetadata") or {}
+    counts = {"input_tokens": meta.get("promptTokenCount"), "output_tokens": meta.get("candidatesTokenCount")}
+    return {key: value for key, value in counts.items() if value is not None}
+
+
+def api_error(status, text, headers):
+    retry_after = headers.get("Retry-After")
+    return ApiError(status, text, float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+
+def raise_for_status(resp):
+    if resp.status_code != 200:
+        raise api_error(resp.status_code, resp.text, resp.headers)
+
+
+def sse_event(line):
+    """The JSON of one server-sent event line ("data: {...}"); None for other lines."""
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if not data or data == "[DONE]":
+        return None
+    return json.loads(data)
+
+
+def stream_url(api_url):
+    return api_url.replace(":generateContent", ":streamGenerateContent")
+
+
+def count_url(api_url):
+    return api_url.replace(":generateContent", ":countTokens")
+
+
+# --- CLIENT ---
+
+class GeminiClient:
+    """Sends generateContent / streamGenerateContent requests over one pooled session."""
+
+    def __init__(self, api_url, api_key, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 gzip_min_bytes=GZIP_MIN_BYTES, pool_size=POOL_SIZE, deadline=REQUEST_DEADLINE):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.gzip_min_bytes = gzip_min_bytes  # None turns compression off
+        self.plain_urls = set()  # endpoints (a proxy, a mock) that answered 415 to a compressed body
+        self.pool_size = pool_size
+        self.deadline = deadline  # used by the AsyncGeminiClient built on this one
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"x-goog-api-key": api_key, "Content-Type": "application/json"})
+
+    @property
+    def api_base(self):
+        return self.api_url.split("/models/")[0]
+
+    def _body(self, payload, url=None):
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        if self.gzip_min_bytes is not None and len(body) >= self.gzip_min_bytes and url not in self.plain_urls:
+            return gzip.compress(body, compresslevel=5), {"Content-Encoding": "gzip"}
+        return body, {}
+
+    def _post(self, url, payload, timeout=None, stream=False):
+        with trace.span("request.send") as s:
+            body, headers = self._body(payload, url)
+            resp = self.session.post(url, data=body, headers=headers, timeout=timeout or self.timeout, stream=stream)
+            if headers and resp.status_code == UNSUPPORTED_MEDIA_TYPE:
+                # this endpoint does not take compressed bodies: send it plain from now on
+                resp.close()
+                self.plain_urls.add(url)
+                body, headers = self._body(payload, url)
+                resp = self.session.post(url, data=body, timeout=timeout or self.timeout, stream=stream)
+            s.set(bytes_sent=len(body), gzip=bool(headers), status=resp.status_code)
+        return resp
+
+    def generate(self, payload, timeout=None):
+        """Sends one generateContent request and returns the generated text."""
+        with trace.span("request", stream=False) as s:
+            started = time.perf_counter()
+            # streamed, so _post returns when the headers arrive and the body is read below
+            with self._post(self.api_url, payload, timeout, stream=True) as resp:
+                trace.record("request.first_byte", time.perf_counter() - started)
+                raise_for_status(resp)
+                data = resp.content
+            s.set(bytes_received=len(data))
+            with trace.span("response.parse"):
+                result = json.loads(data)
+            s.set(**usage(result))
+            return extract_output_text(result)
+
+    def stream(self, payload, on_text, cancelled=None, timeout=None):
+        """Sends a streamGenerateContent (SSE) request, calling `on_text(delta)` as text arrives.
+
+        Returns the full text. Raises Cancelled if `cancelled` (a threading.Event) gets set mid-stream.
+        """
+        pieces = []
+        last = {}
+        with trace.span("request", stream=True) as s:
+            parse = _ParseTimer(time.perf_counter())
+            with self._post(f"{stream_url(self.api_url)}?alt=sse", payload, timeout, stream=True) as resp:
+                raise_for_status(resp)
+                # SSE is UTF-8, but requests would decode a text/event-stream without a charset as Latin-1
+                for line in resp.iter_lines():
+                    if cancelled is not None and cancelled.is_set():
+                        raise Cancelled()
+                    event = parse(line.decode("utf-8"))
+                    if event is None:
+                        continue
+                    last = event
+                    delta = chunk_text(last)
+                    if delta:
+                        pieces.append(delta)
+                        on_text(delta)
+            parse.finish(s, last)
+        if cancelled is not None and cancelled.is_set():
+            raise Cancelled()
+        if not pieces:
+            raise ApiError(200, f"The model returned no text ({no_text_reason(last)})")
+        return "".join(pieces)
+
+    def count_tokens(self, payload, timeout=None):
+        """Exact input tokens of a generateContent payload, from the countTokens endpoint."""
+        model = "models/" + self.api_url.rsplit("/models/", 1)[-1].split(":", 1)[0]
+        resp = self._post(count_url(self.api_url), {"generateContentRequest": dict(payload, model=model)}, timeout)
+        raise_for_status(resp)
+        return resp.json().get("totalTokens", 0)
+
+    def close(self):
+        self.session.close()
+
+
+class _ParseTimer:
+    """Parses the SSE lines of one stream (see sse_event), timing the parsing and the first event."""
+
+    def __init__(self, started):
+        self.started = started
+        self.seconds = 0.0
+        self.events = 0
+        self.bytes = 0
+
+    def __call__(self, line):
+        t = time.perf_counter()
+        self.bytes += len(line.encode("utf-8")) + 1
+        event = sse_event(line)
+        self.seconds += time.perf_counter() - t
+        if event is not None:
+            if not self.events:
+                trace.record("request.first_byte", t - self.started)
+            self.events += 1
+        return event
+
+    def finish(self, span, last):
+        trace.record("response.parse", self.seconds, events=self.events)
+        span.set(bytes_received=self.bytes, **usage(last))
+
+
+async def with_deadline(coro, deadline):
+    """Awaits `coro`, raising a 408 ApiError if it is not done within `deadline` seconds."""
+    try:
+        return await asyncio.wait_for(coro, deadline)
+    except asyncio.TimeoutError as e:
+        if AIOHTTP_AVAILABLE and isinstance(e, aiohttp.ServerTimeoutError):
+            raise  # connect or read timeout, not the deadline
+        raise deadline_error(deadline) from None
+
+
+async def _lines(resp):
+    # split on raw bytes, so a character cut between two reads is decoded whole
+    buffer = b""
+    async for data in resp.content.iter_any():
+        *lines, buffer = (buffer + data).split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").strip()
+    yield buffer.decode("utf-8").strip()
+
+
+class AsyncGeminiClient:
+    """generateContent / streamGenerateContent as coroutines, with the settings of a GeminiClient.
+
+    Bound to the event loop it is first used on (the aio loop), where its aiohttp session is created.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.session = None
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            connect, read = self.client.timeout
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.client.pool_size),
+                headers={"x-goog-api-key": self.client.api_key, "Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read),
+            )
+        return self.session
+
+    async def _post(self, url, payload):
+        with trace.span("request.send") as s:
+            # serializing and compressing a large payload would stall every other request on the loop
+            body, headers = await asyncio.to_thread(self.client._body, payload, url)
+            resp = await self._session().post(url, data=body, headers=headers)
+            if headers and resp.status == UNSUPPORTED_MEDIA_TYPE:
+                resp.release()
+                self.client.plain_urls.add(url)
+                body, headers = await asyncio.to_thread(self.client._body, payload, url)
+                resp = await self._session().post(url, data=body)
+            s.set(bytes_sent=len(body), gzip=bool(headers), status=resp.status)
+        if resp.status != 200:
+            async with resp:
+                raise api_error(resp.status, await resp.text(), resp.headers)
+        return resp
+
+    async def generate(self, payload, deadline=None):
+        """Sends one generateContent request and returns the generated text."""
+        return await with_deadline(self._generate(payload), deadline or self.client.deadline)
+
+    async def _generate(self, payload):
+        with trace.span("request", stream=False) as s:
+            started = time.perf_counter()
+            async with await self._post(self.client.api_url, payload) as resp:
+                trace.record("request.first_byte", time.perf_counter() - started)  # headers are in, the body is not
+                data = await resp.read()
+            s.set(bytes_received=len(data))
+            with trace.span("response.parse"):
+                result = json.loads(data)
+            s.set(**usage(result))
+            return extract_output_text(result)
+
+    async def stream(self, payload, on_text, deadline=None):
+        """Sends a streamGenerateContent (SSE) request, calling `on_text(delta)` as text arrives. Returns the full text."""
+        return await with_deadline(self._stream(payload, on_text), deadline or self.client.deadline)
+
+    async def _stream(self, payload, on_text):
+        pieces = []
+        last = {}
+        with trace.span("request", stream=True) as s:
+            parse = _ParseTimer(time.perf_counter())
+            async with await self._post(f"{stream_url(self.client.api_url)}?alt=sse", payload) as resp:
+                async for line in _lines(resp):
+                    event = parse(line)
+                    if event is None:
+                        continue
+                    last = event
+                    delta = chunk_text(last)
+                    if delta:
+                        pieces.append(delta)
+                        on_text(delta)
+            parse.finish(s, last)
+        if not pieces:
+            raise ApiError(200, f"The model returned no text ({no_text_reason(last)})")
+        return "".join(pieces)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class ThreadedGeminiClient:
+    """The AsyncGeminiClient interface over the blocking client, for installs without aiohttp."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def generate(self, payload, deadline=None):
+        return await with_deadline(asyncio.to_thread(self.client.generate, payload), deadline or self.client.deadline)
+
+    async def stream(self, payload, on_text, deadline=None):
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        try:
+            return await with_deadline(
+                asyncio.to_thread(self.client.stream, payload, lambda delta: loop.call_soon_threadsafe(on_text, delta), stop),
+                deadline or self.client.deadline,
+            )
+        finally:
+            stop.set()  # after a cancel or the deadline, the worker thread quits at the next chunk
+
+    async def close(self):
+        pass
+
+
+_clients = {}
+_async_clients = {}  # (api_url, api_key) -> (GeminiClient, its asyncio client)
+_clients_lock = threading.Lock()
+
+
+def get_client(api_url, api_key):
+    """The shared client for this endpoint and key, created with default settings on first use."""
+    with _clients_lock:
+        client = _clients.get((api_url, api_key))
+        if client is None:
+            client = _clients[(api_url, api_key)] = GeminiClient(api_url, api_key)
+        return client
+
+
+def get_async_client(api_url, api_key):
+    """The asyncio client over get_client(api_url, api_key). Only use it on the aio loop."""
+    client = get_client(api_url, api_key)
+    with _clients_lock:
+        pair = _async_clients.get((api_url, api_key))
+        if pair is not None and pair[0] is client:
+            return pair[1]
+        async_client = (AsyncGeminiClient if AIOHTTP_AVAILABLE else ThreadedGeminiClient)(client)
+        _async_clients[(api_url, api_key)] = (client, async_client)
+    if pair is not None:
+        # open_client() replaced the settings: retire the old session
+        asyncio.get_running_loop().create_task(pair[1].close())
+    return async_client
+
+
+async def close_async_clients():
+    """Closes every asyncio client's session; run on the aio loop before it stops."""
+    with _clients_lock:
+        pairs = list(_async_clients.values())
+        _async_clients.clear()
+    for _, async_client in pairs:
+        await async_client.close()
+
+
+def open_client(cfg):
+    """Builds the shared client from config.json (CONNECT_TIMEOUT, READ_TIMEOUT, REQUEST_DEADLINE, GZIP_MIN_KB)."""
+    gzip_kb = config.get_int(cfg, "GZIP_MIN_KB", GZIP_MIN_BYTES // 1024)
+    client = GeminiClient(
+        config.get_api_url(cfg), config.get_api_key(cfg),
+        connect_timeout=config.get_int(cfg, "CONNECT_TIMEOUT", CONNECT_TIMEOUT),
+        read_timeout=config.get_int(cfg, "READ_TIMEOUT", READ_TIMEOUT),
+        gzip_min_bytes=gzip_kb * 1024 if gzip_kb > 0 else None,
+        deadline=config.get_int(cfg, "REQUEST_DEADLINE", REQUEST_DEADLINE),
+    )
+    with _clients_lock:
+        old = _clients.pop((client.api_url, client.api_key), None)
+        _clients[(client.api_url, client.api_key)] = client
+    if old is not None:
+        old.close()
+    return client
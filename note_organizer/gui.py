@@ -0,0 +1,910 @@
+import tkinter as tk
+from tkinter import filedialog, scrolledtext, messagebox, Menu, Toplevel, ttk
+import asyncio
+import hashlib
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from . import aio, cache, config, engine, export, files_api, gemini, ingest, jobs, ocr, project, search, textview, tokens, trace
+from .engine import DOCX_AVAILABLE
+
+DEFAULT_CONFIRM_COST = 1.0  # USD; dearer compiles ask before sending
+SEARCH_DELAY_MS = 200  # pause in typing before the search window queries the index
+
+# Themes Configuration
+THEMES = {
+    "Day Mode": {
+        "bg": "#f0f2f5", "fg": "#1f2937", "frame_bg": "#ffffff",
+        "text_bg": "#f9fafb", "text_fg": "#000000",
+        "btn_primary": "#4f46e5", "btn_secondary": "#ef4444", "btn_success": "#10b981", "btn_fg": "#ffffff"
+    },
+    "Night Mode": {
+        "bg": "#111827", "fg": "#e5e7eb", "frame_bg": "#1f2937",
+        "text_bg": "#374151", "text_fg": "#ffffff",
+        "btn_primary": "#6366f1", "btn_secondary": "#ef4444", "btn_success": "#10b981", "btn_fg": "#ffffff"
+    }
+}
+
+class NoteOrganizerApp:
+    def __init__(self, master):
+        self.master = master
+        master.title("Note Organizer")
+        master.geometry("950x850")
+        
+        # Default to Day Mode, but load_config will override this if JSON says otherwise
+        self.current_theme_name = "Day Mode"
+        self.colors = THEMES[self.current_theme_name]
+
+        self.api_key = ""
+        self.api_url = ""
+        # compiles run on the background asyncio loop; their results reach Tk through this queue
+        self.bridge = aio.TkBridge(master)
+        self.compile_task = None
+        self.estimate_number = 0  # the latest show_estimate call; older estimates are not shown
+        
+        # --- LOAD CONFIGURATION ---
+        self.load_config()
+
+        self.sources = engine.SourceBundle(self.dedup)
+        self.project = None  # open .noteproj: compiles only send changed files
+        self.unsaved_guide_doc = None  # search index key of the last guide compiled but not exported
+
+        self.create_menu_bar()
+
+        master.grid_columnconfigure(0, weight=1)
+        master.grid_rowconfigure(2, weight=1)
+
+        # Header
+        self.header_frame = tk.Frame(master)
+        self.header_frame.grid(row=0, column=0, sticky="ew", padx=10, pady=5)
+        
+        self.title_label = tk.Label(self.header_frame, text="Note Organizer", font=("Helvetica", 18, "bold"))
+        self.title_label.pack(side=tk.LEFT)
+        
+        self.subtitle_label = tk.Label(self.header_frame, text="(Categorization + Tables)", font=("Helvetica", 10))
+        self.subtitle_label.pack(side=tk.LEFT, padx=10)
+
+        # Main Container
+        self.main_frame = tk.Frame(master, padx=10, pady=10)
+        self.main_frame.grid(row=2, column=0, sticky="nsew")
+        self.main_frame.grid_columnconfigure(0, weight=1)
+        self.main_frame.grid_columnconfigure(1, weight=1)
+        self.main_frame.grid_rowconfigure(0, weight=1)
+
+        # --- LEFT COLUMN: INPUT ---
+        self.input_frame = tk.Frame(self.main_frame, padx=10, pady=10, relief=tk.GROOVE, bd=1)
+        self.input_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+        self.input_frame.grid_columnconfigure(0, weight=1)
+        self.input_frame.grid_rowconfigure(2, weight=1)
+
+        self.lbl_step1 = tk.Label(self.input_frame, text="1. Source Materials", font=("Helvetica", 12, "bold"))
+        self.lbl_step1.grid(row=0, column=0, sticky="w")
+        
+        self.btn_frame = tk.Frame(self.input_frame)
+        self.btn_frame.grid(row=1, column=0, sticky="ew", pady=5)
+        
+        self.btn_upload = tk.Button(self.btn_frame, text="Add Files", command=self.upload_files, relief=tk.FLAT, padx=10)
+        self.btn_upload.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 2))
+        
+        self.btn_remove = tk.Button(self.btn_frame, text="Remove", command=self.remove_selected_file, relief=tk.FLAT)
+        self.btn_remove.pack(side=tk.LEFT, padx=2)
+
+        self.btn_up = tk.Button(self.btn_frame, text="\u25b2", command=lambda: self.move_selected_file(-1), relief=tk.FLAT)
+        self.btn_up.pack(side=tk.LEFT, padx=2)
+
+        self.btn_down = tk.Button(self.btn_frame, text="\u25bc", command=lambda: self.move_selected_file(1), relief=tk.FLAT)
+        self.btn_down.pack(side=tk.LEFT, padx=2)
+
+        self.btn_clear = tk.Button(self.btn_frame, text="Reset", command=self.clear_inputs, relief=tk.FLAT)
+        self.btn_clear.pack(side=tk.LEFT, padx=(2, 0))
+
+        self.lbl_context = tk.Label(self.input_frame, text="Loaded Files:", anchor="w")
+        self.lbl_context.grid(row=2, column=0, sticky="w", pady=(10, 0))
+        
+        self.file_list_display = scrolledtext.ScrolledText(self.input_frame, wrap=tk.WORD, height=8, font=("Consolas", 9))
+        self.file_list_display.grid(row=3, column=0, sticky="nsew")
+        # thousands of files: only one page of the list is ever in the widget
+        self.file_list_view = textview.FileListView(self.file_list_display)
+        self.file_list_view.show([])
+        self.file_list_display.bind("<Button-1>", self.select_file_line)
+        self.selected_file = None
+
+        self.lbl_instruct = tk.Label(self.input_frame, text="Instructions:", anchor="w")
+        self.lbl_instruct.grid(row=4, column=0, sticky="w", pady=(10, 0))
+        
+        self.user_prompt_text = tk.Text(self.input_frame, wrap=tk.WORD, height=4, font=("Helvetica", 10))
+        self.user_prompt_text.grid(row=5, column=0, sticky="ew", pady=(0, 10))
+
+        self.process_button = tk.Button(self.input_frame, text="Categorize & Compile", command=self.start_processing, font=("Helvetica", 11, "bold"), relief=tk.FLAT, pady=8)
+        self.process_button.grid(row=6, column=0, sticky="ew")
+
+        # --- RIGHT COLUMN: OUTPUT ---
+        self.output_frame = tk.Frame(self.main_frame, padx=10, pady=10, relief=tk.GROOVE, bd=1)
+        self.output_frame.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
+        self.output_frame.grid_columnconfigure(0, weight=1)
+        self.output_frame.grid_rowconfigure(1, weight=1)
+
+        self.lbl_step2 = tk.Label(self.output_frame, text="2. Categorized Output", font=("Helvetica", 12, "bold"))
+        self.lbl_step2.grid(row=0, column=0, sticky="w")
+
+        self.compiled_output_text = scrolledtext.ScrolledText(self.output_frame, wrap=tk.WORD, font=("Helvetica", 10))
+        self.compiled_output_text.grid(row=1, column=0, sticky="nsew")
+        # large guides are rendered a slice at a time, with Markdown formatting
+        self.output_view = textview.MarkdownView(self.compiled_output_text)
+        self.output_view.set_text("Notes will appear here.")
+
+        self.action_frame = tk.Frame(self.output_frame)
+        self.action_frame.grid(row=2, column=0, sticky="ew", pady=5)
+        
+        self.btn_copy = tk.Button(self.action_frame, text="Copy", command=self.copy_output)
+        self.btn_copy.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
+        
+        self.docx_btn = tk.Button(self.action_frame, text="Export DOCX", command=self.export_to_docx)
+        self.docx_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
+
+        self.export_btn = tk.Button(self.action_frame, text="Export...", command=self.open_export_window)
+        self.export_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=2)
+
+        # Status Bar
+        self.status_label = tk.Label(master, text="Ready.", bd=1, relief=tk.SUNKEN, anchor=tk.W, pady=5, padx=5)
+        self.status_label.grid(row=3, column=0, sticky="ew")
+
+        # Progressbar
+        self.progress = ttk.Progressbar(master, mode='indeterminate')
+        self.progress.grid(row=4, column=0, sticky="ew", padx=10, pady=(0,10))
+        self.progress.grid_remove()
+
+        # Final Init Steps
+        self.apply_theme()
+        self.check_dependencies()
+
+    def load_config(self):
+        """Loads config.json from the project folder to ensure reliability."""
+        cfg = config.load_config()
+        trace.configure(cfg)
+        self.api_key = config.get_api_key(cfg)
+        self.api_url = config.get_api_url(cfg)
+        self.max_workers = config.get_int(cfg, "MAX_WORKERS", jobs.DEFAULT_WORKERS)
+        self.requests_per_minute = config.get_int(cfg, "REQUESTS_PER_MINUTE", jobs.DEFAULT_REQUESTS_PER_MINUTE)
+        self.tokens_per_minute = config.get_int(cfg, "TOKENS_PER_MINUTE", jobs.DEFAULT_TOKENS_PER_MINUTE)
+        self.response_cache = cache.open_cache(cfg)
+        self.extraction_cache = cache.open_extraction_cache(cfg)
+        self.tile_images = config.get_tile_images(cfg)
+        self.dedup = config.get_dedup(cfg)
+        self.ocr_language = ocr.language_from_config(cfg)
+        # one pooled connection for every compile, batch job and upload
+        self.client = gemini.open_client(cfg)
+        self.uploader = files_api.open_uploader(cfg, self.client)
+        self.search_index = search.open_index(cfg)
+        self.token_limits = tokens.limits_from_config(cfg, self.api_url)
+        self.token_counter = tokens.open_counter(cfg, self.client, self.response_cache)
+        try:
+            self.confirm_cost = float(cfg.get("CONFIRM_COST_USD", DEFAULT_CONFIRM_COST))
+        except (TypeError, ValueError):
+            self.confirm_cost = DEFAULT_CONFIRM_COST
+        self.chunk_chars = config.get_chunk_chars(cfg)
+        self.stream_responses = cfg.get("STREAM_RESPONSES", True)
+        self.export_formats = export.formats_from_config(cfg)
+
+        # Apply Theme from Config if present
+        theme = cfg.get("APP_THEME")
+        if theme in THEMES:
+            self.current_theme_name = theme
+            self.colors = THEMES[theme]
+
+    def create_menu_bar(self):
+        menubar = Menu(self.master)
+        filemenu = Menu(menubar, tearoff=0)
+        filemenu.add_command(label="Add Files...", command=self.upload_files)
+        filemenu.add_command(label="Save DOCX...", command=self.export_to_docx)
+        filemenu.add_command(label="Export...", command=self.open_export_window)
+        filemenu.add_command(label="Batch Compile Folder...", command=self.open_batch_window)
+        filemenu.add_command(label="Search Notes...", command=self.open_search_window)
+        filemenu.add_command(label="Run Details...", command=self.open_run_details)
+        filemenu.add_separator()
+        filemenu.add_command(label="New Project...", command=self.new_project)
+        filemenu.add_command(label="Open Project...", command=self.open_project)
+        filemenu.add_command(label="Close Project", command=self.close_project)
+        filemenu.add_separator()
+        filemenu.add_command(label="Exit", command=self.master.quit)
+        menubar.add_cascade(label="File", menu=filemenu)
+        
+        settingsmenu = Menu(menubar, tearoff=0)
+        settingsmenu.add_command(label="Theme Settings", command=self.open_settings_window)
+        settingsmenu.add_command(label="Clear Cache", command=self.clear_response_cache)
+        menubar.add_cascade(label="Settings", menu=settingsmenu)
+        
+        self.master.config(menu=menubar)
+
+    def open_settings_window(self):
+        settings_win = Toplevel(self.master)
+        settings_win.title("Settings")
+        settings_win.geometry("300x220")
+        settings_win.configure(bg=self.colors["bg"])
+        
+        tk.Label(settings_win, text="App Theme", font=("Helvetica", 12, "bold"), bg=self.colors["bg"], fg=self.colors["fg"]).pack(pady=10)
+        theme_var = tk.StringVar(value=self.current_theme_name)
+        
+        def set_theme():
+            self.current_theme_name = theme_var.get()
+            self.colors = THEMES[self.current_theme_name]
+            self.apply_theme()
+            # Save preference to config.json if possible
+            try:
+                config.save_config_value("APP_THEME", self.current_theme_name)
+            except Exception as e:
+                print(f"Error saving theme: {e}")
+            settings_win.destroy()
+
+        for theme_name in THEMES.keys():
+            tk.Radiobutton(settings_win, text=theme_name, variable=theme_var, value=theme_name, bg=self.colors["bg"], fg=self.colors["fg"], selectcolor=self.colors["frame_bg"]).pack(anchor="w", padx=50)
+        
+        tk.Button(settings_win, text="Apply", command=set_theme, bg=self.colors["btn_primary"], fg="white").pack(pady=15)
+
+    def clear_response_cache(self):
+        if self.response_cache is None and self.extraction_cache is None:
+            messagebox.showinfo("Info", "The cache is disabled.")
+            return
+        if messagebox.askyesno("Clear Cache", "Forget all saved responses and file contents? Files will be read again and the next compile of each input will call the API again."):
+            for c in (self.response_cache, self.extraction_cache):
+                if c is not None:
+                    c.clear()
+            self.status_label.config(text="Cache cleared.")
+
+    def apply_theme(self):
+        c = self.colors
+        self.master.config(bg=c["bg"])
+        self.status_label.config(bg=c["frame_bg"], fg=c["fg"])
+        self.header_frame.config(bg=c["bg"])
+        self.title_label.config(bg=c["bg"], fg=c["fg"])
+        self.subtitle_label.config(bg=c["bg"], fg="gray")
+        self.main_frame.config(bg=c["bg"])
+        self.input_frame.config(bg=c["frame_bg"])
+        self.output_frame.config(bg=c["frame_bg"])
+        self.btn_frame.config(bg=c["frame_bg"])
+        self.action_frame.config(bg=c["frame_bg"])
+        
+        for lbl in [self.lbl_step1, self.lbl_step2, self.lbl_context, self.lbl_instruct]:
+            lbl.config(bg=c["frame_bg"], fg=c["fg"])
+            
+        self.file_list_display.config(bg=c["text_bg"], fg=c["text_fg"])
+        self.user_prompt_text.config(bg=c["text_bg"], fg=c["text_fg"], insertbackground=c["fg"])
+        self.compiled_output_text.config(bg=c["text_bg"], fg=c["text_fg"], insertbackground=c["fg"])
+        self.btn_upload.config(bg=c["btn_primary"], fg=c["btn_fg"])
+        for btn in [self.btn_remove, self.btn_up, self.btn_down]:
+            btn.config(bg=c["btn_primary"], fg=c["btn_fg"])
+        self.btn_clear.config(bg=c["btn_secondary"], fg=c["btn_fg"])
+        self.file_list_display.tag_config("selected", background=c["btn_primary"], foreground=c["btn_fg"])
+        self.file_list_display.tag_config("more", foreground="gray")
+        self.process_button.config(bg=c.get("btn_success", c.get("btn_primary")), fg="white")
+        self.btn_copy.config(bg=c["btn_primary"], fg=c["btn_fg"])
+        self.docx_btn.config(bg=c["btn_primary"], fg=c["btn_fg"])
+        self.export_btn.config(bg=c["btn_primary"], fg=c["btn_fg"])
+
+    def check_dependencies(self):
+        missing = engine.missing_dependencies()
+        if missing:
+            messagebox.showwarning("Missing Libraries", "Missing: " + ", ".join(missing))
+            if not DOCX_AVAILABLE: self.docx_btn.config(state=tk.DISABLED)
+
+    def upload_files(self):
+        filepaths = filedialog.askopenfilenames(filetypes=[("All", "*.*"), ("Text", "*.txt"), ("PDF", "*.pdf"), ("Images", "*.png *.jpg *.jpeg")])
+        if not filepaths: return
+        self.load_paths(filepaths)
+
+    def load_paths(self, filepaths):
+        # read in the background so big PDFs don't freeze the window
+        self.set_input_buttons(tk.DISABLED)
+        self.process_button.config(state=tk.DISABLED)
+        self.status_label.config(text=f"Reading files... 0/{len(filepaths)}", fg=self.colors.get("fg"))
+        aio.submit(self.read_files(list(filepaths)))
+
+    async def read_files(self, filepaths):
+        def on_progress(done, total, result):
+            self.bridge.post(lambda: self.status_label.config(text=f"Reading files... {done}/{total}  ({result['name']})"))
+
+        try:
+            with trace.run("load", files=len(filepaths)):
+                results = await asyncio.to_thread(ingest.ingest_files, filepaths, cache=self.extraction_cache,
+                                                  on_progress=on_progress, tile=self.tile_images,
+                                                  ocr_language=self.ocr_language)
+        except Exception as e:
+            results = []
+            print(f"Ingest Error: {e}")
+        self.bridge.post(self.finish_reading, filepaths, results)
+
+    def finish_reading(self, filepaths, results):
+        for path, result in zip(filepaths, results):
+            self.sources.add_result(result, path)
+        if results:
+            self.index_in_background("add_sources", self.sources.segments[-len(results):])
+        self.set_input_buttons(tk.NORMAL)
+        self.process_button.config(state=tk.NORMAL)
+
+        self.update_file_display()
+        status = f"Files loaded: {len(self.sources.loaded_files_list)}"
+        cached = sum(1 for r in results if r.get("cached"))
+        if cached:
+            status += f" ({cached} from cache)"
+        duplicates = self.sources.duplicate_summary()
+        if duplicates:
+            status += f", {duplicates}"
+        self.status_label.config(text=status)
+        self.show_estimate(status)
+
+    def estimate_inputs(self, user_instr="", count=None):
+        """What compiling the loaded files would send (only the changed ones in a project)."""
+        if self.project is not None:
+            return self.project.estimate(self.sources, self.api_url, user_instr, self.chunk_chars,
+                                         self.max_workers, self.token_limits, count)
+        return engine.estimate_bundle(self.sources, self.api_url, user_instr, self.chunk_chars,
+                                      self.max_workers, self.token_limits, count)
+
+    def show_estimate(self, status):
+        """Appends the local estimate to the status line; with TOKEN_COUNTING "api", replaces it with exact counts.
+
+        Both are worked out on the asyncio loop's threads: tokenizing a large bundle would freeze the window.
+        """
+        self.estimate_number += 1
+        self.status_label.config(text=status)
+        if self.sources.is_empty():
+            return
+        user_instr = self.user_prompt_text.get("1.0", tk.END).strip()
+        aio.submit(self.estimate_in_background(self.estimate_number, status, user_instr))
+
+    async def estimate_in_background(self, number, status, user_instr):
+        try:
+            # large inputs are split into several requests and merged, not truncated
+            est = await asyncio.to_thread(self.estimate_inputs)
+        except ValueError as e:
+            self.bridge.post(self.finish_estimate, number, f"{status}  (too large: {e})", "red")
+            return
+        except Exception as e:
+            print(f"Estimate failed: {e}")
+            return
+        self.bridge.post(self.finish_estimate, number, f"{status}  ({est.summary()})")
+        if self.token_counter is None:
+            return
+        try:
+            est = await asyncio.to_thread(self.estimate_inputs, user_instr, self.token_counter)
+        except Exception as e:
+            print(f"Token count failed: {e}")
+            return
+        self.bridge.post(self.finish_estimate, number, f"{status}  ({est.summary()})")
+
+    def finish_estimate(self, number, text, fg=None):
+        if number != self.estimate_number:
+            return  # the files changed meanwhile; a newer estimate is on its way
+        self.status_label.config(text=text, **({"fg": fg} if fg else {}))
+
+    def set_input_buttons(self, state):
+        for btn in [self.btn_upload, self.btn_remove, self.btn_up, self.btn_down, self.btn_clear]:
+            btn.config(state=state)
+
+    def clear_inputs(self):
+        self.sources.clear()
+        self.selected_file = None
+        self.update_file_display()
+        self.status_label.config(text="Inputs cleared.")
+
+    def select_file_line(self, event):
+        """Clicking a line of the file list selects that file for Remove / Up / Down."""
+        line = int(self.file_list_display.index(f"@{event.x},{event.y}").split(".")[0])
+        index = self.file_list_view.file_at(line)
+        if index is not None:
+            self.selected_file = index
+        self.highlight_selected_file()
+        return "break"
+
+    def highlight_selected_file(self):
+        self.file_list_view.highlight(self.selected_file)
+
+    def remove_selected_file(self):
+        if self.selected_file is None:
+            self.status_label.config(text="Click a file in the list first.")
+            return
+        name = self.sources.segments[self.selected_file].name
+        self.sources.remove([self.selected_file])
+        self.selected_file = None
+        self.update_file_display()
+        self.show_estimate(f"Removed {name}. Files loaded: {len(self.sources.segments)}")
+
+    def move_selected_file(self, step):
+        if self.selected_file is None:
+            self.status_label.config(text="Click a file in the list first.")
+            return
+        self.selected_file = self.sources.move(self.selected_file, self.selected_file + step)
+        self.update_file_display()
+
+    def update_file_display(self):
+        self.file_list_view.show(self.sources.loaded_files_list, self.selected_file)
+
+    def start_processing(self):
+        if not self.api_key:
+            messagebox.showerror("Error", "API Key missing. Please check config.json or set GEMINI_API_KEY environment variable.")
+            return
+        
+        if self.sources.is_empty():
+            messagebox.showinfo("Info", "Please upload files first.")
+            return
+
+        user_instr = self.user_prompt_text.get("1.0", tk.END).strip()
+        # pre-flight: refuse what cannot fit and ask before expensive compiles
+        try:
+            est = self.estimate_inputs(user_instr)
+        except ValueError as e:
+            messagebox.showerror("Input Too Large", str(e))
+            return
+        if est.cost >= self.confirm_cost and not messagebox.askyesno(
+                "Confirm Compile", f"This compile will send {est.summary()}.\n\nContinue?"):
+            return
+
+        # disable UI elements to avoid concurrent changes; the compile button becomes Cancel
+        self.process_button.config(text="Cancel", command=self.cancel_processing)
+        self.set_input_buttons(tk.DISABLED)
+        self.progress.grid()
+        self.progress.start(10)
+        self.status_label.config(text=f"Organizing notes... ({est.summary()})", fg=self.colors.get("fg"))
+
+        self.compile_task = aio.submit(self.process_with_gemini(user_instr))
+        self.compile_task.add_done_callback(self.compile_done)
+
+    def cancel_processing(self):
+        # cancels the task on the loop, which aborts the requests in flight
+        self.compile_task.cancel()
+        self.process_button.config(state=tk.DISABLED, text="Cancelling...")
+        self.status_label.config(text="Cancelling...")
+
+    async def process_with_gemini(self, user_instr):
+        """Runs on the asyncio loop; every widget update goes through self.bridge."""
+        stream_started = None
+        start = time.perf_counter()
+        try:
+            def on_part(done, total):
+                if total > 1:
+                    self.bridge.post(lambda: self.status_label.config(text=f"Organizing notes... part {done}/{total} done"))
+
+            def on_text(delta):
+                # called per SSE chunk; the bridge hands everything received since its last poll to Tk at once
+                nonlocal stream_started
+                if stream_started is None:
+                    stream_started = time.perf_counter() - start
+                    self.bridge.post(self.output_view.clear)
+                    self.bridge.post(lambda s=stream_started: self.status_label.config(text=f"Receiving notes... (first text after {s:.1f}s)"))
+                self.bridge.post(self.output_view.append, delta)
+
+            with trace.run("compile", files=len(self.sources.segments)):
+                if self.project is not None:
+                    # per-file requests merged at the end, so nothing to stream
+                    output_text, _ = await self.project.compile_async(
+                        self.sources, self.api_url, self.api_key, user_instr, cache=self.response_cache,
+                        workers=self.max_workers, chunk_chars=self.chunk_chars, on_part=on_part,
+                        uploader=self.uploader,
+                    )
+                else:
+                    output_text, _ = await engine.compile_bundle_async(
+                        self.sources, self.api_url, self.api_key, user_instr, cache=self.response_cache,
+                        workers=self.max_workers, chunk_chars=self.chunk_chars, on_part=on_part,
+                        on_text=on_text if self.stream_responses else None, uploader=self.uploader,
+                    )
+            self.bridge.post(self.finish_processing, output_text, stream_started is not None)
+
+        except Exception as e:
+            self.bridge.post(self.finish_processing, f"Error: {str(e)}")
+
+    def compile_done(self, future):
+        # a done callback rather than a finally in the coroutine: a compile cancelled before
+        # the loop started it never runs, and the window must still come back
+        if future.cancelled():
+            self.bridge.post(lambda: self.status_label.config(text="Cancelled.", fg=self.colors.get("fg")))
+        self.bridge.post(self.restore_ui)
+
+    def restore_ui(self):
+        self.process_button.config(state=tk.NORMAL, text="Categorize & Compile", command=self.start_processing)
+        self.set_input_buttons(tk.NORMAL)
+        self.progress.stop()
+        self.progress.grid_remove()
+
+    def open_batch_window(self):
+        """Compiles one guide per folder of a course tree, several at a time."""
+        if not self.api_key:
+            messagebox.showerror("Error", "API Key missing. Please check config.json or set GEMINI_API_KEY environment variable.")
+            return
+        missing = [export.missing_dependency(f) for f in self.export_formats if export.missing_dependency(f)]
+        if missing:
+            messagebox.showerror("Error", f"{', '.join(missing)} not installed (EXPORT_FORMATS in config.json)")
+            return
+        source = filedialog.askdirectory(title="Folder with course material")
+        if not source: return
+        out_dir = filedialog.askdirectory(title="Save study guides to")
+        if not out_dir: return
+        guides = jobs.find_guides(source)
+        if not guides:
+            messagebox.showinfo("Info", "No supported files found in that folder.")
+            return
+
+        batch_win = Toplevel(self.master)
+        batch_win.title("Batch Compile")
+        batch_win.geometry("640x400")
+        batch_win.configure(bg=self.colors["bg"])
+
+        tree = ttk.Treeview(batch_win, columns=("status", "time"))
+        tree.heading("#0", text="Guide")
+        tree.heading("status", text="Status")
+        tree.heading("time", text="Time")
+        tree.column("#0", width=200)
+        tree.column("status", width=340)
+        tree.column("time", width=70, anchor="e")
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        summary = tk.Label(batch_win, text=f"0/{len(guides)} done", bg=self.colors["bg"], fg=self.colors["fg"])
+        summary.pack(side=tk.LEFT, padx=10, pady=(0, 10))
+
+        def refresh(job):
+            if not tree.winfo_exists(): return
+            status = job.status + (f" - {job.detail}" if job.detail else "")
+            tree.item(job.name, values=(status, f"{job.elapsed():.1f}s"))
+            done = sum(1 for j in queue.jobs if j.status in (jobs.DONE, jobs.FAILED))
+            summary.config(text=f"{done}/{len(guides)} done")
+            if done == len(guides):
+                cancel_btn.config(text="Close", command=batch_win.destroy)
+                self.status_label.config(text=f"Batch complete: {out_dir}" + self.cache_status(), fg="green")
+
+        queue = jobs.JobQueue(
+            self.api_url, self.api_key, workers=self.max_workers,
+            limiter=jobs.RateLimiter(self.requests_per_minute, self.tokens_per_minute),
+            on_update=lambda job: self.bridge.post(refresh, job),
+            cache=self.response_cache,
+            extraction_cache=self.extraction_cache,
+            tile_images=self.tile_images,
+            dedup=self.dedup,
+            ocr_language=self.ocr_language,
+            uploader=self.uploader,
+            index=self.search_index,
+            chunk_chars=self.chunk_chars,
+        )
+
+        def cancel():
+            queue.cancel()
+            batch_win.destroy()
+
+        cancel_btn = tk.Button(batch_win, text="Cancel", command=cancel, bg=self.colors["btn_secondary"], fg=self.colors["btn_fg"])
+        cancel_btn.pack(side=tk.RIGHT, padx=10, pady=(0, 10))
+        batch_win.protocol("WM_DELETE_WINDOW", cancel)
+
+        user_instr = self.user_prompt_text.get("1.0", tk.END).strip()
+        for name, paths in guides:
+            out_path = os.path.join(out_dir, name + ".docx")
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            tree.insert("", tk.END, iid=name, text=name, values=(jobs.PENDING, ""))
+            queue.submit(jobs.CompileJob(name, paths, out_path, user_instr, formats=self.export_formats))
+        self.status_label.config(text=f"Batch compiling {len(guides)} guides...", fg=self.colors.get("fg"))
+
+    def finish_processing(self, text, streamed=False):
+        if not streamed:
+            # streamed text is already in the pane: the bridge delivered it before this call
+            self.output_view.set_text(text)
+        
+        if text.startswith("Error:"):
+            self.status_label.config(text="Error occurred.", fg="red")
+            messagebox.showerror("Processing Error", text)
+        else:
+            self.status_label.config(text="Complete." + self.cache_status(), fg="green")
+            self.index_guide(text)
+
+    # --- SEARCH ---
+
+    def index_in_background(self, method, *args):
+        # the index is updated off the Tk thread; a large PDF takes a moment
+        if self.search_index is not None:
+            aio.submit(asyncio.to_thread(getattr(self.search_index, method), *args))
+
+    def index_guide(self, text, path=None):
+        """Indexes a finished guide: by its .docx once exported, else by project or by its sources."""
+        if path:
+            doc, name = os.path.abspath(path), os.path.basename(path)
+            if self.unsaved_guide_doc:
+                # the exported copy replaces the entry made when the compile finished
+                self.index_in_background("remove", self.unsaved_guide_doc)
+                self.unsaved_guide_doc = None
+        elif self.project is not None:
+            doc, name = self.project.path, self.project.name
+        else:
+            keys = "\0".join(project.source_key(s) for s in self.sources.segments)
+            doc = "session:" + hashlib.sha1(keys.encode("utf-8", "surrogatepass")).hexdigest()
+            name = f"Guide ({len(self.sources.segments)} files, {datetime.now().strftime('%Y-%m-%d %H:%M')})"
+            self.unsaved_guide_doc = doc
+        self.index_in_background("add_guide", doc, name, text, os.path.abspath(path) if path else None)
+
+    def open_search_window(self):
+        """Ranked search over every file ever loaded and every guide ever compiled."""
+        if self.search_index is None:
+            messagebox.showinfo("Info", "The search index is disabled (SEARCH_INDEX in config.json).")
+            return
+        search_win = Toplevel(self.master)
+        search_win.title("Search Notes")
+        search_win.geometry("820x460")
+        search_win.configure(bg=self.colors["bg"])
+
+        bar = tk.Frame(search_win, bg=self.colors["bg"])
+        bar.pack(fill=tk.X, padx=10, pady=(10, 0))
+        query = tk.Entry(bar)
+        query.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        kind = tk.StringVar(value="All")
+        ttk.Combobox(bar, textvariable=kind, values=["All", "Sources", "Guides"], state="readonly", width=9).pack(side=tk.LEFT, padx=(8, 0))
+
+        tree = ttk.Treeview(search_win, columns=("location", "snippet"))
+        tree.heading("#0", text="#")
+        tree.heading("location", text="Found in")
+        tree.heading("snippet", text="Match")
+        tree.column("#0", width=40, stretch=False)
+        tree.column("location", width=240)
+        tree.column("snippet", width=500)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        summary = tk.Label(search_win, text="Double-click a result to open its file.",
+                           bg=self.colors["bg"], fg=self.colors["fg"])
+        summary.pack(anchor="w", padx=10, pady=(0, 10))
+        hits = {}
+        pending = {"after": None, "query": 0}  # scheduled search, and the number of the latest query
+
+        # the index is queried on the asyncio loop's threads: while files are being indexed it is locked,
+        # and the window must keep taking keystrokes
+        def show_stats(stats):
+            if pending["query"] == 0 and search_win.winfo_exists():
+                summary.config(text=f"{stats.get('source', 0)} files and {stats.get('guide', 0)} guides indexed. "
+                                    "Double-click a result to open its file.")
+
+        def show_results(n_query, found, seconds):
+            if n_query != pending["query"] or not search_win.winfo_exists():
+                return  # a newer query was typed meanwhile, or the window was closed
+            tree.delete(*tree.get_children())
+            hits.clear()
+            for n, hit in enumerate(found, 1):
+                iid = tree.insert("", tk.END, text=str(n), values=(search.location(hit), " ".join(hit["snippet"].split())))
+                hits[iid] = hit
+            summary.config(text=f"{len(found)} results in {seconds * 1000:.0f} ms")
+
+        def query_index(n_query, text, which):
+            start = time.perf_counter()
+            found = self.search_index.search(text, limit=100, kind=which)
+            self.bridge.post(show_results, n_query, found, time.perf_counter() - start)
+
+        def run_search(event=None):
+            if pending["after"] is not None:
+                search_win.after_cancel(pending["after"])
+                pending["after"] = None
+            pending["query"] += 1
+            which = {"Sources": "source", "Guides": "guide"}.get(kind.get())
+            aio.submit(asyncio.to_thread(query_index, pending["query"], query.get(), which))
+
+        def schedule_search(event=None):
+            # one query once typing pauses, not one per key
+            if event is not None and event.keysym == "Return":
+                return  # already searched on the key press
+            if pending["after"] is not None:
+                search_win.after_cancel(pending["after"])
+            pending["after"] = search_win.after(SEARCH_DELAY_MS, run_search)
+
+        aio.submit(asyncio.to_thread(lambda: self.bridge.post(show_stats, self.search_index.stats())))
+
+        def open_hit(event=None):
+            hit = hits.get(tree.focus())
+            if not hit: return
+            if not hit["path"] or not os.path.exists(hit["path"]):
+                messagebox.showinfo("Info", "This result has no file on disk (the guide was not exported).")
+                return
+            open_with_default_app(hit["path"])
+
+        query.bind("<Return>", run_search)
+        query.bind("<KeyRelease>", schedule_search)
+        kind.trace_add("write", lambda *_: run_search())
+        tree.bind("<Double-1>", open_hit)
+        query.focus_set()
+
+    def open_run_details(self):
+        """Where the time of recent runs (file loads, compiles, exports, batch guides) went, stage by stage."""
+        runs = trace.recent()
+        if not runs:
+            messagebox.showinfo("Info", "Nothing has run yet. Load files or compile, then look again.")
+            return
+        details_win = Toplevel(self.master)
+        details_win.title("Run Details")
+        details_win.geometry("860x520")
+        details_win.configure(bg=self.colors["bg"])
+
+        bar = tk.Frame(details_win, bg=self.colors["bg"])
+        bar.pack(fill=tk.X, padx=10, pady=(10, 0))
+        chosen = tk.StringVar()
+        picker = ttk.Combobox(bar, textvariable=chosen, state="readonly", width=70)
+        picker.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Button(bar, text="Refresh", command=lambda: refresh()).pack(side=tk.LEFT, padx=(8, 0))
+
+        report = scrolledtext.ScrolledText(details_win, wrap=tk.NONE, font=("Consolas", 9),
+                                           bg=self.colors["text_bg"], fg=self.colors["text_fg"])
+        report.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        shown = []
+
+        def show(*_):
+            if picker.current() < 0: return
+            report.config(state=tk.NORMAL)
+            report.delete("1.0", tk.END)
+            report.insert(tk.END, shown[picker.current()].report())
+            report.config(state=tk.DISABLED)
+
+        def refresh():
+            shown[:] = reversed(trace.recent())
+            picker.config(values=[run.title() for run in shown])
+            picker.current(0)  # shows it through the trace on `chosen`
+
+        chosen.trace_add("write", show)
+        refresh()
+
+    def cache_status(self):
+        status = f"  ({self.response_cache.stats_text()})" if self.response_cache else ""
+        if self.project is not None:
+            status += f"  ({self.project.status_text()})"
+        return status
+
+    # --- PROJECTS ---
+
+    def new_project(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=project.PROJECT_EXTENSION,
+            filetypes=[("Note Organizer Project", "*" + project.PROJECT_EXTENSION)],
+        )
+        if not path: return
+        self.project = project.Project(path)
+        self.master.title(f"Note Organizer - {self.project.name}")
+        self.status_label.config(text=f"Project {self.project.name}: the next compile is saved to it; later compiles only send changed files.", fg=self.colors.get("fg"))
+
+    def open_project(self):
+        path = filedialog.askopenfilename(filetypes=[("Note Organizer Project", "*" + project.PROJECT_EXTENSION)])
+        if not path: return
+        try:
+            self.project = project.Project(path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open project: {e}")
+            return
+        self.master.title(f"Note Organizer - {self.project.name}")
+        self.clear_inputs()
+        found = [p for p in self.project.paths if os.path.exists(p)]
+        missing = len(self.project.paths) - len(found)
+        if missing:
+            messagebox.showwarning("Missing Files", f"{missing} file(s) of this project no longer exist and were skipped.")
+        if found:
+            self.load_paths(found)
+
+    def close_project(self):
+        self.project = None
+        self.master.title("Note Organizer")
+        self.status_label.config(text="Project closed.", fg=self.colors.get("fg"))
+
+    def copy_output(self):
+        self.master.clipboard_clear()
+        self.master.clipboard_append(self.output_view.get_text())
+        self.status_label.config(text="Copied.")
+
+    def export_to_docx(self):
+        if not DOCX_AVAILABLE:
+            messagebox.showerror("Error", "python-docx not installed")
+            return
+        
+        text = self.output_view.get_text().strip()
+        if len(text) < 10:
+            messagebox.showinfo("Info", "No notes to save.")
+            return
+
+        default_filename = f"Notes_{datetime.now().strftime('%Y%m%d')}.docx"
+        path = filedialog.asksaveasfilename(
+            initialfile=default_filename,
+            defaultextension=".docx", 
+            filetypes=[("Word Document", "*.docx")]
+        )
+        
+        if not path: return
+
+        # render and save off the Tk thread; large guides take a moment
+        self.docx_btn.config(state=tk.DISABLED)
+        self.status_label.config(text="Exporting...", fg=self.colors.get("fg"))
+        aio.submit(asyncio.to_thread(self.export_in_background, text, path))
+
+    def export_in_background(self, text, path):
+        try:
+            start = time.perf_counter()
+            with trace.run("export", file=os.path.basename(path)):
+                engine.export_docx(text, path)
+            self.bridge.post(self.finish_export, text, path, None, time.perf_counter() - start)
+        except Exception as e:
+            self.bridge.post(self.finish_export, text, path, e, 0)
+
+    def finish_export(self, text, path, error, seconds):
+        self.docx_btn.config(state=tk.NORMAL)
+        if error is not None:
+            self.status_label.config(text="Export failed.", fg="red")
+            messagebox.showerror("Error", str(error))
+            return
+        self.status_label.config(text=f"Exported in {seconds:.1f}s.", fg="green")
+        self.index_guide(text, path)
+        messagebox.showinfo("Success", f"Saved to {path}")
+
+    def open_export_window(self):
+        """Saves the guide in several formats at once, under one file name."""
+        text = self.output_view.get_text().strip()
+        if len(text) < 10:
+            messagebox.showinfo("Info", "No notes to save.")
+            return
+
+        export_win = Toplevel(self.master)
+        export_win.title("Export")
+        export_win.geometry("320x260")
+        export_win.configure(bg=self.colors["bg"])
+        tk.Label(export_win, text="Formats", font=("Helvetica", 12, "bold"), bg=self.colors["bg"], fg=self.colors["fg"]).pack(pady=10)
+
+        chosen = {}
+        for fmt, description in export.FORMATS.items():
+            missing = export.missing_dependency(fmt)
+            chosen[fmt] = tk.BooleanVar(value=fmt in self.export_formats and not missing)
+            tk.Checkbutton(export_win, text=description + (f" (needs {missing})" if missing else ""), variable=chosen[fmt],
+                           state=tk.DISABLED if missing else tk.NORMAL, bg=self.colors["bg"], fg=self.colors["fg"],
+                           selectcolor=self.colors["frame_bg"]).pack(anchor="w", padx=40)
+
+        def start():
+            fmts = [fmt for fmt, var in chosen.items() if var.get()]
+            if not fmts:
+                messagebox.showinfo("Info", "Choose at least one format.", parent=export_win)
+                return
+            # one name for every format: "Biology" becomes Biology.docx, Biology.pdf, ...
+            path = filedialog.asksaveasfilename(parent=export_win, title="Export as",
+                                                initialfile=f"Notes_{datetime.now().strftime('%Y%m%d')}")
+            if not path: return
+            export_win.destroy()
+            base = os.path.splitext(path)[0] if os.path.splitext(path)[1].lstrip(".").lower() in export.FORMATS else path
+            self.export_formats = fmts
+            try:
+                config.save_config_value("EXPORT_FORMATS", fmts)
+            except Exception as e:
+                print(f"Error saving export formats: {e}")
+            self.export_btn.config(state=tk.DISABLED)
+            self.status_label.config(text=f"Exporting {', '.join(fmts)}...", fg=self.colors.get("fg"))
+            aio.submit(asyncio.to_thread(self.export_formats_in_background, text, base, fmts))
+
+        tk.Button(export_win, text="Export...", command=start, bg=self.colors["btn_primary"], fg="white").pack(pady=15)
+
+    def export_formats_in_background(self, text, base, fmts):
+        try:
+            start = time.perf_counter()
+            with trace.run("export", file=os.path.basename(base)):
+                results = export.export_guides([(text, base)], fmts)
+            self.bridge.post(self.finish_formats_export, text, results, None, time.perf_counter() - start)
+        except Exception as e:
+            self.bridge.post(self.finish_formats_export, text, [], e, 0)
+
+    def finish_formats_export(self, text, results, error, seconds):
+        self.export_btn.config(state=tk.NORMAL)
+        written = [r["path"] for r in results if not r["error"]]
+        failed = export.failures_text(results) if error is None else str(error)
+        if written:
+            self.index_guide(text, written[0])
+        if failed:
+            self.status_label.config(text=f"Exported {len(written)} of {len(results)} files." if written else "Export failed.", fg="red")
+            messagebox.showerror("Export Error", failed)
+            return
+        self.status_label.config(text=f"Exported {len(written)} files in {seconds:.1f}s.", fg="green")
+        messagebox.showinfo("Success", "Saved:\n" + "\n".join(written))
+
+def open_with_default_app(path):
+    if sys.platform.startswith("win"):
+        os.startfile(path)
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", path])
+    else:
+        subprocess.Popen(["xdg-open", path])
+
+def main():
+    root = tk.Tk()
+    app = NoteOrganizerApp(root)
+    root.mainloop()
@@ -0,0 +1,268 @@
+"""Adaptive preprocessing of images before they are sent to the model.
+
+Every image is cropped to its content, classified as text (pages, slides,
+whiteboards, handwriting) or picture, and encoded to fit a byte budget:
+
+- borders of the background colour are cropped away;
+- images without colour, and text images whose colour is only a few marks, are
+  sent as grayscale;
+- dense text keeps up to TEXT_PIXELS on its long side so small writing stays
+  legible, everything else PICTURE_PIXELS; sizes are nudged down onto the model's
+  768 px tile grid when that saves a whole row or column of tiles;
+- JPEG quality, then resolution, is lowered until the image fits its byte budget;
+- a perceptual hash (DCT pHash) is kept so near-duplicate frames can be dropped,
+  and for images of text a layout (a small grayscale copy) that tells slides on
+  one template apart;
+- optionally, very large text scans are cut into tiles, each legible at full
+  resolution, and blank tiles are left out.
+
+Runs in the ingest worker processes (see ingest.py). Requires Pillow.
+"""
+import io
+import math
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps, ImageStat
+
+TEXT_PIXELS = 1536  # long side for pages of text and handwriting
+PICTURE_PIXELS = 1024  # long side for photos, diagrams and sparse slides
+MIN_PIXELS = 512  # the budget never shrinks an image below this
+TEXT_BUDGET = 400 * 1024  # JPEG bytes per text image (or tile); dense writing needs the pixels
+PICTURE_BUDGET = 160 * 1024
+TEXT_QUALITIES = (85, 75, 65)  # text keeps its resolution as long as it can
+PICTURE_QUALITIES = (85, 75, 65, 55)
+SHRINK_STEP = 0.8
+REDUCING_GAP = 2.0  # box-reduce to within this factor of the target before resampling, as Image.thumbnail does
+
+MODEL_TILE_PIXELS = 768  # the model bills images per 768 px tile (tokens.IMAGE_TILE_PIXELS)
+TILE_SNAP = 0.12  # shrink up to this much more to drop a row or column of model tiles
+
+CROP_TOLERANCE = 24  # 0-255 difference from the background still counted as border
+CROP_MARGIN = 8
+
+ANALYSIS_PIXELS = 512
+GRAY_SATURATION = 24  # mean saturation (0-255) under which an image has no real colour
+COLOR_PIXEL_SATURATION = 80
+TEXT_MAX_COLOR = 0.03  # a text image with less colour than this is sent as grayscale
+BACKGROUND_BAND = 24  # brightness within this of the commonest level counts as background
+INK_CONTRAST = 48  # brightness this far from the background counts as ink
+TEXT_BACKGROUND = 0.55  # share of pixels that are background on a page, slide or board
+TEXT_INK = (0.005, 0.35)  # share of pixels that are ink
+DENSE_EDGES = 20  # mean edge strength above which text is dense (handwriting, full pages)
+
+TILE_PIXELS = 1536  # tile size when tiling is on; two model tiles on a side
+TILE_MIN_PIXELS = 2400  # text images this large would lose detail at TEXT_PIXELS, so they are tiled
+TILE_OVERLAP = 64  # lines cut by a tile edge appear whole in one of the two tiles
+BLANK_STDDEV = 6.0  # tiles this uniform are left out
+
+HASH_SIZE = 8  # pHash bits = HASH_SIZE ** 2 (compared in segments.py)
+LAYOUT_PIXELS = 64  # side of the grayscale copy compared for images of text (see layout)
+LAYOUT_TOLERANCE = 64  # 0-255 change in one layout cell that re-encoding or rescaling stays under
+
+EXIF_ORIENTATION = 0x0112
+
+_DCT_SIZE = 32
+_COS = [[math.cos(math.pi * (2 * n + 1) * k / (2 * _DCT_SIZE)) for n in range(_DCT_SIZE)] for k in range(HASH_SIZE)]
+
+
+class Prepared:
+    """The encoded parts of one image and what was found out about it."""
+
+    def __init__(self, parts, phash, kind, gray, size, dense=False, image=None, layout=None):
+        self.parts = parts  # JPEG bytes, one per tile (usually one)
+        self.phash = phash
+        self.layout = layout  # images of text only
+        self.kind = kind  # "text" or "picture"
+        self.gray = gray
+        self.size = size  # (width, height) of the first part
+        self.dense = dense  # a page of text rather than a slide or a few words
+        self.image = image  # the cropped image at full resolution, before encoding (for OCR)
+
+
+# --- ANALYSIS ---
+
+def background(img):
+    """The most common colour among the four corners."""
+    w, h = img.size
+    corners = [img.getpixel(xy) for xy in ((0, 0), (w - 1, 0), (0, h - 1), (w - 1, h - 1))]
+    return max(corners, key=corners.count)
+
+
+def content_box(img):
+    """Bounding box of everything that differs from the border colour, or None for a blank image."""
+    diff = ImageChops.difference(img, Image.new(img.mode, img.size, background(img)))
+    if diff.mode != "L":
+        diff = diff.convert("L")
+    return diff.point(lambda p: 255 if p > CROP_TOLERANCE else 0).getbbox()
+
+
+def thumbnail(img, pixels=ANALYSIS_PIXELS):
+    """A copy of `img` fitting in pixels x pixels, and the factor it was shrunk by."""
+    factor = max(1, int(max(img.size) / pixels))
+    small = img.reduce(factor) if factor > 1 else img  # box filter; far cheaper than resampling the original
+    scale = min(1.0, pixels / max(small.size))
+    if scale < 1.0:
+        small = small.resize((max(1, round(small.width * scale)), max(1, round(small.height * scale))), Image.BILINEAR)
+    return small, img.width / small.width
+
+
+def auto_crop(img, small, factor):
+    """`img` and its thumbnail `small` without their uniform border (plus a small margin).
+
+    The border is found on the thumbnail; the margin covers the pixels one thumbnail pixel
+    stands for. Blank images are returned as they are.
+    """
+    box = content_box(small)
+    if box is None or box == (0, 0, small.width, small.height):
+        return img, small
+    margin = CROP_MARGIN + math.ceil(factor)
+    left, top, right, bottom = box
+    full = (max(0, int(left * factor) - margin), max(0, int(top * factor) - margin),
+            min(img.width, math.ceil(right * factor) + margin), min(img.height, math.ceil(bottom * factor) + margin))
+    if full == (0, 0, img.width, img.height):
+        return img, small
+    return img.crop(full), small.crop(box)
+
+
+def classify(small):
+    """("text" or "picture", gray, dense) of an image, from a thumbnail of it."""
+    luma = small.convert("L")
+    hist = luma.histogram()
+    total = float(sum(hist)) or 1.0
+    # text is a large plain background (light paper or a dark slide) with a little ink far from it
+    level = max(range(256), key=hist.__getitem__)
+    back = sum(hist[max(0, level - BACKGROUND_BAND):level + BACKGROUND_BAND + 1]) / total
+    ink = sum(n for v, n in enumerate(hist) if abs(v - level) >= INK_CONTRAST) / total
+    text = back >= TEXT_BACKGROUND and TEXT_INK[0] <= ink <= TEXT_INK[1]
+    if small.mode == "L":
+        color, saturation = 0.0, 0.0
+    else:
+        sat = small.convert("RGB").convert("HSV").getchannel("S")
+        saturation = ImageStat.Stat(sat).mean[0]
+        color = sum(sat.histogram()[COLOR_PIXEL_SATURATION:]) / total
+    gray = saturation < GRAY_SATURATION or (text and color < TEXT_MAX_COLOR)
+    dense = text and ImageStat.Stat(luma.filter(ImageFilter.FIND_EDGES)).mean[0] >= DENSE_EDGES
+    return ("text" if text else "picture"), gray, dense
+
+
+def phash(img):
+    """64-bit perceptual hash: signs of the low DCT frequencies of a 32x32 grayscale copy against their median."""
+    px = list(img.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS).tobytes())  # one byte per pixel
+    rows = [px[r * _DCT_SIZE:(r + 1) * _DCT_SIZE] for r in range(_DCT_SIZE)]
+    # separable 2-D DCT-II, keeping only the top-left HASH_SIZE x HASH_SIZE block
+    row_dct = [[sum(c * v for c, v in zip(_COS[k], row)) for k in range(HASH_SIZE)] for row in rows]
+    coeffs = [sum(_COS[k][r] * row_dct[r][u] for r in range(_DCT_SIZE)) for k in range(HASH_SIZE) for u in range(HASH_SIZE)]
+    median = sorted(coeffs[1:])[len(coeffs) // 2 - 1]  # the DC term says nothing about structure
+    bits = 0
+    for c in coeffs:
+        bits = (bits << 1) | (c > median)
+    return bits
+
+
+def layout(small):
+    """A LAYOUT_PIXELS-square grayscale copy of a cropped thumbnail, as bytes.
+
+    Slides made from one template have close pHashes whatever they say; their layouts
+    differ wherever a line or a word does, while a re-encoded or rescaled copy stays close.
+    """
+    return small.convert("L").resize((LAYOUT_PIXELS, LAYOUT_PIXELS), Image.BOX).tobytes()
+
+
+def layout_of(img):
+    """The layout of an opened image, cropped as prepare() crops it."""
+    img = flatten(img)
+    _, small = auto_crop(img, *thumbnail(img))
+    return layout(small)
+
+
+def layout_distance(a, b):
+    """How many cells of two layouts differ by more than LAYOUT_TOLERANCE."""
+    size = (LAYOUT_PIXELS, LAYOUT_PIXELS)
+    diff = ImageChops.difference(Image.frombytes("L", size, a), Image.frombytes("L", size, b))
+    return sum(diff.histogram()[LAYOUT_TOLERANCE + 1:])
+
+
+# --- ENCODING ---
+
+def snap_size(size, max_side):
+    """(w, h) scaled to fit max_side, shrunk a little more if that drops a row or column of model tiles."""
+    w, h = size
+    scale = min(1.0, max_side / max(w, h))
+    for dim in (w, h):
+        scaled = dim * scale
+        snapped = math.floor(scaled / MODEL_TILE_PIXELS) * MODEL_TILE_PIXELS
+        if snapped and scaled > snapped and snapped >= scaled * (1 - TILE_SNAP):
+            scale = min(scale, snapped / dim)
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+
+def jpeg(img, quality):
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def encode_to_budget(img, max_side, qualities, budget):
+    """JPEG bytes of `img` at most `max_side` on its long side: the largest size and best quality within `budget`."""
+    side = max_side
+    while True:
+        target = snap_size(img.size, side)
+        resized = img if target == img.size else img.resize(target, Image.BICUBIC, reducing_gap=REDUCING_GAP)
+        for quality in qualities:
+            data = jpeg(resized, quality)
+            if len(data) <= budget:
+                return data, resized.size
+        if max(target) <= MIN_PIXELS:
+            return data, resized.size  # as small as it gets; over budget is better than illegible
+        side = max(MIN_PIXELS, int(max(target) * SHRINK_STEP))
+
+
+def tiles(img, tile=TILE_PIXELS, overlap=TILE_OVERLAP):
+    """Non-blank tiles of `img`, row by row, overlapping by `overlap` pixels."""
+    step = tile - overlap
+    cols = max(1, math.ceil((img.width - overlap) / step))
+    rows = max(1, math.ceil((img.height - overlap) / step))
+    out = []
+    for r in range(rows):
+        for c in range(cols):
+            box = (c * step, r * step, min(img.width, c * step + tile), min(img.height, r * step + tile))
+            part = img.crop(box)
+            if ImageStat.Stat(part.convert("L")).stddev[0] >= BLANK_STDDEV:
+                out.append(part)
+    return out or [img]
+
+
+def flatten(img):
+    """`img` in RGB or L, with transparency laid over white (as a viewer shows it)."""
+    if img.mode in ("RGB", "L"):
+        return img
+    if img.mode in ("RGBA", "LA", "P", "PA") or "transparency" in img.info:
+        rgba = img.convert("RGBA")
+        return Image.alpha_composite(Image.new("RGBA", rgba.size, (255, 255, 255, 255)), rgba).convert("RGB")
+    return img.convert("RGB")
+
+
+def prepare(img, tile=False):
+    """Crops, classifies and encodes an opened PIL image. Returns a Prepared."""
+    if img.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        img = ImageOps.exif_transpose(img)  # phone photos are often stored sideways
+    img = flatten(img)
+    img, small = auto_crop(img, *thumbnail(img))
+    kind, gray, dense = classify(small)
+    if gray and img.mode != "L":
+        img = img.convert("L")
+    hashed = phash(small)
+    qualities, budget = (TEXT_QUALITIES, TEXT_BUDGET) if kind == "text" else (PICTURE_QUALITIES, PICTURE_BUDGET)
+    if tile and kind == "text" and max(img.size) > TILE_MIN_PIXELS:
+        parts = [encode_to_budget(part, TILE_PIXELS, qualities, budget) for part in tiles(img)]
+    else:
+        parts = [encode_to_budget(img, TEXT_PIXELS if dense else PICTURE_PIXELS, qualities, budget)]
+    return Prepared([data for data, _ in parts], hashed, kind, gray, parts[0][1], dense, img,
+                    layout(small) if kind == "text" else None)
+
+
+def open_image(path, full_resolution=False):
+    """Opens an image file, letting JPEG decode at reduced size unless the full resolution is needed (tiles, OCR)."""
+    img = Image.open(path)
+    if not full_resolution:
+        img.draft(None, (TEXT_PIXELS, TEXT_PIXELS))
+    return img
@@ -0,0 +1,382 @@
+"""Reads source files into text and image payloads, in parallel and with a persistent cache.
+
+PDFs and images are handled in a process pool; large PDFs are further split into
+page ranges so one 500-page reader does not hold up a single core. Images are
+cropped, classified and encoded to a byte budget there (see imaging.py). With
+OCR on (see ocr.py), empty PDF pages and photos of text pages are read locally and
+sent as text. Results are stored in an ExtractionCache so re-adding the same files
+costs a stat() call.
+
+The workers time their own work; ingest_files records it in the current trace
+(see trace.py) as "file.read", "pdf.extract", "pdf.pages" and "image.encode" spans.
+"""
+import base64
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import dedup, ocr, trace
+
+# Check for optional libraries
+try:
+    import pypdf
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+try:
+    from PIL import Image
+    from . import imaging
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+MAX_IMAGE_PIXELS = 1536  # longest side of an encoded image or tile (imaging.TEXT_PIXELS)
+JPEG_QUALITY = 85  # for images shrunk to fit a request
+PAGES_PER_TASK = 20  # PDF pages extracted per pool task
+
+# trace span per file kind
+STAGES = {"text": "file.read", "pdf": "pdf.extract", "image": "image.encode"}
+
+TEXT_EXTENSIONS = [".txt"]
+PDF_EXTENSIONS = [".pdf"]
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg"]
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS + PDF_EXTENSIONS + IMAGE_EXTENSIONS
+
+# Part of every cache key: bump when extraction output changes
+EXTRACTOR_VERSION = f"7:{MAX_IMAGE_PIXELS}:{JPEG_QUALITY}:{dedup.SHINGLE_WORDS}:{dedup.SAMPLE_RATE}"
+
+
+def extractor_version(tile=False, ocr_language=None):
+    # tiled and untiled encodings, and OCR text, are cached separately
+    version = EXTRACTOR_VERSION + (":tiles" if tile else "")
+    if ocr_language:
+        version += f":ocr={ocr_language}:{ocr.MIN_CONFIDENCE}:{ocr.MIN_WORDS}"
+    return version
+
+
+def file_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in TEXT_EXTENSIONS:
+        return "text"
+    if ext in PDF_EXTENSIONS and PDF_AVAILABLE:
+        return "pdf"
+    if ext in IMAGE_EXTENSIONS and PIL_AVAILABLE:
+        return "image"
+    return "other"
+
+
+def _shows_images(page):
+    try:
+        return len(page.images) > 0
+    except Exception:
+        return True  # cannot tell: better sent than lost
+
+
+def read_pdf_pages(path, start=0, stop=None, ocr_language=None):
+    """Text of pages [start, stop) of a PDF.
+
+    With `ocr_language`, pages without a text layer (scans) are read with OCR. A page
+    without text that shows images which could not be read comes back as None (an
+    unread page, see unread_pages); other pages without text come back empty.
+    """
+    reader = pypdf.PdfReader(path)
+    text_parts = []
+    for p in reader.pages[start:stop]:
+        try:
+            t = p.extract_text()
+        except Exception:
+            t = None
+        if not (t or "").strip():
+            if ocr_language:
+                t = ocr.read_pdf_page(p, ocr_language)
+            elif _shows_images(p):
+                t = None
+            else:
+                t = ""
+        text_parts.append(t)
+    return text_parts
+
+
+def unread_pages(pages):
+    """0-based numbers of the pages read_pdf_pages could not read, or None if it read them all."""
+    return [n for n, t in enumerate(pages) if t is None] or None
+
+
+def page_layouts(path, pages):
+    """Layouts (see imaging.layout, as hex) of the largest image on each of `pages` (0-based).
+
+    For unread scanned pages, so the same slides loaded as image files are found. Pages whose
+    images cannot be decoded are left out; None without Pillow or without pages.
+    """
+    if not (PIL_AVAILABLE and pages):
+        return None
+    reader = pypdf.PdfReader(path)
+    layouts = []
+    for n in pages:
+        try:
+            images = [image.image for image in reader.pages[n].images]
+        except Exception:
+            continue
+        images = [img for img in images if img is not None]
+        if images:
+            layouts.append(imaging.layout_of(max(images, key=lambda img: img.width * img.height)).hex())
+    return layouts or None
+
+
+def read_pdf_text(path):
+    return "\n".join(t or "" for t in read_pdf_pages(path))
+
+
+def pdf_page_count(path):
+    return len(pypdf.PdfReader(path).pages)
+
+
+def jpeg_payload(data):
+    return {"inline_data": {"mime_type": "image/jpeg", "data": base64.b64encode(data).decode('utf-8')}}
+
+
+def prepare_image(path, tile=False, ocr_language=None):
+    """Crops and encodes an image (see imaging.prepare).
+
+    Returns (inline_data payloads, pHash as hex, text, layout as hex). With `ocr_language`,
+    a photo or scan of a page of text is read with OCR; when that succeeds `text` is the
+    text and there are no payloads, otherwise `text` is None. Images of text get no pHash,
+    since slides made from one template hash a few bits apart, but a layout when they are
+    sent as images.
+    """
+    # tiles are cut for the model's sake; OCR wants the full resolution either way
+    with imaging.open_image(path, tile or bool(ocr_language)) as img:
+        prepared = imaging.prepare(img, tile)
+    phash = f"{prepared.phash:016x}" if prepared.kind != "text" else None
+    if ocr_language and prepared.kind == "text" and prepared.dense:
+        text = ocr.read_text(prepared.image, ocr_language)
+        if text:
+            return None, phash, text, None
+    layout = prepared.layout.hex() if prepared.layout is not None else None
+    return [jpeg_payload(data) for data in prepared.parts], phash, None, layout
+
+
+def encode_image(path):
+    """An image as one inline_data JPEG payload."""
+    return prepare_image(path)[0][0]
+
+
+def shrink_image(payload, max_pixels):
+    """An inline image payload re-encoded to fit in max_pixels x max_pixels (unchanged if it already does)."""
+    with Image.open(io.BytesIO(base64.b64decode(payload["inline_data"]["data"]))) as img:
+        if max(img.size) <= max_pixels:
+            return payload
+        img.thumbnail((max_pixels, max_pixels))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        byte_arr = io.BytesIO()
+        img.save(byte_arr, format='JPEG', quality=JPEG_QUALITY)
+    return jpeg_payload(byte_arr.getvalue())
+
+
+def pdf_payload(data):
+    return {"inline_data": {"mime_type": "application/pdf", "data": base64.b64encode(data).decode('utf-8')}}
+
+
+def encode_pdf(path):
+    """The whole PDF as an inline_data payload, for scans that have no extractable text."""
+    with open(path, "rb") as f:
+        return pdf_payload(f.read())
+
+
+def encode_pdf_pages(path, pages):
+    """Pages `pages` (0-based) of a PDF, as a PDF in one inline_data payload."""
+    reader = pypdf.PdfReader(path)
+    writer = pypdf.PdfWriter()
+    for n in pages:
+        writer.add_page(reader.pages[n])
+    out = io.BytesIO()
+    writer.write(out)
+    return pdf_payload(out.getvalue())
+
+
+def empty_result(path, kind):
+    return {"name": os.path.basename(path), "kind": kind, "text": None, "images": None, "phash": None, "pages": None,
+            "unread_pages": None, "shingles": None, "layouts": None}
+
+
+def text_shingles(text):
+    """dedup.text_signature of extracted text; None when there is none (pages OCR could not read), so it is not compared."""
+    return dedup.text_signature(text) if text and text.strip() else None
+
+
+def extract_file(path, tile=False, ocr_language=None):
+    """Reads one file. Never raises: failures come back with kind "error".
+
+    Returns {"name", "kind", "text", "images", "phash", "pages", "unread_pages", "shingles", "layouts", "seconds"};
+    kind is text, pdf, image, other or error. For images, `images` holds the inline payloads (one, or one
+    per tile with `tile`) and `phash` the perceptual hash; an image read with OCR has `text` instead of
+    `images`. For PDFs, `pages` is the length of each page's text (pages are joined with "\n") and
+    `unread_pages` lists the scanned pages that gave no text (see read_pdf_pages). `shingles` is the
+    text's dedup.text_signature; `layouts` compare images of text, and unread pages, that have none.
+    """
+    t0 = time.perf_counter()
+    result = empty_result(path, file_kind(path))
+    try:
+        if result["kind"] == "text":
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                result["text"] = f.read()
+        elif result["kind"] == "pdf":
+            pages = read_pdf_pages(path, ocr_language=ocr_language)
+            result["text"] = "\n".join(t or "" for t in pages)
+            result["pages"] = [len(t or "") for t in pages]
+            result["unread_pages"] = unread_pages(pages)
+            result["layouts"] = page_layouts(path, result["unread_pages"])
+        elif result["kind"] == "image":
+            result["images"], result["phash"], result["text"], layout = prepare_image(path, tile, ocr_language)
+            result["layouts"] = [layout] if layout else None
+        result["shingles"] = text_shingles(result["text"])
+    except Exception as e:
+        result["kind"] = "error"
+        result["text"] = str(e)
+    result["seconds"] = time.perf_counter() - t0
+    return result
+
+
+def _timed_pages(path, start, stop, ocr_language=None):
+    t0 = time.perf_counter()
+    pages = read_pdf_pages(path, start, stop, ocr_language)
+    layouts = page_layouts(path, [start + n for n in unread_pages(pages) or ()])
+    return (pages, layouts or []), time.perf_counter() - t0
+
+
+def record_result(path, result):
+    """Adds a finished (or cached) extraction to the current trace."""
+    if trace.current() is None:
+        return
+    if result.get("cached"):
+        trace.record("file.cached", 0.0, file=result["name"])
+        return
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    attrs = {"file": result["name"], "bytes": size}
+    if result["kind"] == "error":
+        attrs["error"] = result["text"]
+    if result["pages"]:
+        attrs["pages"] = len(result["pages"])
+    if result.get("unread_pages"):
+        attrs["unread_pages"] = len(result["unread_pages"])
+    if result["images"]:
+        attrs["encoded_bytes"] = sum(len(p["inline_data"]["data"]) * 3 // 4 for p in result["images"])
+        attrs["tiles"] = len(result["images"])
+    elif result["kind"] == "image" and result["text"]:
+        attrs["ocr"] = True
+    trace.record(STAGES.get(file_kind(path), "file.read"), result.get("seconds") or 0.0, **attrs)
+
+
+def default_workers():
+    # leave one core for the GUI
+    return max(1, min(8, (os.cpu_count() or 2) - 1))
+
+
+def ingest_files(paths, cache=None, pool=None, workers=None, on_progress=None, tile=False, ocr_language=None):
+    """Extracts every path, in order. PDFs and images run in a process pool.
+
+    `pool` may be a shared ProcessPoolExecutor; otherwise one is started when there
+    is heavy work that the cache cannot answer. `on_progress(done, total, result)` is
+    called from the calling thread as each file finishes. `tile` cuts very large scans
+    into tiles (see imaging.prepare) and `ocr_language` turns on OCR (see ocr.py); `cache`
+    should be keyed by extractor_version(tile, ocr_language).
+    """
+    total = len(paths)
+    results = [None] * total
+    done = [0]
+
+    def finish(i, result):
+        if cache is not None and result["kind"] != "error" and not result.get("cached"):
+            cache.put(paths[i], result)
+        record_result(paths[i], result)
+        results[i] = result
+        done[0] += 1
+        if on_progress:
+            on_progress(done[0], total, result)
+
+    heavy = []
+    for i, path in enumerate(paths):
+        hit = cache.get(path) if cache is not None else None
+        if hit is not None:
+            hit["cached"] = True
+            finish(i, hit)
+        elif file_kind(path) in ("pdf", "image"):
+            heavy.append(i)
+        else:
+            finish(i, extract_file(path))
+    if not heavy:
+        return results
+
+    own_pool = None
+    workers = workers or default_workers()
+    # a pool only pays off with several cores and more than one task
+    if pool is None and workers > 1 and len(heavy) + sum(1 for i in heavy if file_kind(paths[i]) == "pdf") > 1:
+        try:
+            own_pool = pool = ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError):
+            pool = None  # no multiprocessing here (sandbox, frozen app): read inline
+    try:
+        if pool is None:
+            for i in heavy:
+                finish(i, extract_file(paths[i], tile, ocr_language))
+            return results
+
+        futures = {}
+        page_parts = {}  # file index -> [(texts, layouts) per range]
+        for i in heavy:
+            path = paths[i]
+            pages = 0
+            if file_kind(path) == "pdf":
+                try:
+                    pages = pdf_page_count(path)
+                except Exception:
+                    pages = 0  # let extract_file report the error
+            if pages > PAGES_PER_TASK:
+                ranges = list(range(0, pages, PAGES_PER_TASK))
+                page_parts[i] = [None] * len(ranges)
+                for n, start in enumerate(ranges):
+                    futures[pool.submit(_timed_pages, path, start, start + PAGES_PER_TASK, ocr_language)] = (i, n)
+            else:
+                futures[pool.submit(extract_file, path, tile, ocr_language)] = (i, None)
+
+        seconds = {}
+        for future in as_completed(futures):
+            i, n = futures[future]
+            if n is None:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = dict(empty_result(paths[i], "error"), text=str(e), seconds=0.0)
+                finish(i, result)
+                continue
+            parts = page_parts[i]
+            try:
+                parts[n], took = future.result()
+                seconds[i] = seconds.get(i, 0.0) + took
+                trace.record("pdf.pages", took, file=os.path.basename(paths[i]), first=n * PAGES_PER_TASK + 1,
+                             pages=len(parts[n][0]))
+            except Exception as e:
+                parts[n] = e
+            if all(p is not None for p in parts):
+                errors = [p for p in parts if isinstance(p, Exception)]
+                result = dict(empty_result(paths[i], "pdf"), seconds=seconds.get(i, 0.0))
+                if errors:
+                    result.update(kind="error", text=str(errors[0]))
+                else:
+                    pages = [t for part in parts for t in part[0]]
+                    result["text"] = "\n".join(t or "" for t in pages)
+                    result["pages"] = [len(t or "") for t in pages]
+                    result["unread_pages"] = unread_pages(pages)
+                    result["layouts"] = [layout for part in parts for layout in part[1]] or None
+                    result["shingles"] = text_shingles(result["text"])
+                finish(i, result)
+        return results
+    finally:
+        if own_pool is not None:
+            own_pool.shutdown()
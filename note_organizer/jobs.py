@@ -0,0 +1,358 @@
+"""Compiles many study guides at once, a bounded number at a time.
+
+Each guide is a CompileJob, run as a task on the shared asyncio loop (aio.py), so
+queued and running jobs cost no OS thread each. Jobs share one RateLimiter so
+the queue as a whole stays under the API quota (requests and tokens per minute),
+and rate-limit, server and deadline errors are retried with jittered exponential
+backoff.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from . import aio, engine, export, gemini, ingest, project, tokens, trace
+
+DEFAULT_WORKERS = 4
+DEFAULT_REQUESTS_PER_MINUTE = 15
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+DEFAULT_MAX_RETRIES = 5
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Job states
+PENDING = "Queued"
+READING = "Reading"
+WAITING = "Waiting for quota"
+COMPILING = "Compiling"
+RETRYING = "Retrying"
+EXPORTING = "Exporting"
+DONE = "Done"
+FAILED = "Failed"
+
+
+def find_guides(root, per_file=False):
+    """Walks a folder tree and groups supported files into guides.
+
+    By default every folder that directly holds course material becomes one guide;
+    with per_file=True every file is compiled on its own.
+    Returns a list of (guide_name, [paths]) in a stable order.
+    """
+    root = os.path.abspath(root)
+    guides = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        paths = [os.path.join(dirpath, f) for f in sorted(filenames)
+                 if os.path.splitext(f)[1].lower() in engine.SUPPORTED_EXTENSIONS]
+        if not paths:
+            continue
+        rel_dir = os.path.relpath(dirpath, root)
+        if per_file:
+            for p in paths:
+                guides.append((os.path.splitext(os.path.join(rel_dir, os.path.basename(p)))[0], [p]))
+        else:
+            guides.append((os.path.basename(root) if rel_dir == "." else rel_dir, paths))
+    return [(os.path.normpath(name), paths) for name, paths in guides]
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute` units per minute, up to one minute's worth.
+
+    A `per_minute` of 0 or less means no limit: nothing ever waits.
+    """
+
+    def __init__(self, per_minute):
+        self.unlimited = per_minute <= 0
+        self.capacity = float(max(per_minute, 0))
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        if self.unlimited:
+            return 0.0
+        # an oversized request is allowed once the bucket is full
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if not self.unlimited:
+            self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by all workers."""
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.lock = threading.Lock()
+
+    async def acquire(self, tokens):
+        """Waits until one request of `tokens` tokens fits in both budgets."""
+        with trace.span("rate_limit.wait", tokens=tokens):
+            while True:
+                with self.lock:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        return
+                await asyncio.sleep(min(wait, 1.0))
+
+
+def is_retryable(error):
+    if isinstance(error, engine.ApiError):
+        return error.status_code in RETRYABLE_STATUS
+    return isinstance(error, gemini.TRANSIENT_ERRORS)
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def call_with_retries(func, max_retries=DEFAULT_MAX_RETRIES, on_retry=None):
+    """Awaits `func()` until it succeeds, sleeping between retryable failures."""
+    attempt = 0
+    while True:
+        try:
+            return await func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            if getattr(e, "retry_after", None):
+                delay = max(delay, e.retry_after)
+            attempt += 1
+            if on_retry:
+                on_retry(attempt, delay, e)
+            with trace.span("retry.wait", attempt=attempt, reason=str(getattr(e, "status_code", type(e).__name__))):
+                await asyncio.sleep(delay)
+
+
+class CompileJob:
+    """One study guide: a list of source files compiled into `out_path`.
+
+    `out_path` ends in .docx; the other `formats` (see export.py) are written next to it.
+    """
+
+    def __init__(self, name, paths, out_path, instructions="", save_markdown=False, project_path=None,
+                 formats=None):
+        self.name = name
+        self.paths = paths
+        self.out_path = out_path
+        self.instructions = instructions
+        self.save_markdown = save_markdown
+        self.formats = list(formats or export.DEFAULT_FORMATS)
+        if save_markdown and "md" not in self.formats:
+            self.formats.append("md")
+        self.outputs = []  # export.render results
+        self.project_path = project_path  # set for incremental recompiles (see project.py)
+
+        self.status = PENDING
+        self.detail = ""
+        self.attempts = 0
+        self.error = None
+        self.output_text = None
+        self.cached = False
+        self.project_status = ""
+        self.duplicate_status = ""
+        self.file_timings = []  # (label, seconds)
+        self.trace = None  # trace.Trace of the last run
+        self.started = None
+        self.finished = None
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+
+class JobQueue:
+    """Runs CompileJobs as tasks on the shared asyncio loop, `workers` of them at a time.
+
+    `on_update(job)` is called on every state change, from the loop thread or an
+    ingest thread; GUI callers must hop back to the Tk thread themselves.
+    """
+
+    def __init__(self, api_url, api_key, workers=DEFAULT_WORKERS, limiter=None,
+                 max_retries=DEFAULT_MAX_RETRIES, on_update=None, cache=None, chunk_chars=engine.MAX_RAW_CHARS,
+                 extraction_cache=None, uploader=None, index=None, deadline=None, tile_images=False,
+                 ocr_language=None, dedup=True):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.cache = cache
+        self.extraction_cache = extraction_cache
+        self.tile_images = tile_images  # cut very large scans into tiles (see imaging.py)
+        self.ocr_language = ocr_language  # read scans and photos of text locally (see ocr.py)
+        self.dedup = dedup  # leave out files that repeat other files of the same guide (see dedup.py)
+        self.uploader = uploader
+        self.index = index  # search.SearchIndex: sources and finished guides are added to it
+        self.chunk_chars = chunk_chars
+        self.deadline = deadline  # seconds per request; None uses the client's REQUEST_DEADLINE
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.on_update = on_update
+        self.slots = asyncio.Semaphore(max(1, workers))
+        # one process pool for PDF/image extraction and for exports, shared by all jobs;
+        # started by the first job that has PDFs or images (see _pool)
+        self.ingest_pool = None
+        self.pool_closed = False
+        self.jobs = []
+        self.futures = []
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        self.jobs.append(job)
+        self.futures.append(aio.submit(self._run(job)))
+        self._notify(job)
+        return job
+
+    def wait(self):
+        wait(self.futures)
+        self.pool_closed = True
+        if self.ingest_pool is not None:
+            self.ingest_pool.shutdown()
+        return self.jobs
+
+    def cancel(self):
+        """Cancels every job: queued ones never start and running ones abort their requests."""
+        for job, future in zip(self.jobs, self.futures):
+            if future.cancel() and job.status == PENDING:
+                # a task cancelled before it first runs never reaches _run's handlers
+                job.error = engine.Cancelled()
+                self._finish(job, FAILED, "Cancelled")
+        self.pool_closed = True
+        if self.ingest_pool is not None:
+            self.ingest_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _notify(self, job, status=None, detail=""):
+        if status:
+            with self.lock:
+                if job.status in (DONE, FAILED):
+                    return  # cancelled while its task was starting
+                job.status = status
+                job.detail = detail
+        if self.on_update:
+            self.on_update(job)
+
+    def _finish(self, job, status, detail):
+        """Sets a job's final status once; cancel() and the job's own task may both try."""
+        with self.lock:
+            if job.status in (DONE, FAILED):
+                return
+            job.status = status
+            job.detail = detail
+        if self.on_update:
+            self.on_update(job)
+
+    async def _run(self, job):
+        try:
+            async with self.slots:
+                job.started = time.perf_counter()
+                with trace.run("guide", guide=job.name) as job.trace:
+                    await self._compile(job)
+            job.finished = time.perf_counter()
+            self._finish(job, DONE, f"{job.elapsed():.1f}s" + (", cached" if job.cached else "")
+                         + (f", {job.project_status}" if job.project_status else "")
+                         + (f", {job.duplicate_status}" if job.duplicate_status else ""))
+        except asyncio.CancelledError:
+            job.error = engine.Cancelled()
+            job.finished = time.perf_counter() if job.started else None
+            self._finish(job, FAILED, "Cancelled")
+            raise
+        except Exception as e:
+            job.error = e
+            job.finished = time.perf_counter()
+            self._finish(job, FAILED, str(e))
+        return job
+
+    def _pool(self, paths):
+        """The shared ingest pool, started on first use by a job that has PDFs or images to read."""
+        if (self.ingest_pool is None and not self.pool_closed and ingest.default_workers() > 1
+                and any(ingest.file_kind(p) in ("pdf", "image") for p in paths)):
+            try:
+                self.ingest_pool = ProcessPoolExecutor(max_workers=ingest.default_workers())
+            except (OSError, NotImplementedError):
+                self.pool_closed = True  # no multiprocessing here (sandbox, frozen app): read inline
+        return self.ingest_pool
+
+    async def _compile(self, job):
+        self._notify(job, READING)
+        sources = engine.SourceBundle(self.dedup)
+
+        def on_file(done, total, result):
+            self._notify(job, READING, f"{done}/{total} files")
+
+        results = await asyncio.to_thread(sources.add_files, job.paths, self.extraction_cache, self._pool(job.paths), on_file,
+                                          self.tile_images, self.ocr_language)
+        for result in results:
+            label = result["name"] + (" (cached)" if result.get("cached") else "")
+            job.file_timings.append((label, result["seconds"]))
+        if sources.is_empty():
+            raise RuntimeError("no readable content")
+        job.duplicate_status = sources.duplicate_summary()
+        if self.index is not None:
+            await asyncio.to_thread(self.index.add_sources, sources.segments)
+        client = gemini.get_async_client(self.api_url, self.api_key)
+
+        async def send(payload):
+            # estimated on the inline payload: File API parts count the same as the bytes they replace.
+            # Sizing images and PDFs decodes their base64, which would stall the loop
+            needed = await asyncio.to_thread(tokens.payload_tokens, payload)
+
+            async def attempt():
+                self._notify(job, WAITING, f"~{needed} tokens")
+                await self.limiter.acquire(needed)
+                job.attempts += 1
+                self._notify(job, COMPILING, f"attempt {job.attempts}")
+                sent = payload
+                if self.uploader is not None:
+                    # uploads share the request's rate limit and retries
+                    sent = await asyncio.to_thread(self.uploader.swap_inline, payload, is_retryable)
+                return await client.generate(sent, self.deadline)
+
+            return await call_with_retries(attempt, self.max_retries, on_retry)
+
+        def on_retry(n, delay, error):
+            self._notify(job, RETRYING, f"{error} - retry {n} in {delay:.1f}s")
+
+        def on_part(done, total):
+            if total > 1:
+                self._notify(job, COMPILING, f"part {done}/{total} done")
+
+        # cache hits skip the rate limiter entirely
+        # a project only sends the sources that changed since its last compile
+        proj = project.Project(job.project_path) if job.project_path else None
+        compile_func = proj.compile_async if proj else engine.compile_bundle_async
+        job.output_text, job.cached = await compile_func(
+            sources, self.api_url, self.api_key, job.instructions, cache=self.cache, send=send,
+            chunk_chars=self.chunk_chars, on_part=on_part,
+        )
+        job.project_status = proj.status_text() if proj else ""
+
+        self._notify(job, EXPORTING)
+        await asyncio.to_thread(self._export, job)
+
+    def _export(self, job):
+        # after wait() or cancel() the shared pool is shut down: render in this thread instead
+        pool = None if self.pool_closed else self.ingest_pool
+        job.outputs = export.export_guides([(job.output_text, job.out_path[:-len(".docx")])], job.formats, pool=pool)
+        written = [r["path"] for r in job.outputs if not r["error"]]
+        if self.index is not None and written:
+            out_path = os.path.abspath(job.out_path if job.out_path in written else written[0])
+            self.index.add_guide(out_path, job.name, job.output_text, out_path)
+        failed = export.failures_text(job.outputs)
+        if failed:
+            raise RuntimeError(f"export failed: {failed}")
@@ -0,0 +1,105 @@
+"""Optional local OCR (Tesseract via pytesseract) for scanned PDF pages and photos of text.
+
+Runs inside the ingest worker processes, so pages and images are recognized in
+parallel. Recognized text replaces the pixels only when Tesseract is confident:
+at least MIN_WORDS words with a mean word confidence of MIN_CONFIDENCE or more.
+Anything else (diagrams, poor scans, handwriting Tesseract cannot read) is sent
+to the model as an image or PDF, as without OCR; a scanned PDF page that cannot be
+read is sent as a page of the PDF even when the pages around it were read.
+
+Needs the pytesseract package and the tesseract program; without them, or with
+"OCR_ENABLED": false in config.json, nothing changes.
+"""
+try:
+    import pytesseract
+    PYTESSERACT_AVAILABLE = True
+except ImportError:
+    PYTESSERACT_AVAILABLE = False
+
+DEFAULT_LANGUAGE = "eng"  # Tesseract language codes, joined with "+" for several (e.g. "eng+deu")
+MIN_CONFIDENCE = 80  # mean word confidence (0-100) needed to use the text instead of the image
+MIN_WORDS = 20  # fewer words than this is a diagram or a photo, better seen by the model
+MIN_IMAGE_PIXELS = 300  # images in a PDF page smaller than this (logos, bullets) are not read
+TIMEOUT_SECONDS = 60  # per image; a page Tesseract cannot finish in time is sent as it is
+
+_tesseract_found = None
+
+
+def available():
+    """Whether pytesseract is installed and the tesseract program can be run (checked once)."""
+    global _tesseract_found
+    if _tesseract_found is None:
+        _tesseract_found = False
+        if PYTESSERACT_AVAILABLE:
+            try:
+                pytesseract.get_tesseract_version()
+                _tesseract_found = True
+            except Exception:
+                pass
+    return _tesseract_found
+
+
+def language_from_config(cfg):
+    """The OCR language from config.json, or None when OCR is off or Tesseract is missing."""
+    if not cfg.get("OCR_ENABLED", True) or not available():
+        return None
+    return cfg.get("OCR_LANGUAGE") or DEFAULT_LANGUAGE
+
+
+def assemble(data):
+    """(text, mean word confidence, word count) from pytesseract.image_to_data output.
+
+    Words are joined into Tesseract's lines, and paragraphs are separated by a blank line.
+    """
+    paragraphs = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        conf = float(data["conf"][i])
+        if not word or conf < 0:
+            continue
+        confidences.append(conf)
+        paragraph = paragraphs.setdefault((data["block_num"][i], data["par_num"][i]), {})
+        paragraph.setdefault(data["line_num"][i], []).append(word)
+    text = "\n\n".join("\n".join(" ".join(words) for words in lines.values()) for lines in paragraphs.values())
+    return text, (sum(confidences) / len(confidences) if confidences else 0.0), len(confidences)
+
+
+def recognize(img, language=DEFAULT_LANGUAGE):
+    """(text, mean word confidence, word count) of a PIL image."""
+    data = pytesseract.image_to_data(img, lang=language, output_type=pytesseract.Output.DICT,
+                                     timeout=TIMEOUT_SECONDS)
+    return assemble(data)
+
+
+def read_text(img, language=DEFAULT_LANGUAGE):
+    """The text in a PIL image if Tesseract reads it confidently, else None. Never raises."""
+    try:
+        text, confidence, words = recognize(img, language)
+    except Exception:
+        return None  # a timeout or a Tesseract error: the image is sent instead
+    return text if words >= MIN_WORDS and confidence >= MIN_CONFIDENCE else None
+
+
+def read_pdf_page(page, language=DEFAULT_LANGUAGE):
+    """Text of a scanned page (a pypdf page) read from the images on it; "" if it shows none.
+
+    None if the page shows an image that could not be read (or decoded), so the page is sent as it is.
+    """
+    texts = []
+    try:
+        images = list(page.images)
+    except Exception:
+        return None
+    for image in images:
+        try:
+            img = image.image
+        except Exception:
+            return None  # an image format pypdf cannot decode
+        if img is None or max(img.size) < MIN_IMAGE_PIXELS:
+            continue
+        text = read_text(img, language)
+        if not text:
+            return None
+        texts.append(text)
+    return "\n\n".join(texts)
@@ -0,0 +1,217 @@
+"""Project mode: recompile only the sources that changed.
+
+A project file (JSON) keeps a fingerprint of every source's content and the study
+guides the model made, one per group of sources that were sent together. On
+recompile, only new or changed sources are sent, packed into as few requests as
+the model's limits allow (the members of a stored group that lost or changed a
+source are sent again with them); the stored guides of the other groups are
+reused and everything is merged locally with chunking.merge_guides, so matching
+categories fold into the existing structure. Changing the model or the
+instructions invalidates every stored guide.
+"""
+import asyncio
+import hashlib
+import json
+import os
+
+from . import aio, cache, chunking, engine, tokens, trace
+
+PROJECT_VERSION = 2
+PROJECT_EXTENSION = ".noteproj"
+PLACEHOLDER_OUTPUT = "No content generated."  # stored by older versions for empty answers; never reused
+
+
+def source_key(seg):
+    return os.path.abspath(seg.path) if seg.path else seg.name
+
+
+def source_fingerprint(seg):
+    """Hash of what the model would see from this source."""
+    h = hashlib.sha256(f"{seg.kind}\0{seg.name}\0".encode("utf-8"))
+    if seg.kind == "image" and seg.images is not None:
+        for part in seg.images:
+            h.update(part["inline_data"]["data"].encode("ascii"))
+    elif seg.is_scan:
+        h.update(cache.file_digest(seg.path).encode("ascii"))
+    else:
+        h.update((seg.text or "").encode("utf-8", "surrogatepass"))
+        if seg.is_partial_scan:
+            h.update(cache.file_digest(seg.path).encode("ascii"))  # its unread pages are sent from the file
+    return h.hexdigest()
+
+
+def settings_fingerprint(api_url, user_instr, chunk_chars):
+    raw = json.dumps([api_url, user_instr, engine.SYSTEM_INSTRUCTION, chunk_chars])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_source(seg):
+    return (seg.has_text and (seg.text or "").strip()) or seg.is_media
+
+
+def batch_sources(items, api_url, chunk_chars):
+    """Packs [(key, fingerprint, segment)], in order, into batches that each fit one request.
+
+    Uses the request budget of tokens.plan_requests; a source larger than that is a batch
+    of its own (and is split into parts when it is compiled).
+    """
+    budget = tokens.request_budget(tokens.model_limits(api_url), chunk_chars // tokens.BYTES_PER_TOKEN)
+    batches = []
+    used = budget
+    for item in items:
+        cost = tokens.segment_tokens(item[2])
+        if batches and used + cost <= budget:
+            batches[-1].append(item)
+            used += cost
+        else:
+            batches.append([item])
+            used = cost
+    return batches
+
+
+def _usable(output):
+    return bool(output and output.strip() and output.strip() != PLACEHOLDER_OUTPUT)
+
+
+class Project:
+    """Per-source fingerprints and the organized output of each group of sources, stored in one JSON file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.settings = None
+        self.sources = {}  # source key -> {"name", "fingerprint"}
+        self.groups = []  # {"keys": [source keys sent together], "output": their guide}
+        self.paths = []  # input files in list order, so the project can be reopened
+        self.last_changed = 0
+        self.last_total = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") in (1, PROJECT_VERSION):
+                self.settings = data.get("settings")
+                self.sources = data.get("sources", {})
+                self.paths = data.get("paths", [])
+                if data["version"] == 1:
+                    # one guide per source, kept inside its entry
+                    self.groups = [{"keys": [key], "output": entry.pop("output", None)}
+                                   for key, entry in self.sources.items()]
+                else:
+                    self.groups = data.get("groups", [])
+                self.groups = [g for g in self.groups if _usable(g.get("output"))]
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": PROJECT_VERSION, "settings": self.settings, "paths": self.paths,
+                       "sources": self.sources, "groups": self.groups}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def plan(self, bundle, settings):
+        """Returns [(key, fingerprint, segment)] for every source and the subset that must be sent.
+
+        A source is sent when it is new or changed, or when a group it was sent with lost
+        or changed another member, since that group's stored guide can no longer be used.
+        """
+        entries = []
+        current = {}
+        for seg in bundle.segments:
+            if is_source(seg):
+                key, fp = source_key(seg), source_fingerprint(seg)
+                entries.append((key, fp, seg))
+                current[key] = fp
+        if settings != self.settings:
+            return entries, entries
+        valid = set()
+        for group in self.groups:
+            if all(key in current and self.sources.get(key, {}).get("fingerprint") == current[key]
+                   for key in group["keys"]):
+                valid.update(group["keys"])
+        return entries, [entry for entry in entries if entry[0] not in valid]
+
+    async def compile_async(self, bundle, api_url, api_key, user_instr="", cache=None, send=None,
+                            workers=engine.MAP_WORKERS, chunk_chars=engine.MAX_RAW_CHARS, on_part=None,
+                            uploader=None, deadline=None):
+        """Organizes the changed sources (as few requests as fit, `workers` at a time), then merges all stored guides.
+
+        Returns (guide_text, from_cache) like engine.compile_bundle_async, whose `send` and
+        `deadline` it takes. Guides of batches that finished are saved even if another batch
+        fails or the compile is cancelled, so a retry resumes where it stopped.
+        """
+        settings = settings_fingerprint(api_url, user_instr, chunk_chars)
+        entries, changed = self.plan(bundle, settings)
+        if not entries:
+            raise RuntimeError("no readable content")
+        self.last_changed, self.last_total = len(changed), len(entries)
+        if settings != self.settings:
+            self.sources = {}
+            self.groups = []
+            self.settings = settings
+        resent = {key for key, _, _ in changed}
+        self.groups = [g for g in self.groups if not resent.intersection(g["keys"])]
+        batches = batch_sources(changed, api_url, chunk_chars)
+        slots = asyncio.Semaphore(max(1, workers))
+        hits = []
+
+        async def run(batch):
+            async with slots:
+                text, hit = await engine.compile_bundle_async(
+                    bundle.subset([seg for _, _, seg in batch]), api_url, api_key, user_instr, cache=cache,
+                    send=send, chunk_chars=chunk_chars, uploader=uploader, deadline=deadline,
+                )
+            for key, fp, seg in batch:
+                self.sources[key] = {"name": seg.name, "fingerprint": fp}
+            self.groups.append({"keys": [key for key, _, _ in batch], "output": text})
+            hits.append(hit)
+            if on_part:
+                on_part(len(hits), len(batches))
+
+        keys = [key for key, _, _ in entries]
+        try:
+            # one failed batch does not stop the others; the first error is raised after saving
+            results = await asyncio.gather(*(run(batch) for batch in batches), return_exceptions=True)
+        finally:
+            present = set(keys)
+            self.groups = [g for g in self.groups if present.issuperset(g["keys"])]
+            self.sources = {key: self.sources[key] for key in keys if key in self.sources}
+            self.paths = [seg.path for seg in bundle.segments if seg.path]
+            await asyncio.shield(asyncio.to_thread(self.save))
+        error = next((r for r in results if isinstance(r, BaseException)), None)
+        if error is not None:
+            raise error
+        # merged in the order of each group's first source in the list
+        order = {key: n for n, key in enumerate(keys)}
+        groups = sorted(self.groups, key=lambda g: min(order[key] for key in g["keys"]))
+        texts = [g["output"] for g in groups]
+        with trace.span("merge", parts=len(texts)):
+            guide = await asyncio.to_thread(chunking.merge_guides, texts)
+        return guide, all(hits)
+
+    def compile(self, bundle, api_url, api_key, user_instr="", cache=None, send=None,
+                workers=engine.MAP_WORKERS, chunk_chars=engine.MAX_RAW_CHARS, on_part=None,
+                cancelled=None, uploader=None, deadline=None):
+        """Blocking compile_async, with a blocking `send` and a threading.Event `cancelled` (see engine.compile_bundle)."""
+        return aio.run(self.compile_async(
+            bundle, api_url, api_key, user_instr, cache=cache, send=aio.in_thread(send) if send else None,
+            workers=workers, chunk_chars=chunk_chars, on_part=on_part, uploader=uploader, deadline=deadline,
+        ), cancelled)
+
+    def estimate(self, bundle, api_url, user_instr="", chunk_chars=engine.MAX_RAW_CHARS,
+                 workers=engine.MAP_WORKERS, limits=None, count=None):
+        """Like engine.estimate_bundle, for only the sources the next compile would send."""
+        _, changed = self.plan(bundle, settings_fingerprint(api_url, user_instr, chunk_chars))
+        counts = []
+        downscale = False
+        for batch in batch_sources(changed, api_url, chunk_chars):
+            source_counts, plan = engine.request_tokens(bundle.subset([seg for _, _, seg in batch]), api_url,
+                                                        user_instr, chunk_chars, count)
+            counts += source_counts
+            downscale = downscale or plan.downscale
+        return tokens.estimate(counts, limits or tokens.model_limits(api_url), workers,
+                               exact=count is not None, downscale=downscale)
+
+    def status_text(self):
+        return f"{self.last_changed} of {self.last_total} sources recompiled"
@@ -0,0 +1,235 @@
+"""Full-text search over every loaded source and every generated guide.
+
+Sources are indexed per PDF page (or per run of paragraphs for text files, with
+the line it starts on), guides per H2/H3 section, in a SQLite FTS5 table under
+the cache folder. Ranking is BM25 with section titles weighted above body text.
+Documents are only re-indexed when their content changes.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from . import config
+
+PASSAGE_CHARS = 2000  # text files are indexed in runs of paragraphs about this long
+TITLE_WEIGHT = 5.0
+SNIPPET_TOKENS = 16
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+HEADING_RE = re.compile(r'^(#{2,3})\s+(.*?)\s*#*\s*$')
+
+
+def fts_query(text):
+    """Turns free text into a safe FTS5 query: every word must match, the last one as a prefix."""
+    words = TOKEN_RE.findall(text)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*']
+    return " ".join(terms)
+
+
+def _digest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update((part or "").encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def source_passages(text, pages=None):
+    """(title, body, page, line) pieces of one source: a PDF page each, or paragraph runs of a text file."""
+    if pages:
+        start = 0
+        for n, length in enumerate(pages, 1):
+            body = text[start:start + length]
+            start += length + 1  # pages are joined with "\n"
+            if body.strip():
+                yield f"Page {n}", body, n, None
+        return
+    lines = text.split("\n")
+    current, size, first = [], 0, 1
+    for i, line in enumerate(lines, 1):
+        if not current and not line.strip():
+            first = i + 1
+            continue
+        current.append(line)
+        size += len(line) + 1
+        if size >= PASSAGE_CHARS and not line.strip():
+            yield f"Line {first}", "\n".join(current), None, first
+            current, size, first = [], 0, i + 1
+    if "".join(current).strip():
+        yield f"Line {first}", "\n".join(current), None, first
+
+
+def guide_sections(text):
+    """(title, body) for each H2/H3 section of a guide; H3 titles are prefixed with their H2."""
+    sections = []
+    h2 = None
+    title = "Introduction"
+    body = []
+    in_code = False
+    for line in text.split("\n"):
+        if line.strip().startswith("```"):
+            in_code = not in_code
+        m = None if in_code else HEADING_RE.match(line)
+        if m:
+            if "".join(body).strip():
+                sections.append((title, "\n".join(body)))
+            if len(m.group(1)) == 2:
+                h2 = title = m.group(2)
+            else:
+                title = f"{h2} > {m.group(2)}" if h2 else m.group(2)
+            body = []
+        else:
+            body.append(line)
+    if "".join(body).strip():
+        sections.append((title, "\n".join(body)))
+    return sections
+
+
+class SearchIndex:
+    """SQLite FTS5 index of source passages and guide sections, safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc TEXT PRIMARY KEY, kind TEXT, name TEXT, path TEXT, fingerprint TEXT, indexed REAL)"
+        )
+        self.db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS entries USING fts5("
+            "title, body, doc UNINDEXED, page UNINDEXED, line UNINDEXED, "
+            "tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+        # FTS5 cannot index `doc`; this maps entry rowids to their document so a re-index is not a full scan
+        self.db.execute("CREATE TABLE IF NOT EXISTS passages (id INTEGER PRIMARY KEY, doc TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS passages_doc ON passages (doc)")
+        self.db.commit()
+
+    def _write(self, documents):
+        """Swaps the entries of each (doc, kind, name, path, fingerprint, rows) in one transaction.
+
+        Documents whose fingerprint is unchanged are skipped. Returns how many were written.
+        """
+        written = 0
+        try:
+            with self.lock:
+                for doc, kind, name, path, fingerprint, rows in documents:
+                    row = self.db.execute("SELECT fingerprint FROM documents WHERE doc = ?", (doc,)).fetchone()
+                    if row is not None and row[0] == fingerprint:
+                        continue
+                    self._delete(doc)
+                    for title, body, page, line in rows:
+                        rowid = self.db.execute("INSERT INTO passages (doc) VALUES (?)", (doc,)).lastrowid
+                        self.db.execute(
+                            "INSERT INTO entries (rowid, title, body, doc, page, line) VALUES (?, ?, ?, ?, ?, ?)",
+                            (rowid, title, body, doc, page, line),
+                        )
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO documents (doc, kind, name, path, fingerprint, indexed) VALUES (?, ?, ?, ?, ?, ?)",
+                        (doc, kind, name, path, fingerprint, time.time()),
+                    )
+                    written += 1
+                self.db.commit()
+        except sqlite3.Error as e:
+            # the index is a convenience: never fail a read or a compile over it
+            print(f"Search index error: {e}")
+            return 0
+        return written
+
+    def _delete(self, doc):
+        self.db.execute("DELETE FROM entries WHERE rowid IN (SELECT id FROM passages WHERE doc = ?)", (doc,))
+        self.db.execute("DELETE FROM passages WHERE doc = ?", (doc,))
+        self.db.execute("DELETE FROM documents WHERE doc = ?", (doc,))
+
+    def add_sources(self, segments):
+        """Indexes the text of loaded files (segments.Segment), duplicates included, so each file can be found.
+
+        Images and scans have no text to index.
+        """
+        documents = []
+        for seg in segments:
+            if not (seg.text or "").strip():
+                continue
+            path = os.path.abspath(seg.path) if seg.path else None
+            documents.append(("source:" + (path or seg.name), "source", seg.name, path,
+                              _digest(seg.text, str(seg.pages)), list(source_passages(seg.text, seg.pages))))
+        return self._write(documents)
+
+    def add_guide(self, doc, name, text, path=None):
+        """Indexes a generated guide under `doc` (e.g. its .docx path), replacing its previous version."""
+        rows = [(title, body, None, None) for title, body in guide_sections(text)]
+        return self._write([("guide:" + doc, "guide", name, path, _digest(text, path), rows)]) > 0
+
+    def remove(self, doc):
+        """Drops a guide indexed under `doc` (as given to add_guide)."""
+        with self.lock:
+            self._delete("guide:" + doc)
+            self.db.commit()
+
+    def search(self, query, limit=20, kind=None):
+        """Ranked matches: dicts with kind, name, path, title, page, line, snippet and score (lower is better)."""
+        match = fts_query(query)
+        if match is None:
+            return []
+        sql = (
+            "SELECT d.kind, d.name, d.path, e.title, e.page, e.line, "
+            f"snippet(entries, 1, '[', ']', '...', {SNIPPET_TOKENS}), bm25(entries, {TITLE_WEIGHT}, 1.0) AS score "
+            "FROM entries e JOIN documents d ON d.doc = e.doc WHERE entries MATCH ?"
+        )
+        args = [match]
+        if kind:
+            sql += " AND d.kind = ?"
+            args.append(kind)
+        sql += " ORDER BY score LIMIT ?"
+        args.append(limit)
+        with self.lock:
+            rows = self.db.execute(sql, args).fetchall()
+        keys = ("kind", "name", "path", "title", "page", "line", "snippet", "score")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def stats(self):
+        with self.lock:
+            return dict(self.db.execute("SELECT kind, COUNT(*) FROM documents GROUP BY kind").fetchall())
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM entries")
+            self.db.execute("DELETE FROM passages")
+            self.db.execute("DELETE FROM documents")
+            self.db.commit()
+            self.db.execute("VACUUM")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def location(hit):
+    """Where a hit points: "file.pdf, page 3", "notes.txt, line 120" or "Guide: Category > Topic"."""
+    if hit["kind"] == "guide":
+        return f"{hit['name']}: {hit['title']}"
+    if hit["page"]:
+        return f"{hit['name']}, page {hit['page']}"
+    if hit["line"]:
+        return f"{hit['name']}, line {hit['line']}"
+    return hit["name"]
+
+
+def open_index(cfg):
+    """Opens the search index from config.json settings. Returns None if disabled or unusable."""
+    if not cfg.get("SEARCH_INDEX", True):
+        return None
+    try:
+        return SearchIndex(os.path.join(config.get_cache_dir(cfg), "search.sqlite3"))
+    except Exception as e:
+        print(f"Search index disabled: {e}")
+        return None
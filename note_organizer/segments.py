@@ -0,0 +1,234 @@
+"""The loaded source material, kept as one record per file.
+
+Each Segment holds the text (or image payloads) of one file exactly once. The raw
+data block sent to the model is never accumulated; it is assembled in a single
+join when a request is built, so files can be removed or reordered cheaply and
+memory stays at about one copy of the corpus. A file that repeats another (see
+dedup.py) is kept in the list but not sent; an image read with OCR is sent as text,
+and the pages of a PDF that could not be read as text are sent as a PDF next to its text.
+"""
+import os
+
+from . import chunking, dedup, ingest, tokens
+
+SECTION_LABELS = {"text": "FILE", "pdf": "PDF", "image": "IMAGE"}
+
+
+class Segment:
+    """One loaded file. `offset`/`length` locate its section in the assembled raw data."""
+
+    __slots__ = ("name", "kind", "path", "text", "images", "phash", "shingles", "layouts", "duplicate_of", "pages",
+                 "unread_pages", "scan_part", "offset", "length")
+
+    def __init__(self, name, kind, path=None, text=None, images=None, phash=None, pages=None, shingles=None,
+                 unread_pages=None, layouts=None):
+        self.name = name
+        self.kind = kind  # text, pdf, image, other or error
+        self.path = path
+        self.text = text
+        self.images = images  # inline payloads: one per image, or one per tile; None if read with OCR
+        self.phash = phash  # 64-bit perceptual hash of an image
+        self.shingles = shingles  # sampled shingle hashes of the text (dedup.text_signature)
+        self.layouts = layouts  # images of text sent as images, unread PDF pages: imaging.layout bytes
+        self.duplicate_of = None  # the file this one repeats; duplicates are not sent
+        self.pages = pages  # PDFs: text length of each page, for linking search hits to pages
+        self.unread_pages = unread_pages  # PDFs: 0-based pages that gave no text (scanned pages OCR could not read)
+        self.scan_part = None  # scans: ((size, mtime) of the file, its inline payload), see media_parts
+        self.offset = 0
+        self.length = 0
+
+    @property
+    def has_text(self):
+        if self.duplicate_of is not None:
+            return False
+        if self.kind == "image":
+            return self.images is None  # read with OCR
+        return self.kind in SECTION_LABELS
+
+    @property
+    def header(self):
+        return f"--- {SECTION_LABELS[self.kind]}: {self.name} ---"
+
+    def section_length(self):
+        return chunking.section_size(self.header, self.text or "") if self.has_text else 0
+
+    @property
+    def is_scan(self):
+        # a PDF with no extractable text is sent to the model as the PDF itself
+        return self.kind == "pdf" and self.path is not None and not (self.text or "").strip()
+
+    @property
+    def is_partial_scan(self):
+        # a PDF with text on some pages and unread scanned pages: those pages are sent as a PDF
+        return (self.kind == "pdf" and self.path is not None and bool(self.unread_pages) and not self.is_scan
+                and self.duplicate_of is None)
+
+    @property
+    def is_media(self):
+        """Sent as inline media: images that are not duplicates or read with OCR, scans and unread scan pages."""
+        return ((self.kind == "image" and self.images is not None and self.duplicate_of is None) or self.is_scan
+                or self.is_partial_scan)
+
+    def media_parts(self, downscale=False):
+        """The inline parts of an image or scan.
+
+        A scan (or the unread pages of a partial one) is read from disk when the first request is
+        built and kept until the file changes; if the file is gone by then, the copy read earlier is sent.
+        """
+        if self.kind == "image":
+            if downscale:
+                return [ingest.shrink_image(part, tokens.IMAGE_TILE_PIXELS) for part in self.images]
+            return list(self.images)
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            stamp = None
+        if self.scan_part is None or (stamp is not None and stamp != self.scan_part[0]):
+            part = (ingest.encode_pdf_pages(self.path, self.unread_pages) if self.is_partial_scan
+                    else ingest.encode_pdf(self.path))
+            self.scan_part = (stamp, part)
+        return [self.scan_part[1]]
+
+    @property
+    def label(self):
+        if self.kind == "error":
+            return f"Error: {self.name}"
+        if self.duplicate_of is not None:
+            return f"{self.name} (duplicate of {self.duplicate_of.name}, not sent)"
+        if self.kind == "image" and self.images is None:
+            return f"{self.name} (text read locally)"
+        if self.kind == "image" and len(self.images) > 1:
+            return f"{self.name} ({len(self.images)} tiles)"
+        if self.is_partial_scan:
+            n = len(self.unread_pages)
+            return f"{self.name} ({n} unread page{'s' if n > 1 else ''} sent as PDF)"
+        return f"{self.name} (scanned, sent as PDF)" if self.is_scan else self.name
+
+
+class SourceBundle:
+    """The source material loaded for one study guide. With `find_duplicates` off, repeated files are all sent."""
+
+    def __init__(self, find_duplicates=True):
+        self.segments = []
+        self.text_length = 0  # length of the assembled raw data
+        self.find_duplicates = find_duplicates
+        self.index = dedup.DuplicateIndex()  # finds files that repeat earlier ones
+
+    # --- views ---
+
+    @property
+    def loaded_files_list(self):
+        return [s.label for s in self.segments]
+
+    @property
+    def image_payloads(self):
+        return [part for s in self.segments if s.kind == "image" and s.is_media for part in s.images]
+
+    def media_payloads(self):
+        """Images plus scanned PDFs, in order (see Segment.media_parts)."""
+        return [part for s in self.segments if s.is_media for part in s.media_parts()]
+
+    def media_count(self):
+        return sum(1 for s in self.segments if s.is_media)
+
+    def duplicates(self):
+        return [s for s in self.segments if s.duplicate_of is not None]
+
+    def duplicate_summary(self):
+        """E.g. "2 duplicate files not sent (~12,000 tokens)"; "" if there are none."""
+        dups = self.duplicates()
+        if not dups:
+            return ""
+        saved = sum(tokens.text_tokens(s.text) if s.text else tokens.segment_tokens(s) for s in dups)
+        return f"{len(dups)} duplicate file{'s' if len(dups) > 1 else ''} not sent (~{saved:,} tokens)"
+
+    def sections(self):
+        """(header, text) of every text/PDF file, in order."""
+        return [(s.header, s.text or "") for s in self.segments if s.has_text]
+
+    def raw_pieces(self):
+        """The raw data as a list of strings, to be joined once by whoever sends it."""
+        return chunking.render_sections(self.sections())
+
+    @property
+    def raw_text_content(self):
+        # builds a full copy; prefer raw_pieces() on hot paths
+        return "".join(self.raw_pieces())
+
+    def subset(self, segments):
+        """A new bundle holding `segments`. They are shared, so their offsets stay those of this bundle."""
+        bundle = SourceBundle(self.find_duplicates)
+        bundle.segments = list(segments)
+        bundle.text_length = sum(s.length for s in bundle.segments)
+        return bundle
+
+    def is_empty(self):
+        return not any(s.has_text or s.is_media for s in self.segments)
+
+    # --- editing ---
+
+    def clear(self):
+        self.segments = []
+        self.text_length = 0
+        self.index = dedup.DuplicateIndex()
+
+    def add_result(self, result, path=None):
+        """Adds one ingest.extract_file() result. Failed files are listed as "Error: <name>"."""
+        kind = result["kind"]
+        seg = Segment(result["name"], kind, path,
+                      text=result.get("text") if kind in SECTION_LABELS else None,
+                      images=result.get("images") if kind == "image" else None,
+                      phash=int(result["phash"], 16) if kind == "image" and result.get("phash") else None,
+                      pages=result.get("pages") if kind == "pdf" else None,
+                      unread_pages=result.get("unread_pages") if kind == "pdf" else None,
+                      layouts=[bytes.fromhex(h) for h in result["layouts"]] if kind in ("image", "pdf")
+                      and result.get("layouts") else None)
+        if seg.text and kind in SECTION_LABELS:
+            seg.shingles = result["shingles"] if "shingles" in result else dedup.text_signature(seg.text)
+        earlier = self.index.add(seg) if self.find_duplicates else []
+        seg.offset = self.text_length
+        seg.length = seg.section_length()
+        self.text_length += seg.length
+        self.segments.append(seg)
+        if earlier:
+            self._relayout()  # earlier files that turned out to be contained in this one drop out
+        return seg.label
+
+    def add_file(self, path):
+        return self.add_result(ingest.extract_file(path), path)
+
+    def add_files(self, paths, cache=None, pool=None, on_progress=None, tile=False, ocr_language=None):
+        """Reads many files in parallel (see ingest.ingest_files); returns the per-file results."""
+        results = ingest.ingest_files(paths, cache=cache, pool=pool, on_progress=on_progress, tile=tile,
+                                      ocr_language=ocr_language)
+        for path, result in zip(paths, results):
+            self.add_result(result, path)
+        return results
+
+    def remove(self, indices):
+        """Drops the segments at `indices` (positions in loaded_files_list)."""
+        drop = set(indices)
+        self.segments = [s for i, s in enumerate(self.segments) if i not in drop]
+        self._relayout()
+
+    def move(self, index, new_index):
+        new_index = max(0, min(new_index, len(self.segments) - 1))
+        self.segments.insert(new_index, self.segments.pop(index))
+        self._relayout()
+        return new_index
+
+    def _relayout(self):
+        # removing or reordering files can change which copy of a repeated file is the one sent
+        self.index = dedup.DuplicateIndex()
+        for seg in self.segments:
+            if self.find_duplicates:
+                self.index.add(seg)
+            else:
+                seg.duplicate_of = None
+        offset = 0
+        for seg in self.segments:
+            seg.length = seg.section_length()
+            seg.offset = offset
+            offset += seg.length
+        self.text_length = offset
@@ -0,0 +1,241 @@
+"""Rendering for the Tk text panes that stays responsive with very large content.
+
+MarkdownView inserts a guide a slice of lines at a time from `after` callbacks, so
+the window keeps repainting and scrolling while a multi-megabyte result loads. Each
+slice is one Text.insert call with the Markdown tags (headings, bold, italic,
+tables, code, lists) of its lines attached, read with document.py's patterns; the
+markup characters stay in the widget but are elided. Streamed text is appended the
+same way, line by line. FileListView shows one page of the loaded-files list, so
+thousands of files are never all in the widget.
+
+GUI only: imports tkinter, though MarkdownStream (the text and its slicing) and the
+line tagging do not need a display.
+"""
+import tkinter as tk
+
+from . import document
+
+LINES_PER_SLICE = 300
+SLICE_DELAY_MS = 1  # lets Tk handle input and redraw between slices
+FILES_PER_PAGE = 300
+
+# tags of document.INLINE_RE's groups: 2 code, 3 bold italic, 4-5 bold, 6-7 italic
+INLINE_TAGS = {2: ("code_span",), 3: ("bold", "italic"), 4: ("bold",), 5: ("bold",), 6: ("italic",), 7: ("italic",)}
+
+
+def inline_runs(text, tags=()):
+    """(text, tags) runs of `text` with **bold**, *italic* and `code` tagged as document.parse_inline reads them.
+
+    The markup characters are kept as runs tagged "marker".
+    """
+    runs = []
+    pos = 0
+    for m in document.INLINE_RE.finditer(text):
+        group = next(i for i in INLINE_TAGS if m.group(i) is not None)
+        start, end = m.span(group)
+        runs += [(text[pos:m.start()], tags), (text[m.start():start], ("marker",))]
+        if group == 2:
+            runs.append((m.group(group), tags + INLINE_TAGS[group]))
+        else:
+            runs += inline_runs(m.group(group), tags + INLINE_TAGS[group])
+        runs.append((text[end:m.end()], ("marker",)))
+        pos = m.end()
+    runs.append((text[pos:], tags))
+    return runs
+
+
+def line_runs(line, in_code=False):
+    """(text, tags) runs of one Markdown line, and whether the next line is inside a code block.
+
+    Lines are classified with document.py's patterns, so the pane and the exports agree.
+    """
+    if document.FENCE_RE.match(line):
+        return [(line, ("marker",))], not in_code
+    if in_code:
+        return [(line, ("code",))], True
+    m = document.HEADING_RE.match(line)
+    if m:
+        start, end = m.span(2)
+        heading = (f"h{min(len(m.group(1)), 3)}",)
+        return [(line[:start], ("marker",))] + inline_runs(m.group(2), heading) + [(line[end:], ("marker",))], False
+    if document.TABLE_ROW_RE.match(line):
+        return [(line, ("table",))], False
+    return inline_runs(line, ("bullet",) if document.LIST_RE.match(line) else ()), False
+
+
+def insert_args(runs):
+    """Text.insert arguments (text, tags, text, tags, ...) for runs, without empty ones."""
+    return [x for text, tags in runs if text for x in (text, tags)]
+
+
+class MarkdownStream:
+    """The Tk-free half of MarkdownView: appended text, split into complete lines rendered a slice at a time.
+
+    A code block and the unfinished last line carry over between appends and slices, so text gets the
+    same tags however it is split.
+    """
+
+    def __init__(self, lines_per_slice=LINES_PER_SLICE):
+        self.lines_per_slice = lines_per_slice
+        self.clear()
+
+    def clear(self):
+        self.pieces = []  # the source text
+        self.pending = []  # complete lines, rendered up to self.rendered
+        self.rendered = 0
+        self.partial = ""  # the unfinished last line
+        self.in_code = False
+
+    def get_text(self):
+        return "".join(self.pieces)
+
+    def append(self, text):
+        """Queues the complete lines of `text`; the rest waits for more. False when there is nothing to add."""
+        if not text:
+            return False
+        self.pieces.append(text)
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        self.pending.extend(lines)
+        return True
+
+    def next_slice(self):
+        """(insert args of the next complete lines, insert args of the unfinished line, whether more lines wait).
+
+        The unfinished line comes with the last slice only; it is redrawn after every slice.
+        """
+        batch = self.pending[self.rendered:self.rendered + self.lines_per_slice]
+        self.rendered += len(batch)
+        more = self.rendered < len(self.pending)
+        if not more:
+            self.pending, self.rendered = [], 0
+        args = []
+        for line in batch:
+            runs, self.in_code = line_runs(line, self.in_code)
+            args += insert_args(runs) + ["\n", ()]
+        partial = insert_args(line_runs(self.partial, self.in_code)[0]) if self.partial and not more else []
+        return args, partial, more
+
+
+class MarkdownView:
+    """Shows Markdown in a read-only Text widget, rendered incrementally."""
+
+    def __init__(self, widget, family="Helvetica", size=10):
+        self.widget = widget
+        self.stream = MarkdownStream()  # the widget holds its text with markup elided
+        self.job = None
+        widget.tag_config("bold", font=(family, size, "bold"))
+        widget.tag_config("italic", font=(family, size, "italic"))
+        widget.tag_config("code_span", font=("Consolas", size - 1))
+        widget.tag_config("h1", font=(family, size + 6, "bold"), spacing1=10, spacing3=4)
+        widget.tag_config("h2", font=(family, size + 4, "bold"), spacing1=8, spacing3=3)
+        widget.tag_config("h3", font=(family, size + 2, "bold"), spacing1=6, spacing3=2)
+        widget.tag_config("bullet", lmargin1=12, lmargin2=24)
+        widget.tag_config("table", font=("Consolas", size - 1))
+        widget.tag_config("code", font=("Consolas", size - 1), lmargin1=12, lmargin2=12)
+        widget.tag_config("marker", elide=True)
+        widget.mark_set("partial", "end-1c")
+        widget.mark_gravity("partial", tk.LEFT)
+
+    def get_text(self):
+        return self.stream.get_text()
+
+    def set_text(self, text):
+        self.clear()
+        self.append(text)
+
+    def clear(self):
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+        self.stream.clear()
+        self.widget.config(state=tk.NORMAL)
+        self.widget.delete("1.0", tk.END)
+        self.widget.mark_set("partial", "1.0")
+        self.widget.mark_gravity("partial", tk.LEFT)
+        self.widget.config(state=tk.DISABLED)
+
+    def append(self, text):
+        """Adds text at the end; complete lines are queued for rendering, the rest waits for more."""
+        if self.stream.append(text) and self.job is None:
+            self.job = self.widget.after(0, self._render)
+
+    def _render(self):
+        self.job = None
+        args, partial, more = self.stream.next_slice()
+        w = self.widget
+        w.config(state=tk.NORMAL)
+        w.delete("partial", tk.END)  # the unfinished line is redrawn after the new complete ones
+        if args:
+            w.insert(tk.END, *args)
+        w.mark_set("partial", "end-1c")
+        if partial:
+            w.insert(tk.END, *partial)
+        w.config(state=tk.DISABLED)
+        if more:
+            self.job = w.after(SLICE_DELAY_MS, self._render)
+
+
+class FileListView:
+    """One page of the loaded-files list in a Text widget. Clicking the "more" lines turns the page."""
+
+    def __init__(self, widget, per_page=FILES_PER_PAGE, empty_text="No files loaded."):
+        self.widget = widget
+        self.per_page = per_page
+        self.empty_text = empty_text
+        self.labels = []
+        self.start = 0  # index of the first file on the page
+
+    def show(self, labels, selected=None):
+        """Redraws the page, moving it to the selected file if that is off the page."""
+        self.labels = labels
+        if selected is not None and not self.start <= selected < self.start + self.per_page:
+            self.start = selected - selected % self.per_page
+        self.start = max(0, min(self.start, len(labels) - 1)) // self.per_page * self.per_page if labels else 0
+        lines = []
+        if self.start:
+            lines.append(f"▲ {self.start} more files")
+        lines += labels[self.start:self.start + self.per_page]
+        below = len(labels) - self.start - self.per_page
+        if below > 0:
+            lines.append(f"▼ {below} more files")
+        w = self.widget
+        w.config(state=tk.NORMAL)
+        w.delete("1.0", tk.END)
+        w.insert(tk.END, "\n".join(lines) if labels else self.empty_text)
+        if self.start:
+            w.tag_add("more", "1.0", "1.end")
+        if below > 0:
+            w.tag_add("more", "end-1c linestart", "end-1c")
+        w.config(state=tk.DISABLED)
+        self.highlight(selected)
+
+    def _first_line(self):
+        return 2 if self.start else 1
+
+    def file_at(self, line):
+        """The file index shown on `line` (1-based), or None. Clicking a "more" line turns the page."""
+        if not self.labels:
+            return None
+        if self.start and line == 1:
+            self.turn(-1)
+            return None
+        index = self.start + line - self._first_line()
+        end = min(len(self.labels), self.start + self.per_page)
+        if index == end and end < len(self.labels):
+            self.turn(1)
+            return None
+        return index if self.start <= index < end else None
+
+    def turn(self, step):
+        self.start += step * self.per_page
+        self.show(self.labels)
+
+    def highlight(self, selected):
+        w = self.widget
+        w.tag_remove("selected", "1.0", tk.END)
+        if selected is None or not self.start <= selected < self.start + self.per_page:
+            return
+        line = selected - self.start + self._first_line()
+        w.tag_add("selected", f"{line}.0", f"{line}.end")
+        w.see(f"{line}.0")
@@ -0,0 +1,312 @@
+"""Token accounting: what a compile will send, cost and take, before anything is sent.
+
+Text is estimated at about four UTF-8 bytes per token, images by Gemini's tiling
+rule (258 tokens per 768 px tile, a single tile for images up to 384 px) and PDFs
+at 258 tokens per page. With TOKEN_COUNTING set to "api" in config.json the input
+of every request is counted exactly by the countTokens endpoint instead, and the
+counts are cached next to the responses. plan_requests() packs each request under
+the model's input and output limits with the same numbers, shrinking images to one
+tile when that saves a request.
+"""
+import base64
+import io
+import math
+import os
+import re
+
+from . import chunking, ingest
+from .cache import model_from_url
+
+if ingest.PIL_AVAILABLE:
+    from PIL import Image
+
+IMAGE_TILE_TOKENS = 258
+IMAGE_TILE_PIXELS = 768
+SMALL_IMAGE_PIXELS = 384  # images this small in both dimensions are a single tile
+PDF_PAGE_TOKENS = 258
+BYTES_PER_TOKEN = chunking.CHARS_PER_TOKEN
+PDF_BYTES_PER_PAGE = 100 * 1024  # page count guess for PDFs whose pages cannot be counted
+HEADER_SNIFF_CHARS = 64 * 1024  # base64 chars decoded to read an image's size
+
+OUTPUT_RATIO = 0.25  # a guide is about a quarter of the length of its raw notes
+MIN_OUTPUT_TOKENS = 1000
+INPUT_MARGIN = 0.9  # headroom under the input limit for estimation error
+REQUEST_OVERHEAD_SECONDS = 2.0
+PREFILL_TOKENS_PER_SECOND = 10_000
+
+PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+class ModelLimits:
+    """Token limits, list prices (USD per million tokens) and output speed of one model."""
+
+    def __init__(self, input_tokens, output_tokens, input_price, output_price, tokens_per_second):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.input_price = input_price
+        self.output_price = output_price
+        self.tokens_per_second = tokens_per_second
+
+
+# longest matching name prefix wins; prices are for prompts under 200k tokens
+MODELS = {
+    "gemini-2.5-pro": ModelLimits(1_048_576, 65_536, 1.25, 10.00, 80),
+    "gemini-2.5-flash-lite": ModelLimits(1_048_576, 65_536, 0.10, 0.40, 300),
+    "gemini-2.5-flash": ModelLimits(1_048_576, 65_536, 0.30, 2.50, 200),
+    "gemini-2.0-flash-lite": ModelLimits(1_048_576, 8_192, 0.075, 0.30, 250),
+    "gemini-2.0-flash": ModelLimits(1_048_576, 8_192, 0.10, 0.40, 200),
+    "gemini-1.5-pro": ModelLimits(2_097_152, 8_192, 1.25, 5.00, 60),
+    "gemini-1.5-flash": ModelLimits(1_048_576, 8_192, 0.075, 0.30, 200),
+}
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+
+def model_limits(model=None):
+    """Limits of `model` (a name or a generateContent URL); unknown models get gemini-2.0-flash's."""
+    name = model_from_url(model) if model and "/" in model else (model or DEFAULT_MODEL)
+    matches = [prefix for prefix in MODELS if name.startswith(prefix)]
+    return MODELS[max(matches, key=len)] if matches else MODELS[DEFAULT_MODEL]
+
+
+def limits_from_config(cfg, model=None):
+    """model_limits() with the PRICE_INPUT_PER_M / PRICE_OUTPUT_PER_M overrides from config.json."""
+    base = model_limits(model)
+    try:
+        input_price = float(cfg.get("PRICE_INPUT_PER_M", base.input_price))
+        output_price = float(cfg.get("PRICE_OUTPUT_PER_M", base.output_price))
+    except (TypeError, ValueError):
+        return base
+    return ModelLimits(base.input_tokens, base.output_tokens, input_price, output_price, base.tokens_per_second)
+
+
+def request_budget(limits, chunk_tokens):
+    """Most input tokens one request may carry: the configured chunk size, kept under the
+    input limit and small enough that the guide it produces fits in the output limit."""
+    return max(1000, min(chunk_tokens, int(limits.input_tokens * INPUT_MARGIN), int(limits.output_tokens / OUTPUT_RATIO)))
+
+
+# --- LOCAL ESTIMATES ---
+
+def text_tokens(text):
+    # isascii() is a flag check, so plain-English notes are never encoded just to be measured
+    size = len(text) if text.isascii() else len(text.encode("utf-8", "surrogatepass"))
+    return -(-size // BYTES_PER_TOKEN)
+
+
+def image_tokens(width, height):
+    if width <= SMALL_IMAGE_PIXELS and height <= SMALL_IMAGE_PIXELS:
+        return IMAGE_TILE_TOKENS
+    return math.ceil(width / IMAGE_TILE_PIXELS) * math.ceil(height / IMAGE_TILE_PIXELS) * IMAGE_TILE_TOKENS
+
+
+def image_size(data):
+    """(width, height) of a base64 image, read from its header only. None if unknown."""
+    if not ingest.PIL_AVAILABLE:
+        return None
+    for chunk in (data[:HEADER_SNIFF_CHARS], data):
+        try:
+            with Image.open(io.BytesIO(base64.b64decode(chunk[:len(chunk) // 4 * 4]))) as img:
+                return img.size
+        except Exception:
+            continue
+    return None
+
+
+def max_image_tokens():
+    # what an image (or tile) from ingest.prepare_image costs at most
+    return image_tokens(ingest.MAX_IMAGE_PIXELS, ingest.MAX_IMAGE_PIXELS)
+
+
+def pdf_pages(data):
+    """Page count of a base64 PDF, from its page objects (a size-based guess if they are compressed)."""
+    raw = base64.b64decode(data)
+    return len(PDF_PAGE_RE.findall(raw)) or max(1, len(raw) // PDF_BYTES_PER_PAGE)
+
+
+def part_tokens(part):
+    """Tokens of one request part; None for file_data parts, whose content is not at hand."""
+    if "text" in part:
+        return text_tokens(part["text"])
+    inline = part.get("inline_data")
+    if inline is None:
+        return None
+    if inline.get("mime_type") == "application/pdf":
+        return pdf_pages(inline["data"]) * PDF_PAGE_TOKENS
+    size = image_size(inline["data"])
+    return image_tokens(*size) if size else max_image_tokens()
+
+
+def payload_tokens(payload, known=None):
+    """Estimated input tokens of a request. `known` maps file URIs to the tokens of what was uploaded."""
+    total = 0
+    for content in payload.get("contents", []) + [payload.get("systemInstruction", {})]:
+        for part in content.get("parts", []):
+            tokens = part_tokens(part)
+            if tokens is None:
+                file_data = part.get("file_data", {})
+                tokens = (known or {}).get(file_data.get("file_uri")) or max_image_tokens()
+            total += tokens
+    return total
+
+
+def media_tokens(seg, downscale=False):
+    """Tokens of what one loaded file sends as media: images, a scan, or a PDF's unread pages."""
+    if seg.kind == "image" and seg.images is not None:
+        if downscale:
+            return IMAGE_TILE_TOKENS * len(seg.images)
+        return sum(part_tokens(part) for part in seg.images)
+    if seg.is_scan:
+        if seg.pages:
+            return len(seg.pages) * PDF_PAGE_TOKENS
+        try:
+            return max(1, os.path.getsize(seg.path) // PDF_BYTES_PER_PAGE) * PDF_PAGE_TOKENS
+        except OSError:
+            return PDF_PAGE_TOKENS
+    if seg.is_partial_scan:
+        return len(seg.unread_pages) * PDF_PAGE_TOKENS
+    return 0
+
+
+def segment_tokens(seg, downscale=False):
+    """Tokens one loaded file adds to a request (see segments.Segment): its media and its text."""
+    tokens = media_tokens(seg, downscale)
+    if seg.has_text and not seg.is_scan:
+        tokens += text_tokens(seg.header) + text_tokens(seg.text or "") + 1
+    return tokens
+
+
+# --- REQUEST PLANNING ---
+
+class RequestPlan:
+    """How a bundle is sent: per request, its text sections, media segments and estimated tokens."""
+
+    def __init__(self, limits, budget):
+        self.limits = limits
+        self.budget = budget
+        self.requests = []  # (sections, media segments, tokens)
+        self.downscale = False  # images are shrunk to one tile each
+
+    @property
+    def input_tokens(self):
+        return sum(tokens for _, _, tokens in self.requests)
+
+
+def _pack_media(room, media, budget, max_items):
+    """First-fit of (segment, tokens) into requests with `room` tokens left; overflow opens new requests."""
+    groups = [[] for _ in room]
+    room = list(room)
+    for seg, tokens in media:
+        target = next((i for i, left in enumerate(room)
+                       if left >= tokens and (max_items is None or len(groups[i]) < max_items)), None)
+        if target is None:
+            groups.append([])
+            room.append(budget)
+            target = len(groups) - 1
+        groups[target].append((seg, tokens))
+        room[target] -= tokens
+    return groups
+
+
+def plan_requests(bundle, chunk_chars=chunking.DEFAULT_CHUNK_TOKENS * chunking.CHARS_PER_TOKEN, model=None):
+    """Splits `bundle` into requests that each fit `model`'s limits and the chunk size.
+
+    Raises ValueError when a single file is too large for any request.
+    """
+    limits = model_limits(model)
+    budget = request_budget(limits, chunk_chars // BYTES_PER_TOKEN)
+    sections = bundle.sections()
+    # packed by tokens, so text in scripts with multi-byte characters does not overshoot
+    sizes = [text_tokens(h) + text_tokens(b) + 1 for h, b in sections]
+    chunks = chunking.make_chunks(sections, budget, sizes)
+    known = {id(b): size for (_, b), size in zip(sections, sizes)}  # parts of split files are new strings
+    chunk_tokens = [sum(known.get(id(b)) or text_tokens(h) + text_tokens(b) + 1 for h, b in chunk) for chunk in chunks]
+
+    media_segs = [seg for seg in bundle.segments if seg.is_media]
+    media = [(seg, media_tokens(seg)) for seg in media_segs]
+    for seg, cost in media:
+        if cost > limits.input_tokens * INPUT_MARGIN:
+            raise ValueError(f"{seg.name} is about {cost:,} tokens, more than one request to this model can hold "
+                             f"({limits.input_tokens:,}). Split the file and add the parts instead.")
+    max_items = chunking.IMAGES_PER_CHUNK if len(chunks) > 1 else None
+    room = [budget - t for t in chunk_tokens]
+    groups = _pack_media(room, media, budget, max_items)
+
+    plan = RequestPlan(limits, budget)
+    if ingest.PIL_AVAILABLE and any(seg.kind == "image" and cost > IMAGE_TILE_TOKENS * len(seg.images)
+                                    for seg, cost in media):
+        small = [(seg, media_tokens(seg, downscale=True)) for seg in media_segs]
+        small_groups = _pack_media(room, small, budget, max_items)
+        if len(small_groups) < len(groups):
+            groups, plan.downscale = small_groups, True
+
+    chunks += [[]] * (len(groups) - len(chunks))
+    chunk_tokens += [0] * (len(groups) - len(chunk_tokens))
+    for sections, group, text in zip(chunks, groups, chunk_tokens):
+        plan.requests.append((sections, [seg for seg, _ in group], text + sum(cost for _, cost in group)))
+    return plan
+
+
+# --- ESTIMATES ---
+
+class Estimate:
+    """Pre-flight numbers for one compile."""
+
+    def __init__(self, requests, input_tokens, output_tokens, cost, seconds, exact=False, downscale=False):
+        self.requests = requests
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cost = cost
+        self.seconds = seconds
+        self.exact = exact  # input counted by the countTokens endpoint
+        self.downscale = downscale
+
+    def summary(self):
+        approx = "" if self.exact else "~"
+        cost = f"${self.cost:.2f}" if self.cost >= 0.01 else "<$0.01"
+        text = (f"{approx}{self.input_tokens:,} tokens in {self.requests} request{'s' if self.requests != 1 else ''}, "
+                f"est. {cost}, ~{format_seconds(self.seconds)}")
+        return text + (", images shrunk to fit" if self.downscale else "")
+
+
+def format_seconds(seconds):
+    return f"{seconds:.0f}s" if seconds < 90 else f"{seconds / 60:.0f} min"
+
+
+def output_tokens(limits, input_tokens):
+    return min(limits.output_tokens, max(MIN_OUTPUT_TOKENS, int(input_tokens * OUTPUT_RATIO)))
+
+
+def request_seconds(limits, input_tokens, out_tokens):
+    return REQUEST_OVERHEAD_SECONDS + input_tokens / PREFILL_TOKENS_PER_SECOND + out_tokens / limits.tokens_per_second
+
+
+def estimate(request_tokens, limits, workers=1, exact=False, downscale=False):
+    """Cost and wall time of sending requests of `request_tokens` input tokens, `workers` at a time."""
+    outputs = [output_tokens(limits, t) for t in request_tokens]
+    times = sorted((request_seconds(limits, t, o) for t, o in zip(request_tokens, outputs)), reverse=True)
+    workers = max(1, workers)
+    # requests go out in waves of `workers`; each wave lasts as long as its slowest request
+    seconds = sum(times[i] for i in range(0, len(times), workers))
+    total_in, total_out = sum(request_tokens), sum(outputs)
+    cost = (total_in * limits.input_price + total_out * limits.output_price) / 1_000_000
+    return Estimate(len(request_tokens), total_in, total_out, cost, seconds, exact, downscale)
+
+
+def open_counter(cfg, client, cache=None):
+    """count(payload) for engine.estimate_bundle when TOKEN_COUNTING is "api"; None means estimate locally."""
+    if str(cfg.get("TOKEN_COUNTING", "local")).lower() != "api":
+        return None
+    return lambda payload: count_tokens(client, payload, cache)
+
+
+def count_tokens(client, payload, cache=None):
+    """Exact input tokens of a request from the countTokens endpoint, cached by request content."""
+    key = cache.key_for(client.api_url, payload) if cache is not None else None
+    if key is not None:
+        tokens = cache.get_count(key)
+        if tokens is not None:
+            return tokens
+    tokens = client.count_tokens(payload)
+    if key is not None:
+        cache.put_count(key, tokens)
+    return tokens
@@ -0,0 +1,308 @@
+"""Timing spans for each run (loading files, a compile, one batch guide), and their reports.
+
+Code wraps a stage in `with trace.span("request") as s:` and adds sizes with
+`s.set(bytes_sent=...)`. Spans go to the Trace of the run that is current in the
+calling context (a contextvars.ContextVar), so asyncio tasks and asyncio.to_thread
+workers started inside a run report into it without a tracer being passed around.
+Work done in the ingest process pool is timed there and recorded here from its
+results with record(). Outside a run, span() does nothing.
+
+Finished runs are kept for the GUI's Run Details window, written as JSON lines to
+the runs folder next to the caches (RUN_LOG, RUN_LOG_KEEP in config.json), and
+added to process-wide totals that can be written in the Prometheus or OpenMetrics
+text format (METRICS_FILE, METRICS_FORMAT).
+
+No tkinter here; the batch mode uses it too.
+"""
+import asyncio
+import collections
+import contextlib
+import contextvars
+import datetime
+import json
+import os
+import threading
+import time
+
+from . import config
+
+RUN_LOG_KEEP = 100  # run log files kept; the oldest are deleted
+RECENT_RUNS = 20  # finished runs kept in memory for the Run Details window
+SLOWEST_SPANS = 15
+
+# span attributes that are summed per stage in reports and metrics
+COUNTED = ("bytes", "bytes_sent", "bytes_received", "input_tokens", "output_tokens", "pages")
+
+_current = contextvars.ContextVar("trace", default=None)
+_lock = threading.Lock()
+_write_lock = threading.Lock()  # run logs and the metrics file are written from several threads
+_recent = collections.deque(maxlen=RECENT_RUNS)
+_totals = {}  # stage -> {"count", "seconds", "errors", <COUNTED>...}, over every run of this process
+_runs = collections.Counter()  # (run name, "ok" or "error") -> runs finished
+_settings = {"log_dir": None, "keep": RUN_LOG_KEEP, "metrics_file": None, "openmetrics": False}
+
+
+class Span:
+    """One timed stage. `start` is seconds since the start of its run."""
+
+    __slots__ = ("name", "start", "seconds", "attrs")
+
+    def __init__(self, name, start, seconds=None, attrs=None):
+        self.name = name
+        self.start = start
+        self.seconds = seconds
+        self.attrs = attrs or {}
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class _NoSpan:
+    """What span() yields outside a run: accepts and drops everything."""
+
+    def set(self, **attrs):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """The spans of one run."""
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.seconds = None
+        self.error = None
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def now(self):
+        return time.perf_counter() - self.t0
+
+    # --- reports ---
+
+    def stages(self):
+        """Per stage, in order of first appearance: {"name", "count", "seconds", "max", "errors", <COUNTED>...}."""
+        rows = {}
+        with self.lock:
+            spans = list(self.spans)
+        for s in spans:
+            row = rows.setdefault(s.name, {"name": s.name, "count": 0, "seconds": 0.0, "max": 0.0, "errors": 0})
+            row["count"] += 1
+            row["seconds"] += s.seconds
+            row["max"] = max(row["max"], s.seconds)
+            row["errors"] += "error" in s.attrs
+            for key in COUNTED:
+                if key in s.attrs:
+                    row[key] = row.get(key, 0) + s.attrs[key]
+        return list(rows.values())
+
+    def title(self):
+        label = " ".join([self.name] + [str(v) for v in self.attrs.values()])
+        state = "running" if self.seconds is None else f"{self.seconds:.2f}s"
+        when = datetime.datetime.fromtimestamp(self.started_at).strftime("%H:%M:%S")
+        return f"{when}  {label}  ({state}{', failed: ' + self.error if self.error else ''})"
+
+    def report(self):
+        """The run as plain text: stage totals, then the slowest spans."""
+        stages = self.stages()
+        lines = [self.title(), ""]
+        sent = sum(r.get("input_tokens", 0) for r in stages)
+        received = sum(r.get("output_tokens", 0) for r in stages)
+        if sent or received:
+            lines += [f"Tokens: {sent:,} in, {received:,} out", ""]
+        lines.append(f"{'stage':<20}{'count':>7}{'total s':>10}{'max s':>9}{'MB':>9}{'tokens':>10}  errors")
+        for r in stages:
+            mb = (r.get("bytes", 0) + r.get("bytes_sent", 0) + r.get("bytes_received", 0)) / 1e6
+            tokens = r.get("input_tokens", 0) + r.get("output_tokens", 0)
+            lines.append(f"{r['name']:<20}{r['count']:>7}{r['seconds']:>10.2f}{r['max']:>9.2f}"
+                         f"{mb:>9.2f}{tokens:>10,}  {r['errors'] or ''}")
+        # stages overlap (parallel files and requests), so totals can exceed the run time
+        with self.lock:
+            slowest = sorted(self.spans, key=lambda s: -s.seconds)[:SLOWEST_SPANS]
+        if slowest:
+            lines += ["", "Slowest:"]
+            for s in slowest:
+                extra = ", ".join(f"{k}={v}" for k, v in s.attrs.items())
+                lines.append(f"  {s.seconds:8.2f}s  at {s.start:7.2f}s  {s.name}  {extra}")
+        return "\n".join(lines)
+
+    def jsonl(self):
+        """The run as JSON lines: one "run" record, then one per span in start order."""
+        head = {"type": "run", "name": self.name, "started": datetime.datetime.fromtimestamp(self.started_at).isoformat(),
+                "seconds": self.seconds, "error": self.error, **self.attrs}
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        records = [head] + [{"type": "span", "name": s.name, "start": round(s.start, 4),
+                             "seconds": round(s.seconds, 4), **s.attrs} for s in spans]
+        return "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+
+
+# --- RECORDING ---
+
+def current():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def run(name, **attrs):
+    """Makes a new Trace current for the `with` body (and the tasks and threads it starts)."""
+    trace = Trace(name, **attrs)
+    token = _current.set(trace)
+    with _lock:
+        _recent.append(trace)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.error = type(e).__name__ if not str(e) else f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        trace.seconds = trace.now()
+        _current.reset(token)
+        _finish(trace)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Times the `with` body as a stage of the current run. Yields the Span, for adding attributes."""
+    trace = _current.get()
+    if trace is None:
+        yield _NO_SPAN
+        return
+    s = Span(name, trace.now(), attrs=attrs)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = type(e).__name__
+        status = getattr(e, "status_code", None)
+        if status is not None:
+            s.attrs["status"] = status
+        raise
+    finally:
+        s.seconds = trace.now() - s.start
+        trace.add(s)
+
+
+def record(name, seconds, **attrs):
+    """Adds a stage that was timed elsewhere (e.g. in a worker process) and ended just now."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(Span(name, max(0.0, trace.now() - seconds), seconds, attrs))
+
+
+def recent():
+    """Finished and running runs of this process, newest last."""
+    with _lock:
+        return list(_recent)
+
+
+# --- OUTPUT ---
+
+def configure(cfg):
+    """Reads RUN_LOG, RUN_LOG_KEEP, METRICS_FILE and METRICS_FORMAT from config.json."""
+    _settings["log_dir"] = os.path.join(config.get_cache_dir(cfg), "runs") if cfg.get("RUN_LOG", True) else None
+    _settings["keep"] = config.get_int(cfg, "RUN_LOG_KEEP", RUN_LOG_KEEP)
+    set_metrics_file(cfg.get("METRICS_FILE"), cfg.get("METRICS_FORMAT", "prometheus") == "openmetrics")
+
+
+def set_metrics_file(path, openmetrics=False):
+    _settings["metrics_file"] = os.path.expanduser(path) if path else None
+    _settings["openmetrics"] = openmetrics
+
+
+def _finish(trace):
+    with _lock:
+        _runs[(trace.name, "error" if trace.error else "ok")] += 1
+        for row in trace.stages():
+            total = _totals.setdefault(row["name"], {"count": 0, "seconds": 0.0, "errors": 0})
+            for key, value in row.items():
+                if key not in ("name", "max"):
+                    total[key] = total.get(key, 0) + value
+    if not (_settings["log_dir"] or _settings["metrics_file"]):
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _write_outputs(trace)
+    else:
+        # a run that ends on the event loop must not stall the other jobs on disk writes
+        loop.run_in_executor(None, _write_outputs, trace)
+
+
+def _write_outputs(trace):
+    try:
+        with _write_lock:
+            if _settings["log_dir"]:
+                write_run_log(trace, _settings["log_dir"], _settings["keep"])
+            if _settings["metrics_file"]:
+                write_metrics(_settings["metrics_file"], _settings["openmetrics"])
+    except OSError as e:
+        print(f"Run log error: {e}")  # reporting must never fail the run itself
+
+
+def write_run_log(trace, log_dir, keep=RUN_LOG_KEEP):
+    """Writes `trace` to <log_dir>/<time>-<name>.jsonl and deletes all but the newest `keep` logs."""
+    os.makedirs(log_dir, exist_ok=True)
+    stamp = datetime.datetime.fromtimestamp(trace.started_at).strftime("%Y%m%d-%H%M%S-%f")
+    name = "".join(c if c.isalnum() or c in "-_" else "_" for c in trace.name)
+    path = os.path.join(log_dir, f"{stamp}-{name}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(trace.jsonl())
+    logs = sorted(n for n in os.listdir(log_dir) if n.endswith(".jsonl"))
+    for old in logs[:max(0, len(logs) - keep)]:
+        os.remove(os.path.join(log_dir, old))
+    return path
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metrics_text(openmetrics=False):
+    """Totals of every run so far, in the Prometheus text format (or OpenMetrics, which ends with "# EOF")."""
+    with _lock:
+        totals = {stage: dict(values) for stage, values in _totals.items()}
+        runs = dict(_runs)
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        # OpenMetrics names a counter family without its _total suffix
+        family_name = name[:-len("_total")] if openmetrics and kind == "counter" else name
+        lines.append(f"# HELP {family_name} {help_text}")
+        lines.append(f"# TYPE {family_name} {kind}")
+        lines.extend(samples)
+
+    family("note_organizer_runs_total", "counter", "Runs finished, by kind and outcome.",
+           [f'note_organizer_runs_total{{run="{_label(n)}",outcome="{o}"}} {c}' for (n, o), c in sorted(runs.items())])
+    family("note_organizer_stage_seconds", "summary", "Time spent in each pipeline stage.",
+           [f'note_organizer_stage_seconds_{part}{{stage="{_label(s)}"}} {t[key]:g}'
+            for s, t in sorted(totals.items()) for part, key in (("count", "count"), ("sum", "seconds"))])
+    family("note_organizer_stage_errors_total", "counter", "Stages that raised an error.",
+           [f'note_organizer_stage_errors_total{{stage="{_label(s)}"}} {t["errors"]}' for s, t in sorted(totals.items())])
+    family("note_organizer_bytes_total", "counter", "Bytes read or written on disk, sent and received, by stage.",
+           [f'note_organizer_bytes_total{{stage="{_label(s)}",direction="{d}"}} {t[k]}'
+            for s, t in sorted(totals.items())
+            for d, k in (("disk", "bytes"), ("sent", "bytes_sent"), ("received", "bytes_received")) if k in t])
+    family("note_organizer_tokens_total", "counter", "Model tokens reported by the API.",
+           [f'note_organizer_tokens_total{{stage="{_label(s)}",kind="{d}"}} {t[k]}'
+            for s, t in sorted(totals.items())
+            for d, k in (("input", "input_tokens"), ("output", "output_tokens")) if k in t])
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, openmetrics=False):
+    """Writes metrics_text() to `path` atomically (for a node_exporter textfile collector, for example)."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(metrics_text(openmetrics))
+    os.replace(tmp, path)
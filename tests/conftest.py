@@ -0,0 +1,26 @@
+"""Shared fixtures. Run the suite with `python -m pytest` from the repository root."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import mock_gemini  # noqa: E402
+from note_organizer import segments  # noqa: E402
+
+
+@pytest.fixture
+def bundle():
+    return segments.SourceBundle()
+
+
+@pytest.fixture
+def mock_api():
+    """benchmarks/mock_gemini.py on a free port; yields its api_base."""
+    server, api_base = mock_gemini.start_server(guide_lines=20)
+    yield api_base
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,12 @@
+"""Builders shared by the tests."""
+API_URL = "http://localhost/v1beta/models/gemini-2.0-flash:generateContent"
+
+
+def text_result(name, text):
+    """An ingest.extract_file() result for a text file."""
+    return {"name": name, "kind": "text", "text": text, "images": None, "phash": None, "pages": None}
+
+
+def words(n, seed=0):
+    """`n` distinct pseudo-random words, the same for the same seed."""
+    return " ".join(f"w{(i * 7919 + seed * 104729) % 1000003}" for i in range(n))
@@ -0,0 +1,49 @@
+from note_organizer import cache
+from helpers import API_URL, text_result
+
+
+def payload(text):
+    return {"contents": [{"parts": [{"text": text}]}]}
+
+
+def test_response_cache_round_trip(tmp_path):
+    responses = cache.ResponseCache(str(tmp_path / "responses.db"))
+    key = responses.key_for(API_URL, payload("notes"))
+    assert key != responses.key_for(API_URL, payload("other notes"))
+    assert responses.get(key) is None
+    responses.put(key, API_URL, "## Guide")
+    assert responses.get(key) == "## Guide"
+    assert (responses.hits, responses.misses) == (1, 1)
+    responses.put_count(key, 42)
+    assert responses.get_count(key) == 42
+    responses.close()
+
+
+def test_response_cache_expires_and_evicts(tmp_path):
+    expired = cache.ResponseCache(str(tmp_path / "expired.db"), ttl_days=0)
+    expired.put("a", API_URL, "old")
+    assert expired.get("a") is None
+
+    small = cache.ResponseCache(str(tmp_path / "small.db"), max_mb=1500 / (1024 * 1024))
+    small.put("a", API_URL, "x" * 1000)
+    small.put("b", API_URL, "y" * 1000)  # over the limit: the least recently used goes
+    assert small.get("a") is None and small.get("b") == "y" * 1000
+
+
+def test_extraction_cache_is_keyed_by_content_and_version(tmp_path):
+    extracted = cache.ExtractionCache(str(tmp_path / "extracted.db"), "1:")
+    notes = tmp_path / "notes.txt"
+    notes.write_text("alpha", encoding="utf-8")
+    assert extracted.get(str(notes)) is None
+    extracted.put(str(notes), dict(text_result("notes.txt", "alpha"), unread_pages=[2]))
+    hit = extracted.get(str(notes))
+    assert hit["text"] == "alpha" and hit["unread_pages"] == [2]
+
+    copy = tmp_path / "copy.txt"
+    copy.write_text("alpha", encoding="utf-8")
+    assert extracted.get(str(copy))["name"] == "copy.txt"  # same bytes, another path
+
+    notes.write_text("alpha, edited", encoding="utf-8")
+    assert extracted.get(str(notes)) is None
+    extracted.close()
+    assert cache.ExtractionCache(str(tmp_path / "extracted.db"), "2:").get(str(copy)) is None
@@ -0,0 +1,69 @@
+from note_organizer import chunking
+
+
+def test_single_guide_is_returned_unchanged():
+    assert chunking.merge_guides(["# Guide\n\n## A\n\ntext"]) == "# Guide\n\n## A\n\ntext"
+
+
+def test_categories_with_the_same_title_are_combined():
+    merged = chunking.merge_guides([
+        "## 1. Cells\n\n### Mitochondria\n\nPowerhouse.",
+        "## Cells\n\n### Mitochondria\n\nHas its own DNA.\n\n### Ribosomes\n\nMake proteins.",
+    ])
+    assert merged.count("## ") - merged.count("### ") == 1
+    assert merged.count("### Mitochondria") == 1
+    assert "Powerhouse." in merged and "Has its own DNA." in merged and "### Ribosomes" in merged
+
+
+def test_glossaries_are_merged_alphabetically_at_the_end():
+    merged = chunking.merge_guides([
+        "## Glossary\n\n- **Zygote**: a fertilized cell\n- **Allele**: a gene variant",
+        "## Topic\n\nBody\n\n## Key Terms\n\n| Term | Definition |\n|---|---|\n| Meiosis | cell division |",
+    ])
+    glossary = merged[merged.index("## Glossary"):]
+    assert merged.rstrip().endswith(glossary.rstrip())
+    assert glossary.index("Allele") < glossary.index("Meiosis") < glossary.index("Zygote")
+
+
+def test_first_preamble_stays_on_top():
+    merged = chunking.merge_guides(["# Study Guide\n\nIntro.\n\n## A\n\na", "## B\n\nb"])
+    assert merged.startswith("# Study Guide\n\nIntro.")
+
+
+def test_later_preamble_is_kept_under_other_notes():
+    merged = chunking.merge_guides([
+        "# Study Guide\n\n## A\n\na",
+        "# Study Guide\n\nPart two starts with loose notes.\n\n## B\n\nb",
+    ])
+    assert "Part two starts with loose notes." in merged
+    assert f"## {chunking.OTHER_NOTES_TITLE}" in merged
+    assert merged.count("# Study Guide") == 1  # the repeated title is not copied
+
+
+def test_part_without_categories_is_not_dropped():
+    merged = chunking.merge_guides([
+        "## A\n\na",
+        "# Timeline\n\n- 1914: war begins\n- 1918: war ends",
+    ])
+    assert "1914: war begins" in merged and "1918: war ends" in merged
+    assert "### Timeline" in merged  # its H1 becomes a sub-topic of Other Notes
+
+
+def test_split_text_respects_budget():
+    text = "\n\n".join(f"Paragraph {i} " + "x" * 300 for i in range(40))
+    pieces = chunking.split_text(text, 1000)
+    assert all(len(p) <= 1000 for p in pieces)
+    assert "".join(pieces).replace("\n", "") == text.replace("\n", "")
+
+
+def test_make_chunks_packs_sections_under_budget():
+    sections = [(f"--- FILE: f{i}.txt ---", "y" * 900) for i in range(10)]
+    chunks = chunking.make_chunks(sections, 2000)
+    assert len(chunks) == 5
+    assert [s for chunk in chunks for s in chunk] == sections
+
+
+def test_oversized_file_is_split_into_parts():
+    chunks = chunking.make_chunks([("--- FILE: big.txt ---", "line\n\n" * 2000)], 3000)
+    assert len(chunks) > 1
+    assert chunks[0][0][0] == "--- FILE: big.txt (part 1/%d) ---" % len(chunks)
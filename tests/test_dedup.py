@@ -0,0 +1,60 @@
+from note_organizer import config, dedup, segments
+from helpers import text_result, words
+
+DECK = words(2000)
+EXCERPT = " ".join(DECK.split()[600:900])  # one slide's worth of the deck
+V1 = words(5000, seed=1)
+V2 = V1 + " " + words(900, seed=2)  # v1 with a section added
+
+
+def add(bundle, name, text):
+    bundle.add_result(text_result(name, text))
+    return bundle.segments[-1]
+
+
+def test_signature_ignores_case_and_punctuation():
+    text = words(400)
+    assert dedup.text_signature(text) == dedup.text_signature(text.upper().replace(" ", ", "))
+    assert dedup.text_signature("too short to judge") is None
+
+
+def test_excerpt_then_deck(bundle):
+    excerpt = add(bundle, "slide.txt", EXCERPT)
+    deck = add(bundle, "deck.txt", DECK)
+    assert excerpt.duplicate_of is deck and deck.duplicate_of is None
+
+
+def test_deck_then_excerpt(bundle):
+    deck = add(bundle, "deck.txt", DECK)
+    excerpt = add(bundle, "slide.txt", EXCERPT)
+    assert excerpt.duplicate_of is deck and deck.duplicate_of is None
+
+
+def test_longer_version_is_kept(bundle):
+    # v2 is mostly v1, but it adds a section: v2 is sent and v1 left out
+    v1 = add(bundle, "lecture_v1.txt", V1)
+    v2 = add(bundle, "lecture_v2.txt", V2)
+    assert v2.duplicate_of is None and v1.duplicate_of is v2
+    assert [s.name for s in bundle.segments if s.has_text] == ["lecture_v2.txt"]
+
+
+def test_same_file_twice_keeps_the_first(bundle):
+    first = add(bundle, "notes.txt", V1)
+    again = add(bundle, "notes copy.txt", V1)
+    assert again.duplicate_of is first and first.duplicate_of is None
+
+
+def test_removing_the_original_sends_the_duplicate_again(bundle):
+    add(bundle, "notes.txt", V1)
+    again = add(bundle, "notes copy.txt", V1)
+    bundle.remove([0])
+    assert again.duplicate_of is None
+
+
+def test_dedup_can_be_turned_off():
+    bundle = segments.SourceBundle(config.get_dedup({"DEDUP": False}))
+    add(bundle, "notes.txt", V1)
+    add(bundle, "notes copy.txt", V1)
+    assert all(s.duplicate_of is None for s in bundle.segments)
+    assert bundle.duplicate_summary() == ""
+    assert bundle.subset(bundle.segments).find_duplicates is False
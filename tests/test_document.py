@@ -0,0 +1,51 @@
+from note_organizer import document, formats
+from note_organizer.document import HEADING, LIST_ITEM, PARAGRAPH, TABLE
+
+GUIDE = """# Cells
+
+Intro with **bold** and `code`.
+
+- one
+    - nested
+1. first
+
+| Term | Meaning |
+|---|---|
+| Cell | The unit of life |
+
+## Glossary
+
+**Mitosis**: cell division
+"""
+
+
+def test_parse_blocks():
+    parsed = document.parse(GUIDE)
+    kinds = [block.kind for block in parsed.blocks]
+    assert kinds == [HEADING, PARAGRAPH, LIST_ITEM, LIST_ITEM, LIST_ITEM, TABLE, HEADING, PARAGRAPH]
+    table = parsed.blocks[5]
+    assert table.header and document.plain(table.rows[1][1]) == "The unit of life"
+    assert parsed.blocks[3].level == 2 and parsed.blocks[4].ordered
+
+
+def test_table_of_only_separator_rows_is_dropped():
+    parsed = document.parse("Intro\n|---|---|\n")
+    assert [block.kind for block in parsed.blocks] == [PARAGRAPH]
+
+
+def test_glossary_and_anki_cards():
+    parsed = document.parse(GUIDE)
+    assert [term for term, _ in parsed.glossary()] == ["Mitosis"]
+    assert formats.anki_cards(parsed) == [("Mitosis", "cell division")]
+
+
+def test_markdown_round_trip():
+    parsed = document.parse(GUIDE)
+    again = document.parse(formats.markdown_text(parsed))
+    assert formats.markdown_text(again) == formats.markdown_text(parsed)
+
+
+def test_html_escapes_text(tmp_path):
+    path = tmp_path / "guide.html"
+    formats.write_html(document.parse("# A <b> & C\n"), path)
+    assert "A &lt;b&gt; &amp; C" in path.read_text(encoding="utf-8")
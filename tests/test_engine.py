@@ -0,0 +1,40 @@
+import pytest
+
+from note_organizer import engine
+from helpers import API_URL, text_result, words
+
+
+def split_bundle(bundle, files=3):
+    # files too large to share one request at the smallest chunk size
+    for n in range(files):
+        bundle.add_result(text_result(f"f{n}.txt", words(400, seed=n)))
+    return bundle
+
+
+def test_split_input_is_organized_per_part_and_merged(bundle):
+    split_bundle(bundle)
+    seen = []
+
+    def send(payload):
+        seen.append(payload)
+        return f"## Part {len(seen)}\n\ntext"
+
+    guide, cached = engine.compile_bundle(bundle, API_URL, "key", send=send, chunk_chars=4000)
+    assert len(seen) == 3 and not cached
+    assert all(f"## Part {n}" in guide for n in (1, 2, 3))
+
+
+def test_empty_part_is_an_error_not_a_shorter_guide(bundle):
+    split_bundle(bundle)
+
+    def send(payload):
+        return "" if "f1.txt" in payload["contents"][0]["parts"][0]["text"] else "## A\n\ntext"
+
+    with pytest.raises(engine.ApiError, match="part 2 of 3"):
+        engine.compile_bundle(bundle, API_URL, "key", send=send, chunk_chars=4000)
+
+
+def test_empty_single_answer_is_an_error(bundle):
+    bundle.add_result(text_result("a.txt", "short notes"))
+    with pytest.raises(engine.ApiError, match="no text"):
+        engine.compile_bundle(bundle, API_URL, "key", send=lambda payload: "  \n")
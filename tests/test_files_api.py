@@ -0,0 +1,101 @@
+import asyncio
+import os
+
+import pytest
+
+import mock_gemini
+from note_organizer import aio, files_api, gemini, ingest, jobs, segments
+
+PDF_PART = {"inline_data": {"mime_type": "application/pdf", "data": "JVBERi0xLjQK" * 100}}
+
+
+@pytest.fixture
+def flaky_api():
+    """The mock API, answering the first upload start with 503."""
+    fail = [1]
+
+    class Handler(mock_gemini.MockGemini):
+        stats = {"requests": 0, "uploads": 0, "bytes_in": 0, "connections": 0}
+
+        def do_POST(self):
+            if "/upload/" in self.path and fail[0] > 0:
+                fail[0] -= 1
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                return self.reply({"error": {"code": 503, "message": "overloaded"}}, status=503)
+            return super().do_POST()
+
+    server = mock_gemini.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    mock_gemini.threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1beta", Handler.stats
+    server.shutdown()
+    server.server_close()
+
+
+def uploader(api_base, tmp_path):
+    client = gemini.GeminiClient(f"{api_base}/models/gemini-2.0-flash:generateContent", "key")
+    return files_api.UploadManager(client, str(tmp_path / "uploads.sqlite3"), min_bytes=0)
+
+
+def payload(part):
+    return {"contents": [{"parts": [{"text": "notes"}, part]}]}
+
+
+def test_upload_is_reused(mock_api, tmp_path):
+    manager = uploader(mock_api, tmp_path)
+    first = manager.swap_inline(payload(PDF_PART))
+    second = manager.swap_inline(payload(PDF_PART))
+    assert "file_data" in first["contents"][0]["parts"][1]
+    assert first == second
+    assert (manager.uploads, manager.reused) == (1, 1)
+
+
+def test_failed_upload_falls_back_inline(flaky_api, tmp_path):
+    api_base, stats = flaky_api
+    swapped = uploader(api_base, tmp_path).swap_inline(payload(PDF_PART))
+    assert swapped["contents"][0]["parts"][1] == PDF_PART
+
+
+def test_retryable_upload_error_is_raised_and_retried(flaky_api, tmp_path, monkeypatch):
+    api_base, stats = flaky_api
+    monkeypatch.setattr(jobs, "backoff_delay", lambda attempt: 0)
+    manager = uploader(api_base, tmp_path)
+    retries = []
+
+    async def attempt():
+        return await asyncio.to_thread(manager.swap_inline, payload(PDF_PART), jobs.is_retryable)
+
+    swapped = aio.run(jobs.call_with_retries(attempt, on_retry=lambda n, delay, e: retries.append(e)))
+    assert "file_data" in swapped["contents"][0]["parts"][1]
+    assert len(retries) == 1 and retries[0].status_code == 503
+    assert stats["uploads"] == 1
+
+
+def test_job_retries_a_failed_upload(flaky_api, tmp_path, monkeypatch):
+    PIL = pytest.importorskip("PIL.Image")
+    api_base, stats = flaky_api
+    monkeypatch.setattr(jobs, "backoff_delay", lambda attempt: 0)
+    image = str(tmp_path / "board.png")
+    PIL.new("RGB", (64, 64), "white").save(image)
+    queue = jobs.JobQueue(f"{api_base}/models/gemini-2.0-flash:generateContent", "key",
+                          uploader=uploader(api_base, tmp_path))
+    job = queue.submit(jobs.CompileJob("board", [image], str(tmp_path / "board.docx"), formats=["md"]))
+    queue.wait()
+    assert job.status == jobs.DONE, job.detail
+    assert job.attempts == 2
+    assert stats["uploads"] == 1 and stats["requests"] == 1
+
+
+def test_scan_is_encoded_once_and_survives_deletion(tmp_path, monkeypatch):
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4 scan")
+    reads = []
+    encode = ingest.encode_pdf
+    monkeypatch.setattr(ingest, "encode_pdf", lambda p: reads.append(p) or encode(p))
+    seg = segments.Segment("scan.pdf", "pdf", str(path), text="")
+    first = seg.media_parts()
+    assert seg.media_parts() == first and len(reads) == 1
+    os.remove(path)
+    assert seg.media_parts() == first and len(reads) == 1
+    path.write_bytes(b"%PDF-1.4 a longer, edited scan")
+    assert seg.media_parts() != first and len(reads) == 2
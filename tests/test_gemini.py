@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from note_organizer import aio, gemini, trace
+from mock_gemini import make_response_guide
+
+BODY_DELAY = 0.5
+
+PAYLOAD = {"contents": [{"parts": [{"text": "notes"}]}]}
+
+
+def client(api_base):
+    return gemini.GeminiClient(f"{api_base}/models/gemini-2.0-flash:generateContent", "key")
+
+
+def test_generate_keeps_non_ascii_text(mock_api):
+    assert client(mock_api).generate(PAYLOAD) == make_response_guide(20)
+
+
+def test_stream_decodes_sse_as_utf8(mock_api):
+    # the mock sends text/event-stream without a charset, which requests would read as Latin-1
+    deltas = []
+    text = client(mock_api).stream(PAYLOAD, deltas.append)
+    assert text == "".join(deltas) == make_response_guide(20)
+    assert "café, naïve, 日本語" in text
+
+
+def test_async_clients_decode_sse_as_utf8(mock_api):
+    sync = client(mock_api)
+    clients = [gemini.ThreadedGeminiClient(sync)]
+    if gemini.AIOHTTP_AVAILABLE:
+        clients.append(gemini.AsyncGeminiClient(sync))
+    for async_client in clients:
+        async def run():
+            try:
+                return await async_client.stream(PAYLOAD, lambda delta: None)
+            finally:
+                await async_client.close()
+        assert aio.run(run()) == make_response_guide(20)
+
+
+@pytest.fixture
+def slow_body_api():
+    """Answers generateContent with headers at once and the body BODY_DELAY seconds later."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            body = json.dumps({"candidates": [{"content": {"parts": [{"text": "## Guide"}]}}]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.flush()
+            time.sleep(BODY_DELAY)
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1beta"
+    server.shutdown()
+    server.server_close()
+
+
+def first_byte_and_total(stages):
+    rows = {row["name"]: row for row in stages}
+    return rows["request.first_byte"]["seconds"], rows["request"]["seconds"]
+
+
+def test_first_byte_is_timed_at_the_headers(slow_body_api):
+    sync = client(slow_body_api)
+    with trace.run("sync") as run:
+        assert sync.generate(PAYLOAD) == "## Guide"
+    first_byte, total = first_byte_and_total(run.stages())
+    assert first_byte < BODY_DELAY <= total
+
+    if gemini.AIOHTTP_AVAILABLE:
+        async_client = gemini.AsyncGeminiClient(sync)
+
+        async def generate():
+            try:
+                with trace.run("async") as run:
+                    assert await async_client.generate(PAYLOAD) == "## Guide"
+                return run
+            finally:
+                await async_client.close()
+
+        first_byte, total = first_byte_and_total(aio.run(generate()).stages())
+        assert first_byte < BODY_DELAY <= total
+
+
+@pytest.fixture
+def picky_api():
+    """Answers `status` to compressed bodies (400 to every body when `status` is 400) and records
+    the Content-Encoding of each request; yields (api_base, received, settings)."""
+    received = []
+    settings = {"status": 400}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            encoding = self.headers.get("Content-Encoding")
+            received.append(encoding)
+            if settings["status"] == 400 or encoding == "gzip":
+                status, body = settings["status"], b'{"error": {"message": "bad request"}}'
+            else:
+                status, body = 200, json.dumps({"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1beta", received, settings
+    server.shutdown()
+    server.server_close()
+
+
+def gzip_clients(api_base):
+    sync = gemini.GeminiClient(f"{api_base}/models/gemini-2.0-flash:generateContent", "key", gzip_min_bytes=1)
+    return sync, [gemini.ThreadedGeminiClient(sync)] + ([gemini.AsyncGeminiClient(sync)] if gemini.AIOHTTP_AVAILABLE else [])
+
+
+def test_bad_request_is_not_resent_and_keeps_gzip(picky_api):
+    api_base, received, _ = picky_api
+    sync, async_clients = gzip_clients(api_base)
+    with pytest.raises(gemini.ApiError, match="400"):
+        sync.generate(PAYLOAD)
+    for async_client in async_clients:
+        async def run():
+            try:
+                await async_client.generate(PAYLOAD)
+            finally:
+                await async_client.close()
+        with pytest.raises(gemini.ApiError, match="400"):
+            aio.run(run())
+    assert received == ["gzip"] * (1 + len(async_clients))  # each sent once, still compressed
+    assert sync.gzip_min_bytes == 1 and not sync.plain_urls
+
+
+def test_endpoint_without_gzip_is_sent_plain(picky_api):
+    api_base, received, settings = picky_api
+    settings["status"] = 415
+    sync, async_clients = gzip_clients(api_base)
+    assert sync.generate(PAYLOAD) == "ok"
+    assert sync.generate(PAYLOAD) == "ok"
+    assert received == ["gzip", None, None]  # only the first request was tried compressed
+    assert sync.gzip_min_bytes == 1  # other endpoints are still compressed
@@ -0,0 +1,104 @@
+import io
+
+import pytest
+
+from note_organizer import dedup, imaging, ingest
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+LECTURE = [
+    ["Cell membranes", "- phospholipid bilayer", "- selective transport"],
+    ["Mitosis phases", "- prophase, metaphase", "- anaphase, telophase"],
+    ["Cell membranes", "- phospholipid bilayer", "- selective transport", "- osmosis"],
+]
+
+
+def slide(path, lines):
+    """A text slide on a shared template: title bar, footer bar, bullet lines."""
+    img = Image.new("RGB", (1280, 720), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, 1280, 90), fill=(30, 60, 120))
+    draw.rectangle((0, 690, 1280, 720), fill=(30, 60, 120))
+    for n, line in enumerate(lines):
+        draw.text((80, 140 + n * 48), line, fill="black", font_size=32)
+    img.save(path)
+    return str(path)
+
+
+def photo(path, shift=0):
+    """A colourful picture with no plain background."""
+    img = Image.new("RGB", (800, 600))
+    img.putdata([((x * 255) // 800, (y * 255) // 600, ((x + y) * 255) // 1400) for y in range(600) for x in range(800)])
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((100 + shift, 100, 500 + shift, 500), fill=(200, 40, 40))
+    img.save(path)
+    return str(path)
+
+
+def add(bundle, path):
+    bundle.add_result(ingest.extract_file(path), path)
+    return bundle.segments[-1]
+
+
+def test_same_template_slides_are_not_duplicates(bundle, tmp_path):
+    a = slide(tmp_path / "membranes.png", ["Cell membranes", "- phospholipid bilayer", "- selective transport"])
+    b = slide(tmp_path / "mitosis.png", ["Mitosis phases", "- prophase, metaphase", "- anaphase, telophase"])
+    with Image.open(a) as img_a, Image.open(b) as img_b:
+        # the two hash alike, which is why text images are not compared by pHash
+        assert dedup.hamming(imaging.prepare(img_a).phash, imaging.prepare(img_b).phash) <= dedup.DUPLICATE_DISTANCE
+    add(bundle, a)
+    second = add(bundle, b)
+    assert second.phash is None and second.duplicate_of is None
+    assert bundle.media_count() == 2
+
+
+def test_repeated_picture_is_a_duplicate(bundle, tmp_path):
+    first = add(bundle, photo(tmp_path / "heart.png"))
+    again = add(bundle, photo(tmp_path / "heart_copy.png", shift=2))
+    assert first.phash is not None and again.duplicate_of is first
+    assert bundle.media_count() == 1
+
+
+def slides_pdf(path, pngs):
+    """The slides as a PDF of page images, as an export would make it: smaller and JPEG-compressed."""
+    canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+    ImageReader = pytest.importorskip("reportlab.lib.utils").ImageReader
+    pdf = canvas.Canvas(str(path), pagesize=(960, 540))
+    for png in pngs:
+        with Image.open(png) as img:
+            data = io.BytesIO()
+            img.convert("RGB").resize((960, 540)).save(data, "JPEG", quality=70)
+        pdf.drawImage(ImageReader(io.BytesIO(data.getvalue())), 0, 0, 960, 540)
+        pdf.showPage()
+    pdf.save()
+    return str(path)
+
+
+def lecture(tmp_path):
+    pngs = [slide(tmp_path / f"slide{n}.png", lines) for n, lines in enumerate(LECTURE, 1)]
+    return pngs, slides_pdf(tmp_path / "lecture.pdf", pngs)
+
+
+def test_slides_as_pngs_then_as_pdf_are_sent_once(bundle, tmp_path):
+    pngs, pdf = lecture(tmp_path)
+    images = [add(bundle, png) for png in pngs]
+    assert all(seg.duplicate_of is None for seg in images)  # one template, three different slides
+    deck = add(bundle, pdf)
+    assert deck.is_scan and len(deck.layouts) == 3
+    assert all(seg.duplicate_of is deck for seg in images)
+    assert bundle.media_count() == 1
+
+
+def test_slides_as_pdf_then_as_pngs_are_sent_once(bundle, tmp_path):
+    pngs, pdf = lecture(tmp_path)
+    deck = add(bundle, pdf)
+    images = [add(bundle, png) for png in pngs]
+    assert all(seg.duplicate_of is deck for seg in images)
+    assert bundle.media_count() == 1
+
+
+def test_same_slide_twice_is_a_duplicate(bundle, tmp_path):
+    first = add(bundle, slide(tmp_path / "a.png", LECTURE[0]))
+    again = add(bundle, slide(tmp_path / "b.png", LECTURE[0]))
+    assert first.phash is None and again.duplicate_of is first
@@ -0,0 +1,88 @@
+import base64
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from note_organizer import cache, ingest, tokens
+
+pypdf = pytest.importorskip("pypdf")
+canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+ImageReader = pytest.importorskip("reportlab.lib.utils").ImageReader
+Image = pytest.importorskip("PIL.Image")
+
+LECTURE = "Photosynthesis turns light into chemical energy in the chloroplasts of plant cells."
+
+
+def partly_scanned_pdf(path, scanned=(1,), pages=3):
+    """A PDF whose pages have a text layer, except `scanned` ones, which are a picture only."""
+    noise = Image.effect_noise((320, 420), 80).convert("RGB")
+    pdf = canvas.Canvas(str(path))
+    for n in range(pages):
+        if n in scanned:
+            pdf.drawImage(ImageReader(noise), 0, 0, 595, 842)
+        else:
+            pdf.drawString(72, 720, f"Page {n + 1}. {LECTURE}")
+        pdf.showPage()
+    pdf.save()
+    return str(path)
+
+
+def test_unread_scanned_page_is_reported(tmp_path):
+    result = ingest.extract_file(partly_scanned_pdf(tmp_path / "lecture.pdf"))
+    assert result["unread_pages"] == [1]
+    assert "Page 1." in result["text"] and "Page 3." in result["text"]
+
+
+def test_page_ocr_cannot_read_is_still_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest.ocr, "read_text", lambda img, language: None)  # low confidence
+    result = ingest.extract_file(partly_scanned_pdf(tmp_path / "lecture.pdf"), ocr_language="eng")
+    assert result["unread_pages"] == [1]
+
+
+def test_page_ocr_reads_is_not_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest.ocr, "read_text", lambda img, language: "Text read from the scan. " * 5)
+    result = ingest.extract_file(partly_scanned_pdf(tmp_path / "lecture.pdf"), ocr_language="eng")
+    assert result["unread_pages"] is None and "Text read from the scan." in result["text"]
+
+
+def test_unread_pages_are_kept_across_page_ranges(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "PAGES_PER_TASK", 2)
+    path = partly_scanned_pdf(tmp_path / "long.pdf", scanned=(1, 4), pages=5)
+    with ThreadPoolExecutor(2) as pool:
+        [result] = ingest.ingest_files([path], pool=pool)
+    assert result["unread_pages"] == [1, 4]
+    assert len(result["pages"]) == 5
+
+
+def test_unread_pages_are_sent_as_a_pdf(bundle, tmp_path):
+    path = partly_scanned_pdf(tmp_path / "lecture.pdf", scanned=(1, 2), pages=4)
+    bundle.add_result(ingest.extract_file(path), path)
+    seg = bundle.segments[0]
+    assert seg.has_text and seg.is_media and not seg.is_scan
+    assert seg.label == "lecture.pdf (2 unread pages sent as PDF)"
+    [part] = bundle.media_payloads()
+    sent = pypdf.PdfReader(io.BytesIO(base64.b64decode(part["inline_data"]["data"])))
+    assert len(sent.pages) == 2
+    assert tokens.media_tokens(seg) == 2 * tokens.PDF_PAGE_TOKENS
+    assert tokens.segment_tokens(seg) > tokens.media_tokens(seg)  # its text is sent too
+
+
+def test_unread_pages_survive_the_extraction_cache(tmp_path):
+    path = partly_scanned_pdf(tmp_path / "lecture.pdf")
+    extraction = cache.ExtractionCache(str(tmp_path / "extracted.sqlite3"), ingest.extractor_version())
+    extraction.put(path, ingest.extract_file(path))
+    assert extraction.get(path)["unread_pages"] == [1]
+
+
+@pytest.mark.parametrize("pages_per_task", [None, 1])
+def test_pages_without_text_are_not_compared_for_duplicates(tmp_path, monkeypatch, pages_per_task):
+    path = partly_scanned_pdf(tmp_path / "scan.pdf", scanned=(0, 1, 2))
+    if pages_per_task:
+        monkeypatch.setattr(ingest, "PAGES_PER_TASK", pages_per_task)
+        with ThreadPoolExecutor(2) as pool:
+            [result] = ingest.ingest_files([path], pool=pool)
+    else:
+        result = ingest.extract_file(path)
+    assert result["unread_pages"] == [0, 1, 2]
+    assert result["shingles"] is None
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from note_organizer import aio, export, jobs
+from helpers import API_URL
+
+
+def test_ingest_pool_starts_only_for_pdfs_and_images(monkeypatch):
+    started = []
+    monkeypatch.setattr(jobs.ingest, "default_workers", lambda: 2)
+    monkeypatch.setattr(jobs, "ProcessPoolExecutor", lambda max_workers: started.append(max_workers) or "pool")
+    queue = jobs.JobQueue(API_URL, "key")
+    assert queue.ingest_pool is None and not started
+    assert queue._pool(["notes.txt", "outline.md"]) is None and not started
+    assert queue._pool(["notes.txt", "slides.pdf"]) == "pool"
+    assert queue._pool(["scan.png"]) == "pool" and started == [2]
+
+
+def test_cancel_finishes_jobs_that_never_started(mock_api, tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("alpha notes", encoding="utf-8")
+    finals = []
+    queue = jobs.JobQueue(f"{mock_api}/models/gemini-2.0-flash:generateContent", "key", workers=1,
+                          on_update=lambda job: job.status in (jobs.DONE, jobs.FAILED) and finals.append(job.name))
+    held, release = threading.Event(), threading.Event()
+
+    async def hold_loop():
+        held.set()
+        release.wait(5)  # blocks the loop, so the jobs' tasks cannot start before the cancel
+
+    aio.submit(hold_loop())
+    held.wait(5)
+    for n in range(5):
+        queue.submit(jobs.CompileJob(f"guide {n}", [str(notes)], str(tmp_path / f"g{n}.docx"), formats=["md"]))
+    queue.cancel()
+    release.set()
+    queue.wait()
+    assert all(job.status in (jobs.DONE, jobs.FAILED) for job in queue.jobs)
+    assert sorted(finals) == [f"guide {n}" for n in range(5)]  # each job reported finished exactly once
+
+
+def test_token_bucket_refills_and_caps_oversized_requests():
+    bucket = jobs.TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    bucket.refill(bucket.updated + 30)
+    assert bucket.level == pytest.approx(30) and bucket.wait_time(30) == 0
+    bucket.refill(bucket.updated + 3600)
+    assert bucket.level == 60  # never more than one minute's worth
+    assert bucket.wait_time(1000) == 0  # an oversized request waits for a full bucket only
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = jobs.RateLimiter(requests_per_minute=1200, tokens_per_minute=600)
+
+    async def burst():
+        start = time.monotonic()
+        await limiter.acquire(1000)  # more than a minute's tokens: let through on a full bucket
+        await limiter.acquire(5)
+        return time.monotonic() - start
+
+    assert 0.1 < asyncio.run(burst()) < 2.0  # the second request waited ~0.5 s for 5 tokens at 600/minute
+
+
+@pytest.mark.parametrize("per_minute", [0, -5])
+def test_zero_or_negative_limit_means_no_limit(per_minute):
+    bucket = jobs.TokenBucket(per_minute)
+    bucket.take(1000)
+    bucket.refill(bucket.updated + 1)
+    assert bucket.wait_time(1) == 0 and bucket.wait_time(10**9) == 0
+    limiter = jobs.RateLimiter(requests_per_minute=per_minute, tokens_per_minute=per_minute)
+
+    async def burst():
+        for _ in range(50):
+            await limiter.acquire(10_000)
+
+    asyncio.run(asyncio.wait_for(burst(), 1.0))
+
+
+def test_export_after_cancel_renders_without_the_shut_down_pool(tmp_path):
+    queue = jobs.JobQueue(API_URL, "key")
+    queue.ingest_pool = ThreadPoolExecutor(1)
+    queue.cancel()  # shuts the shared pool down
+    job = jobs.CompileJob("guide", [], str(tmp_path / "guide.docx"), formats=["md", "html"])
+    job.output_text = "## Cells\n\ntext\n"
+    queue._export(job)
+    assert sorted(os.listdir(tmp_path)) == ["guide.html", "guide.md"]
+
+
+def test_export_renders_inline_when_a_shared_pool_is_shut_down(tmp_path):
+    pool = ThreadPoolExecutor(1)
+    pool.shutdown()
+    results = export.export_guides([("## Cells\n\ntext\n", str(tmp_path / "guide"))], ["md", "html"], pool=pool)
+    assert [r["error"] for r in results] == [None, None]
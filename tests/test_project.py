@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from note_organizer import project
+from helpers import API_URL, text_result, words
+
+CHUNK_CHARS = 40_000  # 10,000-token requests
+
+
+def load(bundle, texts):
+    bundle.clear()
+    for name, text in texts.items():
+        bundle.add_result(text_result(name, text))
+    return bundle
+
+
+def recorder():
+    sent = []
+
+    def send(payload):
+        sent.append(payload["contents"][0]["parts"][0]["text"])
+        return f"## Batch {len(sent)}\n\nnotes"
+
+    return sent, send
+
+
+def test_fingerprint_follows_content(bundle):
+    load(bundle, {"a.txt": "alpha", "b.txt": "alpha"})
+    a, b = bundle.segments
+    assert project.source_fingerprint(a) != project.source_fingerprint(b)  # the name is part of it
+    first = project.source_fingerprint(a)
+    load(bundle, {"a.txt": "alpha"})
+    assert project.source_fingerprint(bundle.segments[0]) == first
+    load(bundle, {"a.txt": "alpha, edited"})
+    assert project.source_fingerprint(bundle.segments[0]) != first
+
+
+def test_first_compile_batches_small_sources(bundle, tmp_path):
+    load(bundle, {f"{n}.txt": words(200, seed=n) for n in range(6)})
+    sent, send = recorder()
+    proj = project.Project(str(tmp_path / "course.noteproj"))
+    proj.compile(bundle, API_URL, "key", send=send, chunk_chars=CHUNK_CHARS)
+    assert len(sent) == 1
+    assert all(f"{n}.txt" in sent[0] for n in range(6))
+
+
+def test_batches_respect_the_request_budget(bundle):
+    load(bundle, {f"{n}.txt": words(2000, seed=n) for n in range(4)})
+    entries, changed = project.Project("unused.noteproj").plan(bundle, "settings")
+    batches = project.batch_sources(changed, API_URL, CHUNK_CHARS)
+    assert [len(batch) for batch in batches] == [2, 2]
+    assert [item for batch in batches for item in batch] == entries
+
+
+def test_recompile_sends_only_the_changed_group(bundle, tmp_path):
+    path = str(tmp_path / "course.noteproj")
+    big = {f"{n}.txt": words(2000, seed=n) for n in range(4)}  # two batches of two
+    sent, send = recorder()
+    project.Project(path).compile(load(bundle, big), API_URL, "key", send=send, chunk_chars=CHUNK_CHARS)
+    assert len(sent) == 2
+    big["3.txt"] += " and an edit"
+    proj = project.Project(path)
+    guide, _ = proj.compile(load(bundle, big), API_URL, "key", send=send, chunk_chars=CHUNK_CHARS)
+    assert len(sent) == 3
+    assert "2.txt" in sent[2] and "3.txt" in sent[2] and "0.txt" not in sent[2]
+    assert proj.status_text() == "2 of 4 sources recompiled"
+    assert guide.index("## Batch 1") < guide.index("## Batch 3")  # in list order
+
+
+def test_unchanged_project_sends_nothing(bundle, tmp_path):
+    path = str(tmp_path / "course.noteproj")
+    sent, send = recorder()
+    project.Project(path).compile(load(bundle, {"a.txt": "alpha notes"}), API_URL, "key", send=send)
+    guide, _ = project.Project(path).compile(bundle, API_URL, "key", send=send)
+    assert len(sent) == 1 and "## Batch 1" in guide
+
+
+def test_placeholder_is_never_reused(bundle, tmp_path):
+    path = tmp_path / "old.noteproj"
+    settings = project.settings_fingerprint(API_URL, "", project.engine.MAX_RAW_CHARS)
+    load(bundle, {"a.txt": "alpha notes", "b.txt": "beta notes"})
+    a, b = bundle.segments
+    path.write_text(json.dumps({"version": 1, "settings": settings, "paths": [], "sources": {
+        "a.txt": {"name": "a.txt", "fingerprint": project.source_fingerprint(a), "output": "## A\n\nfrom before"},
+        "b.txt": {"name": "b.txt", "fingerprint": project.source_fingerprint(b), "output": "No content generated."},
+    }}), encoding="utf-8")
+    sent, send = recorder()
+    guide, _ = project.Project(str(path)).compile(bundle, API_URL, "key", send=send)
+    assert len(sent) == 1 and "b.txt" in sent[0] and "a.txt" not in sent[0]
+    assert "from before" in guide and "No content generated." not in guide
+
+
+def test_empty_answer_is_not_saved(bundle, tmp_path):
+    path = str(tmp_path / "course.noteproj")
+    load(bundle, {"a.txt": "alpha notes"})
+    with pytest.raises(project.engine.ApiError):
+        project.Project(path).compile(bundle, API_URL, "key", send=lambda payload: "")
+    assert project.Project(path).groups == []
@@ -0,0 +1,32 @@
+from note_organizer import search
+from helpers import text_result
+
+GUIDE = "## Cells\n\nThe mitochondria make energy.\n\n### Membranes\n\nLipid bilayers.\n"
+
+
+def index(tmp_path):
+    return search.SearchIndex(str(tmp_path / "search.db"))
+
+
+def test_sources_and_guides_are_found(tmp_path, bundle):
+    bundle.add_result(text_result("bio.txt", "Photosynthesis happens in chloroplasts."))
+    idx = index(tmp_path)
+    assert idx.add_sources(bundle.segments) == 1
+    assert idx.add_sources(bundle.segments) == 0  # unchanged: not written again
+    assert idx.add_guide("guide.docx", "Biology", GUIDE)
+    assert idx.stats() == {"source": 1, "guide": 1}
+
+    [hit] = idx.search("chloro")  # the last word is a prefix
+    assert hit["kind"] == "source" and hit["name"] == "bio.txt" and hit["line"] == 1
+    [hit] = idx.search("bilayers", kind="guide")
+    assert hit["title"] == "Cells > Membranes"
+    idx.remove("guide.docx")
+    assert idx.search("mitochondria") == []
+    idx.close()
+
+
+def test_queries_are_escaped(tmp_path):
+    idx = index(tmp_path)
+    assert search.fts_query("  ") is None and idx.search("\"") == []
+    assert idx.search('AND OR "NEAR(') == []
+    idx.close()
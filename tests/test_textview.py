@@ -0,0 +1,100 @@
+from note_organizer import document, textview
+
+GUIDE = """# Cell **Biology**
+
+Intro with **bold**, *italic* and `code`.
+
+- a **key** term
+1. first step
+
+| Term | Meaning |
+|---|---|
+| Cell | Unit |
+
+```
+**not bold** in code
+```
+Last line without a newline"""
+
+
+def visible(runs):
+    return "".join(text for text, tags in runs if "marker" not in tags)
+
+
+def tagged(runs, tag):
+    return [text for text, tags in runs if tag in tags and text]
+
+
+def render(text, sizes, lines_per_slice=2):
+    """The insert args of `text` appended in pieces of the given sizes, rendered as they arrive."""
+    stream = textview.MarkdownStream(lines_per_slice)
+    args = []
+    pos = 0
+    while pos < len(text):
+        size = sizes[len(args) % len(sizes)]
+        stream.append(text[pos:pos + size])
+        pos += size
+        more = True
+        while more:
+            lines, partial, more = stream.next_slice()
+            args.append(lines)
+    assert stream.get_text() == text
+    return [x for lines in args for x in lines] + partial
+
+
+def test_heading_and_inline_runs():
+    runs, in_code = textview.line_runs("## The **cell** and *membrane* `ATP`")
+    assert not in_code
+    assert visible(runs) == "The cell and membrane ATP"
+    assert tagged(runs, "h2") == ["The ", "cell", " and ", "membrane", " ", "ATP"]
+    assert tagged(runs, "bold") == ["cell"] and tagged(runs, "italic") == ["membrane"]
+    assert tagged(runs, "code_span") == ["ATP"]
+    assert "".join(text for text, _ in runs) == "## The **cell** and *membrane* `ATP`"  # nothing is dropped
+
+
+def test_code_blocks_carry_over_lines():
+    runs, in_code = textview.line_runs("```")
+    assert in_code
+    runs, in_code = textview.line_runs("**not bold**", in_code)
+    assert in_code and runs == [("**not bold**", ("code",))]
+
+
+def test_tags_agree_with_the_document_parser():
+    parsed = document.parse(GUIDE)
+    in_code = False
+    headings = []
+    for line in GUIDE.split("\n"):
+        runs, in_code = textview.line_runs(line, in_code)
+        if any(tags and tags[0].startswith("h") for _, tags in runs):
+            headings.append(visible(runs))
+    assert headings == [document.plain(b.runs) for b in parsed.blocks if b.kind == document.HEADING]
+    runs, _ = textview.line_runs("Intro with **bold**, *italic* and `code`.")
+    assert visible(runs) == document.plain(parsed.blocks[1].runs)
+
+
+def test_chunked_appends_render_like_one_append():
+    whole = render(GUIDE, [len(GUIDE)], lines_per_slice=1000)
+    for sizes in ([1], [7, 3], [50]):
+        assert render(GUIDE, sizes) == whole
+
+
+def test_unfinished_line_is_shown_with_the_last_slice_only():
+    stream = textview.MarkdownStream(lines_per_slice=1)
+    stream.append("one\ntwo\nthr")
+    lines, partial, more = stream.next_slice()
+    assert lines == ["one", (), "\n", ()] and partial == [] and more
+    lines, partial, more = stream.next_slice()
+    assert lines == ["two", (), "\n", ()] and partial == ["thr", ()] and not more
+    stream.append("ee\n")
+    assert stream.next_slice() == (["three", (), "\n", ()], [], False)
+
+
+def test_clear_forgets_text_and_code_state():
+    stream = textview.MarkdownStream()
+    stream.append("```\ncode\npart")
+    stream.next_slice()
+    stream.clear()
+    assert stream.get_text() == "" and not stream.in_code and stream.partial == ""
+    stream.append("**bold**\n")
+    lines, _, _ = stream.next_slice()
+    assert lines[:2] == ["**", ("marker",)]
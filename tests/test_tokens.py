@@ -0,0 +1,26 @@
+from note_organizer import tokens
+from helpers import text_result, words
+
+
+def test_small_bundle_is_one_request(bundle):
+    bundle.add_result(text_result("a.txt", "short notes"))
+    bundle.add_result(text_result("b.txt", "more notes"))
+    plan = tokens.plan_requests(bundle)
+    assert len(plan.requests) == 1
+    [(sections, media, needed)] = plan.requests
+    assert len(sections) == 2 and not media and needed == plan.input_tokens
+
+
+def test_large_bundle_is_split_under_the_budget(bundle):
+    for n in range(4):
+        bundle.add_result(text_result(f"f{n}.txt", words(400, seed=n)))
+    plan = tokens.plan_requests(bundle, chunk_chars=4000)
+    assert len(plan.requests) > 1
+    assert all(needed <= plan.budget for _, _, needed in plan.requests)
+    sent = "".join(body for sections, _, _ in plan.requests for _, body in sections)
+    assert all(f"w{(i * 7919 + 104729) % 1000003}" in sent for i in range(400))  # nothing dropped
+
+
+def test_multibyte_text_is_counted_by_tokens():
+    assert tokens.text_tokens("日本語" * 100) > tokens.text_tokens("abc" * 100)
+
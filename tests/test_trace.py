@@ -0,0 +1,27 @@
+import os
+import threading
+import time
+
+from note_organizer import aio, trace
+
+
+def test_run_on_the_loop_writes_its_log_off_the_loop(tmp_path, monkeypatch):
+    monkeypatch.setitem(trace._settings, "log_dir", str(tmp_path / "runs"))
+    monkeypatch.setitem(trace._settings, "metrics_file", str(tmp_path / "metrics.prom"))
+    writers = []
+    write = trace.write_run_log
+    monkeypatch.setattr(trace, "write_run_log",
+                        lambda *args: writers.append(threading.current_thread().name) or write(*args))
+
+    async def compile_guide():
+        with trace.run("guide", guide="Biology"):
+            with trace.span("request"):
+                pass
+
+    aio.run(compile_guide())
+    deadline = time.time() + 5
+    while not (os.path.exists(tmp_path / "metrics.prom") and writers) and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(writers) == 1 and writers[0] != "asyncio"  # not the loop thread
+    assert len(os.listdir(tmp_path / "runs")) == 1
+    assert 'stage="request"' in (tmp_path / "metrics.prom").read_text(encoding="utf-8")